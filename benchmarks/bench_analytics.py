@@ -0,0 +1,296 @@
+"""
+util の分析用関数のベンチマークです
+合成した約定データ(tick)と1秒足のOHLCVを 1e5〜1e8 行で作り, 各関数の時間とピークメモリを測ってJSONに保存します
+pandas/numpyの関数には同じ処理をpolarsで書いた参照実装を並べて測るので, polarsに移すとどれだけ変わるか比べられます
+
+python benchmarks/bench_analytics.py                                 # 1e5, 1e6行
+python benchmarks/bench_analytics.py --sizes 1e7 1e8 --functions trades_to_historical resample_ohlc
+python benchmarks/bench_analytics.py --compare benchmarks/results/analytics_20240101_000000.json
+
+1ケースごとに新しいプロセス(spawn)で測るので, 前のケースのメモリが残りません
+ピークメモリはRSS(/proc/self/statm)を1msごとに読んだ最大値と呼び出し前の差です(Rustのpolarsの確保も含みます)
+1回目の呼び出しで測るので, polarsのスレッドプールなど初回だけの確保も含みます
+1e8行の約定データはそれだけで数GBになるので, メモリの大きいマシンで実行してください
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import warnings
+import multiprocessing
+from datetime import datetime
+# pip install -e . をしていなくても python benchmarks/bench_analytics.py で実行できるように, リポジトリのルートから読み込みます
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Pythonのループを含むので, 指定がなければこの行数までにします(--no-capで外せます)
+MAX_ROWS = {"plot_corrcoef": 10 ** 6}
+START = datetime(2024, 1, 1)
+
+
+def make_trades(n: int, seed: int = 0) -> dict:
+    """
+    平均10ms間隔の約定です 価格は1円刻みのランダムウォーク
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    ts = np.datetime64(START, "ns") + np.cumsum(rng.exponential(1e7, n)).astype("timedelta64[ns]")
+    price = (10000000 + np.cumsum(rng.choice(np.array([-1, 0, 1], dtype=np.int64), n, p=[0.3, 0.4, 0.3]))).astype(float)
+    size = rng.exponential(0.01, n).round(8)
+    side = np.where(rng.random(n) < 0.5, "BUY", "SELL")
+    return {"datetime": ts, "price": price, "size": size, "side": side}
+
+
+def make_ohlcv(n: int, seed: int = 0) -> dict:
+    """
+    1秒足です
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    ts = np.datetime64(START, "ns") + np.arange(n, dtype="timedelta64[s]").astype("timedelta64[ns]")
+    close = 10000000 + np.cumsum(rng.normal(0, 100, n))
+    spread = np.abs(rng.normal(0, 50, n))
+    return {"datetime": ts, "open": close - rng.normal(0, 30, n), "high": close + spread, "low": close - spread,
+            "close": close, "volume": rng.exponential(0.1, n)}
+
+
+def pandas_frame(columns: dict):
+    import pandas as pd
+    columns = dict(columns)
+    index = pd.DatetimeIndex(columns.pop("datetime"), name="datetime")
+    return pd.DataFrame(columns, index=index)
+
+
+def polars_frame(columns: dict):
+    import polars as pl
+    return pl.DataFrame(columns)
+
+
+# polarsの参照実装 utilの関数と同じ結果の形にします
+def trades_to_historical_polars(df, every: str = "1s"):
+    import polars as pl
+    is_buy = pl.col("side") == "BUY"
+    ohlc = ["open", "high", "low", "close"]
+    return (df.group_by_dynamic("datetime", every=every)
+            .agg(open=pl.col("price").first(), high=pl.col("price").max(), low=pl.col("price").min(),
+                 close=pl.col("price").last(), volume=pl.col("size").sum(),
+                 buyVol=pl.col("size").filter(is_buy).sum(), sellVol=pl.col("size").filter(~is_buy).sum())
+            .upsample("datetime", every=every)
+            .with_columns(pl.col(ohlc).forward_fill(), pl.col(["volume", "buyVol", "sellVol"]).fill_null(0)))
+
+
+def resample_ohlc_polars(df, timeframe: int):
+    import polars as pl
+    every = f"{timeframe}m"
+    return (df.group_by_dynamic("datetime", every=every)
+            .agg(pl.col("open").first(), pl.col("high").max(), pl.col("low").min(), pl.col("close").last(),
+                 pl.col("volume").sum())
+            .upsample("datetime", every=every)
+            .with_columns(pl.col("close").forward_fill())
+            .with_columns(pl.col(["open", "high", "low"]).fill_null(pl.col("close")), pl.col("volume").fill_null(0)))
+
+
+def simple_regression_polars(df):
+    import polars as pl
+    return df.select(pl.corr("x", "y") ** 2).item()
+
+
+def _case_trades_to_historical(backend: str, n: int):
+    if backend == "pandas":
+        from wrappy.util import trades_to_historical
+        df = pandas_frame(make_trades(n))
+        return lambda: trades_to_historical(df, "1s")
+    df = polars_frame(make_trades(n))
+    return lambda: trades_to_historical_polars(df, "1s")
+
+
+def _case_resample_ohlc(backend: str, n: int):
+    if backend == "pandas":
+        from wrappy.util import resample_ohlc
+        df = pandas_frame(make_ohlcv(n))
+        return lambda: resample_ohlc(df, 1)
+    df = polars_frame(make_ohlcv(n))
+    return lambda: resample_ohlc_polars(df, 1)
+
+
+def _case_df_list(backend: str, n: int):
+    from wrappy.util import df_list
+    df = polars_frame(make_trades(n))
+    days = (df["datetime"][-1] - df["datetime"][0]).days + 2
+    return lambda: df_list(df, START, 1, days, "datetime")
+
+
+def _case_np_shift(backend: str, n: int):
+    price = make_trades(n)["price"]
+    if backend == "numpy":
+        from wrappy.util import np_shift
+        return lambda: np_shift(price, 1)
+    import polars as pl
+    series = pl.Series("price", price)
+    return lambda: series.shift(1)
+
+
+def _xy(n: int):
+    import numpy as np
+    rng = np.random.default_rng(0)
+    x = rng.normal(0, 1, n)
+    return x, 0.1 * x + rng.normal(0, 1, n)
+
+
+def _case_simple_regression(backend: str, n: int):
+    x, y = _xy(n)
+    if backend == "numpy":
+        from wrappy.util import simple_regression
+        return lambda: simple_regression(x, y)
+    df = polars_frame({"x": x, "y": y})
+    return lambda: simple_regression_polars(df)
+
+
+def _case_plot_corrcoef(backend: str, n: int):
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot as plt
+    from wrappy.util import plot_corrcoef
+    x, y = _xy(n)
+    output_dir = tempfile.mkdtemp()
+
+    def run():
+        plot_corrcoef(x, y, output_dir=output_dir)
+        plt.close("all")
+    return run
+
+
+# {関数名: {バックエンド: ケースを作る関数}}
+CASES = {
+    "trades_to_historical": {"pandas": _case_trades_to_historical, "polars": _case_trades_to_historical},
+    "resample_ohlc": {"pandas": _case_resample_ohlc, "polars": _case_resample_ohlc},
+    "df_list": {"polars": _case_df_list},
+    "np_shift": {"numpy": _case_np_shift, "polars": _case_np_shift},
+    "simple_regression": {"numpy": _case_simple_regression, "polars": _case_simple_regression},
+    "plot_corrcoef": {"numpy": _case_plot_corrcoef},
+}
+
+
+def _rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class PeakRSS(object):
+    """
+    with の間のRSSの最大値を別スレッドで読みます. /procが無いOSではNoneです
+    """
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.peak = None
+        self._running = False
+
+    def _sample(self):
+        while self._running:
+            self._max = max(self._max, _rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        if not os.path.exists("/proc/self/statm"):
+            return self
+        self._base = self._max = _rss()
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        if self._running:
+            self._running = False
+            self._thread.join()
+            self.peak = max(self._max, _rss()) - self._base
+
+
+def run_case(function: str, backend: str, rows: int, repeat: int) -> dict:
+    """
+    子プロセスで実行します. データを作ってから1回目でピークメモリを測り, 残りで時間を測ります
+    """
+    warnings.simplefilter("ignore")
+    func = CASES[function][backend](backend, rows)
+    with PeakRSS() as peak:
+        start = time.perf_counter()
+        func()
+        first = time.perf_counter() - start
+    times = [first]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    seconds = min(times)
+    return {"function": function, "backend": backend, "rows": rows, "seconds": seconds,
+            "rows_per_sec": rows / seconds if seconds else 0.0,
+            "peak_mb": None if peak.peak is None else peak.peak / 2 ** 20}
+
+
+def versions() -> dict:
+    import numpy, pandas, polars, matplotlib
+    return {"python": sys.version.split()[0], "numpy": numpy.__version__, "pandas": pandas.__version__,
+            "polars": polars.__version__, "matplotlib": matplotlib.__version__}
+
+
+def key(result: dict) -> tuple:
+    return result["function"], result["backend"], result["rows"]
+
+
+def print_header():
+    print(f"{'function':22}{'backend':>9}{'rows':>12}{'seconds':>11}{'rows/sec':>17}{'peak MB':>10}{'vs prev':>9}")
+
+
+def print_row(r: dict, previous: dict):
+    prev = previous.get(key(r))
+    delta = f"{prev['seconds'] / r['seconds']:8.2f}x" if prev and r["seconds"] else f"{'-':>9}"
+    peak = "-" if r["peak_mb"] is None else f"{r['peak_mb']:.1f}"
+    print(f"{r['function']:22}{r['backend']:>9}{r['rows']:>12,}{r['seconds']:11.6f}{r['rows_per_sec']:17,.0f}"
+          f"{peak:>10}{delta}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="util analytics benchmark")
+    parser.add_argument("--sizes", nargs="*", type=float, default=[1e5, 1e6], help="行数 1e5 1e6 1e7 1e8")
+    parser.add_argument("--functions", nargs="*", default=list(CASES))
+    parser.add_argument("--backends", nargs="*", default=["pandas", "numpy", "polars"])
+    parser.add_argument("--repeat", type=int, default=3, help="一番速い回を使います")
+    parser.add_argument("--no-cap", action="store_true", help="MAX_ROWSの上限を外します")
+    parser.add_argument("--output", help="結果のJSON 指定なしは benchmarks/results/analytics_日時.json")
+    parser.add_argument("--compare", help="比べる前回の結果のJSON")
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = {key(r): r for r in json.load(f)["results"]}
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    print_header()
+    for function in args.functions:
+        for backend in CASES[function]:
+            if backend not in args.backends:
+                continue
+            for size in args.sizes:
+                rows = int(size)
+                if not args.no_cap and rows > MAX_ROWS.get(function, rows):
+                    continue
+                with ctx.Pool(1, maxtasksperchild=1) as pool:
+                    result = pool.apply(run_case, (function, backend, rows, args.repeat))
+                results.append(result)
+                print_row(result, previous)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"analytics_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"versions": versions(), "platform": sys.platform, "cpus": os.cpu_count(),
+                   "created": datetime.now().isoformat(timespec="seconds"), "results": results}, f, indent=2)
+    print(f"saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Decimal と fixed-point(int) の速度比較です
+parse: APIの数値文字列の変換(同じ値が繰り返し来る想定 str_to_fixedのキャッシュが効きます)
+parse_cold: 全て違う値の変換(キャッシュに無い値)
+position: bitflyer._apply_execution でのポジション計算 / format: 発注時の文字列化
+
+python benchmarks/bench_fixedpoint.py            # 計測してベースラインと比較 悪化していれば終了コード1
+python benchmarks/bench_fixedpoint.py --save     # ベースラインを保存
+
+ベースラインはマシンに依存するので, 同じマシンで取ったもの同士で比べてください
+"""
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+from decimal import Decimal
+from types import SimpleNamespace
+# pip install -e . をしていなくても python benchmarks/bench_fixedpoint.py で実行できるように, リポジトリのルートから読み込みます
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wrappy.bitflyer import bitflyer
+from wrappy.fixedpoint import FixedPoint
+from wrappy.models import _fixed_caches
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "fixedpoint.json")
+N = 100_000
+REPEAT = 5
+
+
+def make_data(n: int):
+    random.seed(0)
+    sides = ["BUY" if random.random() < 0.5 else "SELL" for _ in range(n)]
+    sizes = [f"{random.randint(1, 500) / 100:.2f}" for _ in range(n)]
+    # 全て違う値 キャッシュに無い値の変換を測ります
+    cold_sizes = [f"{i / 10 ** 8:.8f}" for i in range(1, n + 1)]
+    # 発注数量は数種類のロットを繰り返し使う想定
+    order_sizes = [random.choice(["0.01", "0.02", "0.05", "0.1"]) for _ in range(n)]
+    return sides, sizes, cold_sizes, order_sizes
+
+
+def bench(func, n: int, repeat: int, setup=None) -> float:
+    timer = timeit.Timer(func)
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        seconds = timer.timeit(number=1)
+        best = seconds if best is None else min(best, seconds)
+    return best * 1e9 / n
+
+
+def measure(n: int, repeat: int) -> dict:
+    sides, sizes, cold_sizes, order_sizes = make_data(n)
+    fp = FixedPoint(price_decimals=0, size_decimals=8)
+    dec_sizes = [Decimal(s) for s in sizes]
+    fix_sizes = [fp.size(s) for s in sizes]
+    dec_orders = [Decimal(s) for s in order_sizes]
+    fix_orders = [fp.size(s) for s in order_sizes]
+    clear = _fixed_caches[fp.size_decimals].clear
+
+    def position(values):
+        bot = SimpleNamespace(position={})
+        apply = bitflyer._apply_execution
+        for side, size in zip(sides, values):
+            apply(bot, side, size)
+
+    cases = {
+        "parse": (lambda: [Decimal(str(s)) for s in sizes], lambda: [fp.size(s) for s in sizes], None),
+        "parse_cold": (lambda: [Decimal(str(s)) for s in cold_sizes], lambda: [fp.size(s) for s in cold_sizes], clear),
+        "position": (lambda: position(dec_sizes), lambda: position(fix_sizes), None),
+        "format": (lambda: [str(s) for s in dec_orders], lambda: [fp.size_str(s) for s in fix_orders], None),
+    }
+    return {name: {"decimal_ns": bench(dec, n, repeat), "fixed_ns": bench(fix, n, repeat, setup)}
+            for name, (dec, fix, setup) in cases.items()}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is not None and result["fixed_ns"] > base["fixed_ns"] * (1 + tolerance):
+            regressions.append(f"{name}: {base['fixed_ns']:.1f} ns -> {result['fixed_ns']:.1f} ns")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="wrappy fixed-point benchmark")
+    parser.add_argument("--n", type=int, default=N)
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="繰り返して一番速い回を使います")
+    parser.add_argument("--save", action="store_true", help="結果をベースラインとして保存します")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="悪化とみなす割合")
+    args = parser.parse_args()
+
+    results = measure(args.n, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print(f"{'ns/op':12}{'decimal':>10}{'fixed':>10}{'speedup':>10}{'base':>10}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        base_ns = f"{base['fixed_ns']:10.1f}" if base else f"{'-':>10}"
+        print(f"{name:12}{r['decimal_ns']:10.1f}{r['fixed_ns']:10.1f}{r['decimal_ns'] / r['fixed_ns']:9.2f}x{base_ns}")
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "results": results}, f, indent=2)
+        print(f"saved {args.baseline}")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+import wrappy の起動時間のベンチマークです
+文ごとに新しいPythonのプロセスで実行し, 読み込みにかかった時間とRSSの増加, 読み込まれた重いモジュールを測ります
+import wrappy と from wrappy import GMO で numpy, pandas, polars, matplotlib を読み込んでいれば失敗します
+
+python benchmarks/bench_import.py            # 計測してベースラインと比較 悪化していれば終了コード1
+python benchmarks/bench_import.py --save     # ベースラインを保存
+python benchmarks/bench_import.py --top 15   # import wrappy で時間のかかっているモジュールを表示します(-X importtime)
+
+ベースラインはマシンに依存するので, 同じマシンで取ったもの同士で比べてください
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "import.json")
+HEAVY = ("numpy", "pandas", "polars", "matplotlib", "optuna")
+# {名前: (文, 重いモジュールを読み込んではいけなければTrue)}
+CASES = {
+    "wrappy": ("import wrappy", True),
+    "gmo": ("from wrappy import GMO", True),
+    "lazy_util": ("from wrappy import np_shift", False),
+    "util": ("import wrappy.util", False),
+    "pybotters": ("import pybotters", True),
+}
+# 子プロセスで実行するコードです. Python自体の起動は含めず, 文の実行だけを測ります
+CHILD = """
+import sys, json, time
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * __import__("os").sysconf("SC_PAGE_SIZE")
+before = rss()
+start = time.perf_counter()
+exec({statement!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "rss_mb": (rss() - before) / 2 ** 20, "modules": len(sys.modules),
+                  "heavy": sorted({{m.split(".")[0] for m in sys.modules}} & set({heavy!r}))}}))
+"""
+
+
+def run(statement: str) -> dict:
+    code = CHILD.format(statement=statement, heavy=HEAVY)
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat: int, only=None) -> dict:
+    """
+    文ごとにrepeat回プロセスを起動して, 一番速い回を使います(ディスクキャッシュの影響を除くため)
+    """
+    results = {}
+    for name, (statement, lean) in CASES.items():
+        if only and name not in only:
+            continue
+        runs = [run(statement) for _ in range(repeat)]
+        best = min(runs, key=lambda r: r["seconds"])
+        results[name] = {"statement": statement, "ms": best["seconds"] * 1000, "rss_mb": best["rss_mb"],
+                         "modules": best["modules"], "heavy": best["heavy"], "lean": lean}
+    return results
+
+
+def importtime(statement: str, top: int) -> list:
+    """
+    -X importtime の結果から, 累積時間の長いモジュールを返します [(モジュール, ms), ...]
+    """
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(cumulative) / 1000))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    読み込み時間かRSSがtoleranceを超えて増えたもの, 読み込んではいけない重いモジュールを読み込んだものを返します
+    """
+    regressions = []
+    for name, result in results.items():
+        if result["lean"] and result["heavy"]:
+            regressions.append(f"{name}: imports {', '.join(result['heavy'])}")
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["ms"] > base["ms"] * (1 + tolerance) + 5:
+            regressions.append(f"{name}: {base['ms']:.1f} ms -> {result['ms']:.1f} ms")
+        if result["rss_mb"] > base["rss_mb"] * (1 + tolerance) + 2:
+            regressions.append(f"{name}: {base['rss_mb']:.1f} MB -> {result['rss_mb']:.1f} MB")
+    return regressions
+
+
+def print_table(results: dict, baseline: dict):
+    print(f"{'case':12}{'statement':32}{'ms':>9}{'base ms':>9}{'RSS MB':>8}{'modules':>9}  heavy")
+    for name, r in results.items():
+        base = baseline.get(name)
+        base_ms = f"{base['ms']:9.1f}" if base else f"{'-':>9}"
+        print(f"{name:12}{r['statement']:32}{r['ms']:9.1f}{base_ms}{r['rss_mb']:8.1f}{r['modules']:9}  "
+              f"{', '.join(r['heavy']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="wrappy import time benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返して一番速い回を使います")
+    parser.add_argument("--only", nargs="*", help=" ".join(CASES))
+    parser.add_argument("--top", type=int, default=0, help="import wrappy で時間のかかっているモジュールを表示します")
+    parser.add_argument("--save", action="store_true", help="結果をベースラインとして保存します")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="悪化とみなす割合")
+    args = parser.parse_args()
+
+    results = measure(args.repeat, args.only)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+    if args.top:
+        print()
+        for name, ms in importtime(CASES["wrappy"][0], args.top):
+            print(f"{ms:9.1f} ms  {name}")
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "results": results}, f, indent=2)
+        print(f"saved {args.baseline}")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
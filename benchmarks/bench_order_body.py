@@ -0,0 +1,143 @@
+"""
+発注の本文(JSON)を作るベンチマークです
+dict+json: 以前の方法 注文ごとにNoneの項目も含めたdictを作り, pybottersと同じくjson.dumpsでJSONにします
+dict+fastjson: 同じdictをwrappy.fastjson.dumpsでJSONにします
+body: 各取引所クラスの_replace_orderと同じく, Noneの項目を入れないdictを作ってwrappy.fastjson.dumpsでJSONにします
+1回あたりのマイクロ秒と本文のバイト数を出し, bodyの本文が以前の本文からNoneの項目を除いたものと同じことを確認します
+
+python benchmarks/bench_order_body.py            # 計測してベースラインと比較 悪化していれば終了コード1
+python benchmarks/bench_order_body.py --save     # ベースラインを保存
+
+ベースラインはマシンに依存するので, 同じマシンで取ったもの同士で比べてください
+"""
+import os
+import sys
+import json
+import timeit
+import argparse
+# pip install -e . をしていなくても python benchmarks/bench_order_body.py で実行できるように, リポジトリのルートから読み込みます
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wrappy.fastjson import dumps, loads, json_number, BACKEND
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "order_body.json")
+
+
+def gmo_dict(side, size, price):
+    return {"symbol": "BTC_JPY", "side": side, "executionType": "LIMIT", "timeInForce": None, "losscutPrice": None,
+            "cancelBefore": False, "size": size, "price": price}
+
+
+def bitbank_dict(side, size, price):
+    return {"pair": "btc_jpy", "amount": size, "side": side, "position_side": None, "type": "limit",
+            "post_only": False, "price": price}
+
+
+def bitflyer_dict(side, size, price):
+    return {"product_code": "FX_BTC_JPY", "child_order_type": "LIMIT", "side": side, "size": float(size),
+            "minute_to_expire": 43200, "time_in_force": "GTC", "price": price}
+
+
+def gmo_body(side, size, price, time_in_force=None, losscut_price=None):
+    data = {"symbol": "BTC_JPY", "side": side, "executionType": "LIMIT"}
+    if time_in_force is not None:
+        data["timeInForce"] = time_in_force
+    if losscut_price is not None:
+        data["losscutPrice"] = losscut_price
+    data["cancelBefore"] = False
+    data["size"] = size
+    data["price"] = price
+    return dumps(data)
+
+
+def bitbank_body(side, size, price, position_side=None):
+    request = {"pair": "btc_jpy", "amount": size, "side": side}
+    if position_side is not None:
+        request["position_side"] = position_side
+    request["type"] = "limit"
+    request["post_only"] = False
+    request["price"] = price
+    return dumps(request)
+
+
+def bitflyer_body(side, size, price):
+    # 数量は元の値と同じ数値になるint/floatにします
+    return dumps({"product_code": "FX_BTC_JPY", "child_order_type": "LIMIT", "side": side, "size": json_number(size),
+                  "minute_to_expire": 43200, "time_in_force": "GTC", "price": json_number(price)})
+
+
+def make_cases() -> dict:
+    """
+    {名前: (以前のdictを作る関数, 本文を作る関数, 引数)} 本文は各取引所クラスの_replace_orderと同じ項目です
+    """
+    return {"gmo": (gmo_dict, gmo_body, ("BUY", "0.01", "5000000")),
+            "bitbank": (bitbank_dict, bitbank_body, ("buy", "0.01", "5000000")),
+            "bitflyer": (bitflyer_dict, bitflyer_body, ("BUY", "0.01", 5000000))}
+
+
+def per_call_us(func, number: int, repeat: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def measure(number: int, repeat: int) -> dict:
+    results = {}
+    for name, (make_dict, make_body, args) in make_cases().items():
+        old = json.dumps(make_dict(*args)).encode()
+        new = make_body(*args)
+        expected = {k: v for k, v in make_dict(*args).items() if v is not None}
+        if loads(new) != expected:
+            raise AssertionError(f"{name}: {new!r} != {expected!r}")
+        results[name] = {
+            "dict_json_us": per_call_us(lambda: json.dumps(make_dict(*args)).encode(), number, repeat),
+            "dict_fastjson_us": per_call_us(lambda: dumps(make_dict(*args)), number, repeat),
+            "body_us": per_call_us(lambda: make_body(*args), number, repeat),
+            "dict_bytes": len(old),
+            "body_bytes": len(new),
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is not None and "body_us" in base and result["body_us"] > base["body_us"] * (1 + tolerance):
+            regressions.append(f"{name}: {base['body_us']:.2f} us -> {result['body_us']:.2f} us")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="wrappy order body benchmark")
+    parser.add_argument("--number", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返して一番速い回を使います")
+    parser.add_argument("--save", action="store_true", help="結果をベースラインとして保存します")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="悪化とみなす割合")
+    args = parser.parse_args()
+
+    results = measure(args.number, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print(f"fastjson backend: {BACKEND}")
+    print(f"{'case':10}{'dict+json us':>14}{'dict+fast us':>14}{'body us':>9}{'base us':>9}{'bytes':>12}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        base_us = f"{base['body_us']:9.2f}" if base and "body_us" in base else f"{'-':>9}"
+        print(f"{name:10}{r['dict_json_us']:14.2f}{r['dict_fastjson_us']:14.2f}{r['body_us']:9.2f}{base_us}"
+              f"{r['dict_bytes']:6} -> {r['body_bytes']}")
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "backend": BACKEND,
+                       "results": results}, f, indent=2)
+        print(f"saved {args.baseline}")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+発注経路のベンチマークです
+REST: モックサーバー(wrappy.mockserver)を別プロセスで起動し, 各取引所クラスの limit_order, cancel_all_orders, fetch_my_position を呼びます
+ws: 取引所の形式のメッセージ(bytes)を ws_handler -> DataStore.onmessage -> OrderLatency.onmessage に流します
+ops/sec, p50/p99レイテンシ, 1回あたりのメモリ確保量(tracemalloc のピーク)を出し, 保存したベースラインと比べます
+
+python benchmarks/bench_order_path.py           # 計測してベースラインと比較 悪化していれば終了コード1
+python benchmarks/bench_order_path.py --save    # ベースラインを保存
+python benchmarks/bench_order_path.py --only gmo --n 200
+
+client: リクエストごとにClientを作る(BotBaseの既定) / pool: TransportPoolで接続を使い回す(Runtimeの既定)
+ベースラインはマシンに依存するので, 同じマシンで取ったもの同士で比べてください
+bitbankのwebsocketはsocket.io/PubNub形式でws_handlerを通らないのでwsの計測はGMOとbitflyerだけです
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import pybotters
+# pip install -e . をしていなくても python benchmarks/bench_order_path.py で実行できるように, リポジトリのルートから読み込みます
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wrappy.gmo import GMO
+from wrappy.bitbank import BitBank
+from wrappy.bitflyer import bitflyer
+from wrappy.fastjson import ws_handler
+from wrappy.metrics import Histogram
+from wrappy.mockserver import MockExchangeServer
+from wrappy.transport import TransportPool
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "order_path.json")
+N = 200
+WS_N = 10_000
+REPEAT = 3
+ALLOC_N = 50
+# 板から離れた指値 約定せずに板に残ります
+FAR_PRICE = 5000000
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> subprocess.Popen:
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(p for p in sys.path if p)}
+    process = subprocess.Popen([sys.executable, "-m", "wrappy.mockserver", "--port", str(port), "--volatility", "0"],
+                               env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("mock server did not start")
+
+
+def make_bots(port: int, log_dir: str) -> dict:
+    config = {"log_dir": log_dir, "gmocoin": ["key", "secret"], "bitbank": ["key", "secret"],
+              "bitflyer": ["key", "secret"], **MockExchangeServer(port=port).config()}
+    bots = {"gmo": GMO(config, "BTC_JPY"), "bitbank": BitBank(config, "btc_jpy"),
+            "bitflyer": bitflyer(config, "FX_BTC_JPY")}
+    for bot in bots.values():
+        bot.logger.setLevel(logging.WARNING)
+    return bots
+
+
+def rest_ops(name: str, bot) -> dict:
+    """
+    {操作名: (計測するコルーチン関数, 毎回の前に呼ぶ準備のコルーチン関数)} です
+    """
+    if name == "gmo":
+        place = lambda: bot.limit_order("BUY", "0.01", FAR_PRICE)
+        fetch = bot.fetch_my_position
+    elif name == "bitbank":
+        place = lambda: bot.limit_order("buy", "0.01", FAR_PRICE)
+        fetch = lambda: bot.fetch_my_positions(bot.symbol)
+    else:
+        place = lambda: bot.limit_order("BUY", 0.01, FAR_PRICE)
+        fetch = bot.fetch_my_position
+    return {"limit_order": (place, None), "cancel_all_orders": (bot.cancel_all_orders, place),
+            "fetch_my_position": (fetch, None)}
+
+
+def summarize(histogram: Histogram, elapsed: float, alloc: float) -> dict:
+    return {"ops_per_sec": histogram.count / elapsed if elapsed else 0.0, "p50_us": histogram.quantile(0.5) * 1e6,
+            "p99_us": histogram.quantile(0.99) * 1e6, "alloc_bytes": alloc}
+
+
+def best(results: list) -> dict:
+    """
+    繰り返しの中で一番速かった回です(他のプロセスの影響を除くため timeit.repeat の min と同じ考え方です)
+    """
+    return max(results, key=lambda r: r["ops_per_sec"])
+
+
+async def measure_async(op, prepare, n: int, repeat: int) -> dict:
+    for _ in range(min(20, n)):
+        if prepare is not None:
+            await prepare()
+        await op()
+    rounds = []
+    for _ in range(repeat):
+        histogram = Histogram()
+        elapsed = 0.0
+        for _ in range(n):
+            if prepare is not None:
+                await prepare()
+            start = time.perf_counter()
+            await op()
+            took = time.perf_counter() - start
+            elapsed += took
+            histogram.record(took)
+        rounds.append(summarize(histogram, elapsed, 0.0))
+    # メモリ確保量は時間の計測と分けて取ります(tracemalloc中は遅くなるため)
+    tracemalloc.start()
+    total = 0
+    for _ in range(ALLOC_N):
+        if prepare is not None:
+            await prepare()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await op()
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return {**best(rounds), "alloc_bytes": total / ALLOC_N}
+
+
+def measure_sync(make, messages: list, repeat: int) -> dict:
+    perf_counter = time.perf_counter
+    rounds = []
+    for _ in range(repeat):
+        func = make()
+        for message in messages[:1000]:
+            func(message)
+        histogram = Histogram()
+        elapsed = 0.0
+        for message in messages:
+            start = perf_counter()
+            func(message)
+            took = perf_counter() - start
+            elapsed += took
+            histogram.record(took)
+        rounds.append(summarize(histogram, elapsed, 0.0))
+    func = make()
+    for message in messages[:1000]:
+        func(message)
+    tracemalloc.start()
+    total = 0
+    for message in messages[1000:1000 + ALLOC_N * 10]:
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func(message)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return {**best(rounds), "alloc_bytes": total / (ALLOC_N * 10)}
+
+
+def gmo_messages(n: int) -> list:
+    messages = []
+    for i in range(n):
+        price = 10000000 + i % 200
+        kind = i % 4
+        if kind == 0:
+            messages.append({"channel": "orderbooks", "symbol": "BTC_JPY", "timestamp": "2024-01-01T00:00:00.000Z",
+                             "asks": [{"price": str(price + j), "size": "0.1"} for j in range(20)],
+                             "bids": [{"price": str(price - j - 1), "size": "0.1"} for j in range(20)]})
+        elif kind == 1:
+            messages.append({"channel": "trades", "symbol": "BTC_JPY", "side": "BUY", "price": str(price),
+                             "size": "0.01", "timestamp": "2024-01-01T00:00:00.000Z"})
+        elif kind == 2:
+            messages.append({"channel": "orderEvents", "orderId": i, "symbol": "BTC_JPY", "settleType": "OPEN",
+                             "executionType": "LIMIT", "side": "BUY", "orderStatus": "ORDERED", "cancelType": "",
+                             "orderTimestamp": "2024-01-01T00:00:00.000Z", "orderPrice": str(price),
+                             "orderSize": "0.01", "orderExecutedSize": "0", "losscutPrice": "0",
+                             "timeInForce": "FAS", "msgType": "NOR"})
+        else:
+            messages.append({"channel": "executionEvents", "orderId": i - 1, "executionId": i, "symbol": "BTC_JPY",
+                             "settleType": "OPEN", "executionType": "LIMIT", "side": "BUY",
+                             "executionPrice": str(price), "executionSize": "0.01", "positionId": i,
+                             "orderTimestamp": "2024-01-01T00:00:00.000Z",
+                             "executionTimestamp": "2024-01-01T00:00:00.000Z", "lossGain": "0", "fee": "0",
+                             "orderPrice": str(price), "orderSize": "0.01", "orderExecutedSize": "0.01",
+                             "timeInForce": "FAS", "msgType": "ER"})
+    return [json.dumps(m).encode() for m in messages]
+
+
+def bitflyer_messages(n: int) -> list:
+    def message(channel, body):
+        return {"jsonrpc": "2.0", "method": "channelMessage", "params": {"channel": channel, "message": body}}
+    messages = []
+    for i in range(n):
+        price = 10000000 + i % 200
+        kind = i % 4
+        acceptance_id = f"JRF{i - i % 4:012d}"
+        if kind == 0:
+            messages.append(message("lightning_board_FX_BTC_JPY", {
+                "mid_price": price, "bids": [{"price": price - j - 1, "size": 0.1} for j in range(5)],
+                "asks": [{"price": price + j, "size": 0.1} for j in range(5)]}))
+        elif kind == 1:
+            messages.append(message("lightning_executions_FX_BTC_JPY", [
+                {"id": i, "side": "BUY", "price": price, "size": 0.01, "exec_date": "2024-01-01T00:00:00.000Z",
+                 "buy_child_order_acceptance_id": acceptance_id, "sell_child_order_acceptance_id": ""}]))
+        elif kind == 2:
+            messages.append(message("child_order_events", [
+                {"product_code": "FX_BTC_JPY", "child_order_id": f"JOR{i:012d}",
+                 "child_order_acceptance_id": acceptance_id, "event_date": "2024-01-01T00:00:00.000Z",
+                 "event_type": "ORDER", "child_order_type": "LIMIT", "side": "BUY", "price": price, "size": 0.01,
+                 "expire_date": ""}]))
+        else:
+            messages.append(message("child_order_events", [
+                {"product_code": "FX_BTC_JPY", "child_order_id": f"JOR{i:012d}",
+                 "child_order_acceptance_id": acceptance_id, "event_date": "2024-01-01T00:00:00.000Z",
+                 "event_type": "EXECUTION", "exec_id": i, "side": "BUY", "price": price, "size": 0.01,
+                 "commission": 0, "sfd": 0, "outstanding_size": 0}]))
+    return [json.dumps(m).encode() for m in messages]
+
+
+def ws_cases(bots: dict, n: int) -> dict:
+    """
+    {取引所: (ハンドラを作る関数, メッセージ)} です 繰り返しごとに新しいDataStoreを使います
+    """
+    def factory(store_class, bot):
+        def make():
+            store = store_class()
+            # ボットがprivateのwebsocketに渡すのと同じハンドラです
+            hdlr = ws_handler(bot._latency_handler(store.onmessage))
+            return lambda raw: hdlr(raw, None)
+        return make
+
+    cases = {}
+    if "gmo" in bots:
+        cases["gmo"] = (factory(pybotters.GMOCoinDataStore, bots["gmo"]), gmo_messages(n))
+    if "bitflyer" in bots:
+        cases["bitflyer"] = (factory(pybotters.bitFlyerDataStore, bots["bitflyer"]), bitflyer_messages(n))
+    return cases
+
+
+async def run_rest(bots: dict, n: int, repeat: int) -> dict:
+    results = {}
+    for mode in ("client", "pool"):
+        transport = TransportPool() if mode == "pool" else None
+        for name, bot in bots.items():
+            bot.transport = transport
+            for op_name, (op, prepare) in rest_ops(name, bot).items():
+                results[f"rest/{mode}/{name}/{op_name}"] = await measure_async(op, prepare, n, repeat)
+                # 板に残った注文を消します
+                await bot.flatten(0.0001, timeout=30)
+            bot.transport = None
+        if transport is not None:
+            await transport.close()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    ops/secが下がったか, p50かメモリ確保量がtoleranceを超えて増えたものを返します
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] / (1 + tolerance):
+            regressions.append(f"{key}: ops/sec {base['ops_per_sec']:.0f} -> {result['ops_per_sec']:.0f}")
+        if result["p50_us"] > base["p50_us"] * (1 + tolerance):
+            regressions.append(f"{key}: p50 {base['p50_us']:.1f}us -> {result['p50_us']:.1f}us")
+        if result["alloc_bytes"] > base["alloc_bytes"] * (1 + tolerance) + 256:
+            regressions.append(f"{key}: alloc {base['alloc_bytes']:.0f}B -> {result['alloc_bytes']:.0f}B")
+    return regressions
+
+
+def print_table(results: dict, baseline: dict):
+    print(f"{'case':48}{'ops/sec':>10}{'p50 us':>10}{'p99 us':>10}{'alloc B':>10}{'vs base':>10}")
+    for key, r in results.items():
+        base = baseline.get(key)
+        delta = f"{r['ops_per_sec'] / base['ops_per_sec']:9.2f}x" if base else f"{'-':>10}"
+        print(f"{key:48}{r['ops_per_sec']:10.0f}{r['p50_us']:10.1f}{r['p99_us']:10.1f}{r['alloc_bytes']:10.0f}{delta}")
+
+
+async def run(args) -> dict:
+    port = free_port()
+    server = start_server(port)
+    try:
+        with tempfile.TemporaryDirectory() as log_dir:
+            bots = make_bots(port, log_dir)
+            if args.only:
+                bots = {name: bot for name, bot in bots.items() if name in args.only}
+            results = {}
+            if not args.skip_rest:
+                results.update(await run_rest(bots, args.n, args.repeat))
+            for name, (make, messages) in ws_cases(bots, args.ws_n).items():
+                results[f"ws/{name}/onmessage"] = measure_sync(make, messages, args.repeat)
+            return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="order path benchmark")
+    parser.add_argument("--n", type=int, default=N, help="RESTの操作ごとの回数")
+    parser.add_argument("--ws-n", type=int, default=WS_N, help="websocketのメッセージ数")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="繰り返して一番速い回を使います")
+    parser.add_argument("--only", nargs="*", help="gmo bitbank bitflyer から選びます")
+    parser.add_argument("--skip-rest", action="store_true")
+    parser.add_argument("--save", action="store_true", help="結果をベースラインとして保存します")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="悪化とみなす割合 共有マシンでは揺れが大きいので大きめです")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "n": args.n, "ws_n": args.ws_n,
+                       "repeat": args.repeat,
+                       "results": results}, f, indent=2, sort_keys=True)
+        print(f"saved {args.baseline}")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
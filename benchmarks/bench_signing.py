@@ -0,0 +1,152 @@
+"""
+privateのAPIの署名のベンチマークです
+pybotters: pybotters.auth.Auth の関数(リクエストごとにHMACの鍵の準備, JsonPayload, ヘッダーの組み立て)
+signer: wrappy.signing.Signer.sign(鍵を準備済み, fastjson, ヘッダーはコピーして2つだけ入れます)
+hmac: 署名の計算だけ hmac.new と HmacKey
+1回あたりのマイクロ秒と, スレッドから同時に取ったnonceが重ならないことを確認します
+
+python benchmarks/bench_signing.py            # 計測してベースラインと比較 悪化していれば終了コード1
+python benchmarks/bench_signing.py --save     # ベースラインを保存
+
+ベースラインはマシンに依存するので, 同じマシンで取ったもの同士で比べてください
+"""
+import os
+import sys
+import hmac
+import json
+import timeit
+import hashlib
+import argparse
+import threading
+from yarl import URL
+from multidict import CIMultiDict
+from pybotters.auth import Auth
+# pip install -e . をしていなくても python benchmarks/bench_signing.py で実行できるように, リポジトリのルートから読み込みます
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wrappy.signing import get_signer, HmacKey, Nonce
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "signing.json")
+KEY = "0123456789abcdef0123456789abcdef"
+SECRET = "0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef"
+# {名前: (exchange_id, pybottersのAPI名, 署名の関数, base_url, パス, method, params, data)}
+CASES = {
+    "gmo_order": ("gmo", "gmocoin", Auth.gmocoin, "https://api.coin.z.com", "/private/v1/order", "POST", None,
+                  {"symbol": "BTC_JPY", "side": "BUY", "executionType": "LIMIT", "size": "0.01", "price": "5000000"}),
+    "gmo_active": ("gmo", "gmocoin", Auth.gmocoin, "https://api.coin.z.com", "/private/v1/activeOrders", "GET",
+                   {"symbol": "BTC_JPY", "page": 1, "count": 100}, None),
+    "bitbank_order": ("bitbank", "bitbank", Auth.bitbank, "https://api.bitbank.cc/v1", "/user/spot/order", "POST",
+                      None, {"pair": "btc_jpy", "amount": "0.01", "side": "buy", "type": "limit", "price": "5000000"}),
+    "bitflyer_order": ("bitflyer", "bitflyer", Auth.bitflyer, "https://api.bitflyer.com", "/v1/me/sendchildorder",
+                       "POST", None, {"product_code": "FX_BTC_JPY", "child_order_type": "LIMIT", "side": "BUY",
+                                      "size": 0.01, "price": 5000000}),
+}
+
+
+class _Session(object):
+    """
+    pybottersの署名の関数が読むsessionの代わりです(__dict__["_apis"]だけを使います)
+    """
+    def __init__(self, name: str):
+        self.__dict__["_apis"] = {name: [KEY, SECRET.encode()]}
+
+
+def pybotters_sign(name: str, auth, base_url: str, path: str, method: str, params, data):
+    session = _Session(name)
+    url = URL(base_url + path)
+
+    def sign():
+        # ClientRequestと同じくparamsをURLに入れてから署名します
+        target = url.with_query(params) if params else url
+        auth((method, target), {"data": data, "headers": CIMultiDict(), "session": session})
+    return sign
+
+
+def per_call_us(func, number: int, repeat: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def measure(number: int, repeat: int) -> dict:
+    results = {}
+    for name, (exchange_id, api_name, auth, base_url, path, method, params, data) in CASES.items():
+        signer = get_signer(exchange_id, KEY, SECRET)
+        results[name] = {
+            "pybotters_us": per_call_us(pybotters_sign(api_name, auth, base_url, path, method, params, data),
+                                        number, repeat),
+            "signer_us": per_call_us(lambda: signer.sign(method, base_url, path, params, data), number, repeat),
+        }
+    text = b"1700000000000POST/v1/order" + json.dumps(CASES["gmo_order"][-1]).encode()
+    key = HmacKey(SECRET)
+    results["hmac"] = {
+        "pybotters_us": per_call_us(lambda: hmac.new(SECRET.encode(), text, hashlib.sha256).hexdigest(),
+                                    number, repeat),
+        "signer_us": per_call_us(lambda: key.hexdigest(text), number, repeat),
+    }
+    return results
+
+
+def check_nonce(threads: int = 8, n: int = 20000) -> bool:
+    """
+    スレッドから同時にnonceを取って, 全て違う値で単調増加していればTrueです
+    """
+    nonce = Nonce()
+    values = [[] for _ in range(threads)]
+
+    def take(out: list):
+        for _ in range(n):
+            out.append(nonce.next())
+    workers = [threading.Thread(target=take, args=(out,)) for out in values]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    merged = [v for out in values for v in out]
+    return len(set(merged)) == len(merged) and all(out == sorted(out) for out in values)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is not None and result["signer_us"] > base["signer_us"] * (1 + tolerance):
+            regressions.append(f"{name}: {base['signer_us']:.2f} us -> {result['signer_us']:.2f} us")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="wrappy request signing benchmark")
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返して一番速い回を使います")
+    parser.add_argument("--save", action="store_true", help="結果をベースラインとして保存します")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="悪化とみなす割合")
+    args = parser.parse_args()
+
+    results = measure(args.number, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print(f"{'case':16}{'pybotters us':>14}{'signer us':>11}{'speedup':>9}{'base us':>9}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        base_us = f"{base['signer_us']:9.2f}" if base else f"{'-':>9}"
+        print(f"{name:16}{r['pybotters_us']:14.2f}{r['signer_us']:11.2f}{r['pybotters_us'] / r['signer_us']:8.2f}x"
+              f"{base_us}")
+    nonce_ok = check_nonce()
+    print(f"nonce unique and monotonic across threads: {nonce_ok}")
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "results": results}, f, indent=2)
+        print(f"saved {args.baseline}")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    if not nonce_ok:
+        regressions.append("nonce collided")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,5 +6,7 @@ setup(
     version='0.5.0',
     author='lawn',
     url='https://github.com/lawnn/wrappy.git',
-    install_requires=['requests', 'asyncio', 'pybotters', 'matplotlib', 'pandas', 'numpy', 'polars', 'pytz']
+    python_requires='>=3.11',
+    install_requires=['requests', 'asyncio', 'pybotters', 'matplotlib', 'pandas', 'numpy', 'polars', 'pytz'],
+    extras_require={'optimize': ['optuna'], 'fast': ['orjson', 'msgspec', 'uvloop']}
 )
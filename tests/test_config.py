@@ -0,0 +1,17 @@
+from wrappy.gmo import GMO
+from wrappy.metrics import registry
+
+
+def test_defaults(tmp_path):
+    bot = GMO({"log_dir": str(tmp_path), "gmocoin": ["key", "secret"]}, "BTC_JPY")
+    assert (bot.custom_url, bot.metrics, bot.order_history_dir) == (False, registry, str(tmp_path))
+    assert (bot.loop_lag_threshold, bot.record_dir, bot.paper) == (None, None, None)
+
+
+def test_overrides(tmp_path):
+    bot = GMO({"log_dir": str(tmp_path), "gmocoin": ["key", "secret"], "metrics": False,
+               "base_urls": {"gmo": "http://127.0.0.1:8080"}, "ws_urls": {"gmo": "ws://127.0.0.1:8080/ws"},
+               "loop_lag_threshold": 0.1, "record_dir": str(tmp_path / "record")}, "BTC_JPY")
+    assert (bot.custom_url, bot.base_url, bot.ws_url) == (True, "http://127.0.0.1:8080", "ws://127.0.0.1:8080/ws")
+    assert (bot.metrics, bot.order_latency, bot.loop_lag_threshold) == (None, None, 0.1)
+    assert bot.record_dir == str(tmp_path / "record")
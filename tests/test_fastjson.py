@@ -0,0 +1,31 @@
+import json
+from decimal import Decimal
+import pytest
+from wrappy.fastjson import dumps, json_number
+
+
+@pytest.mark.parametrize("value, expected", [
+    (Decimal("0.0100"), Decimal("0.01")),
+    (Decimal("1E+2"), 100),
+    (Decimal("1.5E-5"), Decimal("0.000015")),
+    (Decimal("5000000.00"), 5000000),
+    (Decimal("12345.12345678"), Decimal("12345.12345678")),
+    ("0.00000001", Decimal("0.00000001")),
+    (Decimal("0.00000001"), Decimal("0.00000001")),
+    (Decimal("-0.50"), Decimal("-0.5")),
+    ("123456789012.345", Decimal("123456789012.345")),
+    (5000000, 5000000),
+    (0.01, Decimal("0.01")),
+])
+def test_json_number(value, expected):
+    number = json_number(value)
+    assert type(number) is (int if isinstance(expected, int) else float)
+    # 送るJSONの数値は元の値と同じです(JSONの書き方はJSONライブラリによります)
+    assert json.loads(dumps(number), parse_float=Decimal) == expected
+
+
+@pytest.mark.parametrize("value", ["abc", "nan", "inf", Decimal("NaN"), float("inf"), True, None,
+                                   "1.2.3", "-", Decimal("0.1234567890123456"), "0.1234567890123456"])
+def test_json_number_rejects(value):
+    with pytest.raises(ValueError):
+        json_number(value)
@@ -0,0 +1,45 @@
+from decimal import Decimal
+import pytest
+from wrappy.models import str_to_fixed, fixed_to_str
+from wrappy.fixedpoint import FixedPoint
+
+
+@pytest.mark.parametrize("value, decimals, expected", [
+    ("0.0123", 4, 123),
+    ("0.01239", 4, 123),
+    ("5000000", 0, 5000000),
+    ("5000000.5", 1, 50000005),
+    ("0.5", 3, 500),
+    ("-0.0123", 4, -123),
+    (100, 2, 10000),
+    ("1E+2", 0, 100),
+    ("1.5e-05", 8, 1500),
+    (Decimal("1.5E-5"), 8, 1500),
+])
+def test_str_to_fixed(value, decimals, expected):
+    assert str_to_fixed(value, decimals) == expected
+
+
+@pytest.mark.parametrize("value, decimals, expected", [
+    (1.5e-05, 8, 1500),
+    (0.01, 8, 1000000),
+    (0.1, 1, 1),
+    (5000000.0, 0, 5000000),
+    (1e-09, 8, 0),
+])
+def test_str_to_fixed_float(value, decimals, expected):
+    # floatはreprで指数表記になることがあります
+    assert str_to_fixed(value, decimals) == expected
+
+
+@pytest.mark.parametrize("lots", [0, 1, 123, 100000000, 150000000, -1500])
+def test_round_trip(lots):
+    assert str_to_fixed(fixed_to_str(lots, 8), 8) == lots
+
+
+def test_fixed_point_scale():
+    fp = FixedPoint(price_decimals=2, size_decimals=4)
+    assert fp.price("90000.015") == 9000001
+    assert fp.size(0.00015) == 1
+    assert fp.price_str(900000000) == "9000000"
+    assert fp.size_str(15000) == "1.5"
@@ -0,0 +1,58 @@
+from decimal import Decimal
+import pytest
+from wrappy.gmo import GMO
+from wrappy.models import Numeric, gmo_executions, bitflyer_executions
+from wrappy.exceptions import ConfigException
+
+
+@pytest.mark.parametrize("value, expected", [
+    (Decimal("100"), "100"),
+    (Decimal("1E+2"), "100"),
+    (Decimal("0.0100"), "0.01"),
+    (Decimal("0.00000001"), "0.00000001"),
+    (Decimal("-2.50"), "-2.5"),
+])
+def test_size_str_decimal(value, expected):
+    assert Numeric().size_str(value) == expected
+
+
+def test_size_str_int():
+    num = Numeric("int", 0, 8)
+    assert num.size_str(num.size("100")) == "100"
+    assert num.size_str(num.size("0.01")) == "0.01"
+
+
+def test_fee_follows_mode():
+    data = {"list": [{"executionId": 1, "orderId": 2, "symbol": "BTC_JPY", "side": "BUY", "price": "5000000",
+                      "size": "0.01", "fee": "12", "timestamp": "2024-01-01T00:00:00.000Z"}]}
+    assert gmo_executions(data, Numeric())[0].fee == Decimal("12")
+    assert gmo_executions(data, Numeric("int", 1, 8))[0].fee == 120
+    commission = [{"id": 1, "child_order_acceptance_id": "JRF", "side": "BUY", "price": 5000000, "size": 0.01,
+                   "commission": 0.00001, "exec_date": "2024-01-01T00:00:00"}]
+    assert bitflyer_executions(commission, Numeric("int", 0, 8))[0].fee == 1000
+
+
+def make_bot(tmp_path, **config):
+    return GMO({"log_dir": str(tmp_path), "gmocoin": ["key", "secret"], **config}, "BTC_JPY")
+
+
+def test_numeric_mode_int_derives_fixed_point(tmp_path):
+    bot = make_bot(tmp_path, numeric_mode="int")
+    assert bot.fixed_point is not None
+    assert (bot.numeric.mode, bot.numeric.size_decimals) == ("int", bot.fixed_point.size_decimals)
+
+
+def test_fixed_point_enables_int_mode(tmp_path):
+    bot = make_bot(tmp_path, fixed_point={"price_decimals": 1, "size_decimals": 4})
+    assert bot.numeric.mode == "int"
+    assert (bot.numeric.price_decimals, bot.numeric.size_decimals) == (1, 4)
+
+
+def test_decimal_mode(tmp_path):
+    bot = make_bot(tmp_path)
+    assert bot.fixed_point is None and bot.numeric.mode == "decimal"
+
+
+def test_fixed_point_with_decimal_mode_is_rejected(tmp_path):
+    with pytest.raises(ConfigException):
+        make_bot(tmp_path, numeric_mode="decimal", fixed_point={"size_decimals": 4})
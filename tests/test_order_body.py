@@ -0,0 +1,90 @@
+import json
+import asyncio
+import logging
+import pytest
+from wrappy.gmo import GMO
+from wrappy.bitbank import BitBank
+from wrappy.bitflyer import bitflyer
+from wrappy.symbols import SymbolInfo
+from wrappy.mockserver import MockExchangeServer
+
+# 価格はtick(0.01円), 数量はlot(0.00000001)の整数で渡します
+FIXED_POINT = {"price_decimals": 2, "size_decimals": 8}
+SYMBOL_INFO = {"gmo": SymbolInfo("gmo", "BTC_JPY", "1", "0.0001", "0.0001"),
+               "bitbank": SymbolInfo("bitbank", "btc_jpy", "1", "0.0001", "0.0001"),
+               "bitflyer": SymbolInfo("bitflyer", "FX_BTC_JPY", "1", "0.00000001", "0.01")}
+
+
+class RecordingServer(MockExchangeServer):
+    """
+    受け取った発注の本文(bytes)を残すモックサーバーです
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bodies = []
+
+    async def _body(self, request) -> dict:
+        body = await request.read() if request.can_read_body else b""
+        if request.method == "POST":
+            self.bodies.append(body)
+        return json.loads(body) if body else {}
+
+
+def place(bot_class, symbol, order, tmp_path, symbol_info=None) -> bytes:
+    """
+    モックサーバーに発注し, 受け取った本文を返します
+    """
+    server = RecordingServer()
+
+    async def run():
+        async with server:
+            config = {"log_dir": str(tmp_path), "gmocoin": ["key", "secret"], "bitbank": ["key", "secret"],
+                      "bitflyer": ["key", "secret"], "fixed_point": FIXED_POINT, **server.config()}
+            bot = bot_class(config, symbol)
+            bot.logger.setLevel(logging.WARNING)
+            bot.symbol_info = symbol_info
+            await order(bot)
+    asyncio.run(run())
+    assert len(server.bodies) == 1
+    return server.bodies[0]
+
+
+# symbol_infoがあると数量は刻み(0.0001)の桁で送ります
+@pytest.mark.parametrize("loaded, size", [(False, "0.01"), (True, "0.0100")])
+def test_gmo_ticks_and_lots(tmp_path, loaded, size):
+    body = place(GMO, "BTC_JPY", lambda bot: bot.limit_order("BUY", 1000000, 900000000), tmp_path,
+                 SYMBOL_INFO["gmo"] if loaded else None)
+    assert json.loads(body) == {"symbol": "BTC_JPY", "executionType": "LIMIT", "cancelBefore": False, "side": "BUY",
+                                "size": size, "price": "9000000"}
+
+
+@pytest.mark.parametrize("loaded, size", [(False, "0.01"), (True, "0.0100")])
+def test_bitbank_ticks_and_lots(tmp_path, loaded, size):
+    body = place(BitBank, "btc_jpy", lambda bot: bot.limit_order("buy", 1000000, 900000000), tmp_path,
+                 SYMBOL_INFO["bitbank"] if loaded else None)
+    assert json.loads(body) == {"pair": "btc_jpy", "type": "limit", "position_side": "long", "post_only": False,
+                                "side": "buy", "amount": size, "price": "9000000"}
+
+
+# bitflyerは数量と価格を数値で送ります. 刻みの桁の数量も同じ数値です
+@pytest.mark.parametrize("loaded", [False, True])
+def test_bitflyer_ticks_and_lots(tmp_path, loaded):
+    body = place(bitflyer, "FX_BTC_JPY", lambda bot: bot.limit_order("BUY", 1000000, 900000000), tmp_path,
+                 SYMBOL_INFO["bitflyer"] if loaded else None)
+    assert body == (b'{"product_code":"FX_BTC_JPY","child_order_type":"LIMIT","side":"BUY","size":0.01,'
+                    b'"minute_to_expire":43200,"time_in_force":"GTC","price":9000000}')
+
+
+def test_gmo_losscut_price_is_per_order(tmp_path):
+    body = place(GMO, "BTC_JPY", lambda bot: bot.limit_order("BUY", 1000000, 900000000, losscut_price=800000000),
+                 tmp_path)
+    assert body == (b'{"symbol":"BTC_JPY","side":"BUY","executionType":"LIMIT","losscutPrice":"8000000",'
+                    b'"cancelBefore":false,"size":"0.01","price":"9000000"}')
+
+
+def test_pybotters_fallback_passes_dict(tmp_path):
+    # fast_signing を切るとpybottersが署名するので, 本文はdictのまま渡します(JSONにしてから戻しません)
+    bot = GMO({"log_dir": str(tmp_path), "gmocoin": ["key", "secret"], "fast_signing": False}, "BTC_JPY")
+    data = {"symbol": "BTC_JPY", "side": "BUY", "executionType": "MARKET", "size": "0.01"}
+    apis, request = bot._signed("POST", bot.base_url, "/private/v1/order", None, data, bot.key)
+    assert apis == bot.key and request["data"] is data
@@ -0,0 +1,58 @@
+import time
+import logging
+from wrappy.gmo import GMO
+from wrappy.bitbank import BitBank
+from wrappy.metrics import MetricsRegistry, OrderLatency
+
+
+def count(registry: MetricsRegistry, kind: str) -> int:
+    return sum(h.count for (name, labels), h in registry.histograms.items() if dict(labels).get("kind") == kind)
+
+
+def test_ack_and_fill():
+    registry = MetricsRegistry()
+    latency = OrderLatency(registry, "gmo")
+    latency.sent("1", time.perf_counter())
+    latency.onmessage({"channel": "orderEvents", "orderId": 1, "orderStatus": "ORDERED"})
+    latency.onmessage({"channel": "executionEvents", "orderId": 1})
+    assert (count(registry, "ack"), count(registry, "fill")) == (1, 1)
+    assert not latency._sent
+
+
+def test_event_before_response():
+    registry = MetricsRegistry()
+    latency = OrderLatency(registry, "bitflyer")
+    latency.onmessage({"jsonrpc": "2.0", "method": "channelMessage", "params": {
+        "channel": "child_order_events", "message": [{"event_type": "ORDER", "child_order_acceptance_id": "JRF1"}]}})
+    latency.sent("JRF1", time.perf_counter() - 0.01)
+    assert count(registry, "ack") == 1
+
+
+def test_stale_entries_expire():
+    registry = MetricsRegistry()
+    latency = OrderLatency(registry, "gmo", ttl=60)
+    now = time.perf_counter()
+    latency.sent("old", now - 120)
+    latency.onmessage({"channel": "executionEvents", "orderId": "unknown"})
+    latency._early["unknown"]["fill"] = now - 120
+    latency.sent("new", now)
+    assert list(latency._sent) == ["new"]
+    assert not latency._early
+
+
+def test_latency_handler(tmp_path):
+    bot = GMO({"log_dir": str(tmp_path), "gmocoin": ["key", "secret"]}, "BTC_JPY")
+    bot.logger.setLevel(logging.WARNING)
+    bot.order_latency = OrderLatency(MetricsRegistry(), "gmo")
+    received = []
+    handler = bot._latency_handler(lambda msg, ws: received.append(msg))
+    bot._track_order(5, time.perf_counter())
+    message = {"channel": "orderEvents", "orderId": 5, "orderStatus": "ORDERED"}
+    handler(message, None)
+    assert received == [message]
+    assert count(bot.order_latency.registry, "ack") == 1
+
+
+def test_bitbank_does_not_track(tmp_path):
+    bot = BitBank({"log_dir": str(tmp_path), "bitbank": ["key", "secret"]}, "btc_jpy")
+    assert bot.order_latency is None
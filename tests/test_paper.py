@@ -0,0 +1,50 @@
+from decimal import Decimal
+from wrappy.paper import PaperEngine
+
+
+def engine(bids=((100, 2),), asks=((101, 1), (102, 1), (103, 5))) -> PaperEngine:
+    engine = PaperEngine({})
+    engine.update_book("BTC_JPY", bids=bids, asks=asks)
+    return engine
+
+
+def test_taker_consumes_book():
+    paper = engine()
+    order = paper.submit("BTC_JPY", "BUY", "MARKET", "1.5")
+    assert (order["status"], order["executed"]) == ("EXECUTED", Decimal("1.5"))
+    assert [(e["price"], e["size"]) for e in paper.executions] == [(Decimal(101), Decimal(1)),
+                                                                    (Decimal(102), Decimal("0.5"))]
+    market = paper.market("BTC_JPY")
+    assert market.asks == {Decimal(102): Decimal("0.5"), Decimal(103): Decimal(5)}
+    assert market.ask == Decimal(102)
+    # 食った板はもう一度約定しません
+    order = paper.submit("BTC_JPY", "BUY", "MARKET", "1")
+    assert [e["price"] for e in paper.executions[-2:]] == [Decimal(102), Decimal(103)]
+    assert market.asks == {Decimal(103): Decimal("4.5")}
+
+
+def test_queue_ahead_of_limit():
+    paper = engine()
+    order = paper.submit("BTC_JPY", "SELL", "LIMIT", "1", "101")
+    assert (order["status"], order["queue"]) == ("ORDERED", Decimal(1))
+    order = paper.submit("BTC_JPY", "BUY", "LIMIT", "1", "100")
+    assert order["queue"] == Decimal(2)
+
+
+def test_trade_consumes_queue():
+    paper = engine()
+    order = paper.submit("BTC_JPY", "SELL", "LIMIT", "1", "101")
+    paper.trade("BTC_JPY", "BUY", "101", "0.5")
+    assert (order["queue"], order["executed"]) == (Decimal("0.5"), Decimal(0))
+    paper.trade("BTC_JPY", "BUY", "101", "1")
+    assert (order["queue"], order["executed"], order["status"]) == (Decimal(0), Decimal("0.5"), "ORDERED")
+    paper.trade("BTC_JPY", "BUY", "101", "2")
+    assert (order["executed"], order["status"]) == (Decimal(1), "EXECUTED")
+
+
+def test_fak_remainder_expires():
+    paper = engine()
+    order = paper.submit("BTC_JPY", "BUY", "LIMIT", "3", "102", time_in_force="FAK")
+    assert (order["status"], order["executed"]) == ("EXPIRED", Decimal(2))
+    assert paper.market("BTC_JPY").asks == {Decimal(103): Decimal(5)}
+    assert not paper.active_orders("BTC_JPY")
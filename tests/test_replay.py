@@ -0,0 +1,58 @@
+import asyncio
+from wrappy.gmo import GMO
+from wrappy.replay import Recorder, Replay, stream_name
+
+PUBLIC = "wss://api.coin.z.com/ws/public/v1"
+PRIVATE = "wss://api.coin.z.com/ws/private/v1/token"
+
+
+class Store(object):
+    def __init__(self):
+        self.messages = []
+
+    def onmessage(self, msg, ws):
+        self.messages.append(msg)
+
+
+class LateBot(GMO):
+    """
+    publicを購読してから, awaitの後でprivateを購読するボットです
+    """
+    async def _run_logic(self):
+        self.public, self.private = Store(), Store()
+        await self.ws(PUBLIC, None, self.public, [])
+        await asyncio.sleep(0.01)
+        await self.ws(PRIVATE, None, self.private, [])
+        while not self.stop_flag:
+            await asyncio.sleep(1)
+
+
+def record(path, n: int = 50):
+    recorder = Recorder(path)
+    for i in range(n):
+        recorder.write(stream_name("gmo", PUBLIC), {"channel": "ticker", "i": i}, t=1000.0 + i)
+        recorder.write(stream_name("gmo", PRIVATE), {"channel": "positionSummaryEvents", "i": i}, t=1000.0 + i)
+    recorder.close()
+
+
+def test_late_private_stream(tmp_path):
+    path = str(tmp_path / "record.jsonl")
+    record(path)
+    bot = LateBot({"log_dir": str(tmp_path), "gmocoin": ["key", "secret"]}, "BTC_JPY")
+    stats = asyncio.run(Replay(path, ready_timeout=1.0).run(bot))
+    assert (stats["messages"], stats["dropped"]) == (100, 0)
+    assert len(bot.public.messages) == len(bot.private.messages) == 50
+
+
+def test_ready_signal(tmp_path):
+    path = str(tmp_path / "record.jsonl")
+    record(path, 3)
+    replay = Replay(path, ready_timeout=10.0)
+
+    async def main():
+        replay._streams = replay.streams()
+        replay.subscribe(stream_name("gmo", PUBLIC), lambda msg, ws: None)
+        assert not replay._ready.is_set()
+        replay.ready()
+        assert replay._ready.is_set()
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+import hmac
+import time
+import hashlib
+import pytest
+from yarl import URL
+from multidict import CIMultiDict
+from pybotters.auth import Auth
+from wrappy.signing import GMOSigner, BitbankSigner, BitflyerSigner
+
+KEY = "key"
+SECRET = "secret"
+# 2進数で割り切れるミリ秒なので, pybottersの int(time.time() * 1000) と同じ値になります
+NOW = 1700000000.125
+TIMESTAMP = "1700000000125"
+
+
+class Session(object):
+    """
+    pybottersの署名の関数が読むsessionの代わりです
+    """
+    def __init__(self, name: str):
+        self.__dict__["_apis"] = {name: [KEY, SECRET.encode()]}
+
+
+@pytest.fixture(autouse=True)
+def fixed_time(monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: NOW)
+
+
+def hmac_hex(text: bytes) -> str:
+    return hmac.new(SECRET.encode(), text, hashlib.sha256).hexdigest()
+
+
+def pybotters_sign(auth, name: str, method: str, url: str, data: dict = None) -> tuple:
+    """
+    pybottersの署名です
+    :return: (ヘッダー, pybottersが送る本文のbytes)
+    """
+    headers = CIMultiDict()
+    kwargs = {"data": data, "headers": headers, "session": Session(name)}
+    auth((method, URL(url)), kwargs)
+    return headers, kwargs["data"]._value
+
+
+def test_gmo_post():
+    data = {"symbol": "BTC_JPY", "side": "BUY", "executionType": "LIMIT", "size": "0.01", "price": "5000000"}
+    url, body, headers = GMOSigner(KEY, SECRET).sign("POST", "https://api.coin.z.com", "/private/v1/order", None, data)
+    assert url == "https://api.coin.z.com/private/v1/order"
+    assert headers["API-KEY"] == KEY and headers["API-TIMESTAMP"] == TIMESTAMP
+    assert headers["Content-Type"] == "application/json"
+    assert headers["API-SIGN"] == hmac_hex(f"{TIMESTAMP}POST/v1/order".encode() + body)
+    # pybottersは本文の空白が違うので, 同じ組み立て方でpybottersの本文を署名したものと比べます
+    expected, sent = pybotters_sign(Auth.gmocoin, "gmocoin", "POST", url, data)
+    assert expected["API-SIGN"] == hmac_hex(f"{TIMESTAMP}POST/v1/order".encode() + sent)
+
+
+def test_gmo_get_query():
+    url, body, headers = GMOSigner(KEY, SECRET).sign(
+        "GET", "https://api.coin.z.com", "/private/v1/activeOrders", {"symbol": "BTC_JPY", "page": 1, "count": None})
+    assert (url, body) == ("https://api.coin.z.com/private/v1/activeOrders?symbol=BTC_JPY&page=1", None)
+    # クエリは署名に含めません
+    assert headers["API-SIGN"] == hmac_hex(f"{TIMESTAMP}GET/v1/activeOrders".encode())
+    assert headers["API-SIGN"] == pybotters_sign(Auth.gmocoin, "gmocoin", "GET", url)[0]["API-SIGN"]
+
+
+def test_bitbank_post():
+    data = {"pair": "btc_jpy", "amount": "0.01", "side": "buy", "type": "limit", "price": "5000000"}
+    url, body, headers = BitbankSigner(KEY, SECRET).sign("POST", "https://api.bitbank.cc/v1", "/user/spot/order",
+                                                         None, data)
+    assert url == "https://api.bitbank.cc/v1/user/spot/order"
+    assert headers["ACCESS-KEY"] == KEY and headers["ACCESS-REQUEST-TIME"] == TIMESTAMP
+    assert headers["ACCESS-SIGNATURE"] == hmac_hex(TIMESTAMP.encode() + body)
+    expected, sent = pybotters_sign(Auth.bitbank, "bitbank", "POST", url, data)
+    assert expected["ACCESS-SIGNATURE"] == hmac_hex(TIMESTAMP.encode() + sent)
+
+
+def test_bitbank_get_query():
+    url, body, headers = BitbankSigner(KEY, SECRET).sign("GET", "https://api.bitbank.cc/v1",
+                                                         "/user/spot/active_orders", {"pair": "btc_jpy", "count": 10})
+    assert (url, body) == ("https://api.bitbank.cc/v1/user/spot/active_orders?pair=btc_jpy&count=10", None)
+    assert headers["ACCESS-SIGNATURE"] == hmac_hex(f"{TIMESTAMP}/v1/user/spot/active_orders?pair=btc_jpy&count=10".encode())
+    assert headers["ACCESS-SIGNATURE"] == pybotters_sign(Auth.bitbank, "bitbank", "GET", url)[0]["ACCESS-SIGNATURE"]
+
+
+def test_bitflyer_post():
+    data = {"product_code": "FX_BTC_JPY", "child_order_type": "LIMIT", "side": "BUY", "size": 0.01, "price": 5000000}
+    url, body, headers = BitflyerSigner(KEY, SECRET).sign("POST", "https://api.bitflyer.com", "/v1/me/sendchildorder",
+                                                          None, data)
+    assert url == "https://api.bitflyer.com/v1/me/sendchildorder"
+    assert headers["ACCESS-KEY"] == KEY and headers["ACCESS-TIMESTAMP"] == TIMESTAMP
+    assert headers["ACCESS-SIGN"] == hmac_hex(f"{TIMESTAMP}POST/v1/me/sendchildorder".encode() + body)
+    expected, sent = pybotters_sign(Auth.bitflyer, "bitflyer", "POST", url, data)
+    assert expected["ACCESS-SIGN"] == hmac_hex(f"{TIMESTAMP}POST/v1/me/sendchildorder".encode() + sent)
+
+
+def test_bitflyer_get_query():
+    url, body, headers = BitflyerSigner(KEY, SECRET).sign("GET", "https://api.bitflyer.com", "/v1/me/getchildorders",
+                                                          {"product_code": "FX_BTC_JPY"})
+    assert body is None
+    assert headers["ACCESS-SIGN"] == hmac_hex(f"{TIMESTAMP}GET/v1/me/getchildorders?product_code=FX_BTC_JPY".encode())
+    assert headers["ACCESS-SIGN"] == pybotters_sign(Auth.bitflyer, "bitflyer", "GET", url)[0]["ACCESS-SIGN"]
+
+
+def test_nonce_is_monotonic():
+    signer = GMOSigner(KEY, SECRET)
+    timestamps = [signer.sign("GET", "https://api.coin.z.com", "/private/v1/account/margin")[2]["API-TIMESTAMP"]
+                  for _ in range(3)]
+    assert timestamps == [TIMESTAMP, str(int(TIMESTAMP) + 1), str(int(TIMESTAMP) + 2)]
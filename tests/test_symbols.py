@@ -0,0 +1,50 @@
+import json
+import time
+import asyncio
+import logging
+import pytest
+from wrappy.gmo import GMO
+from wrappy.bitbank import BitBank
+from wrappy.bitflyer import bitflyer
+from wrappy.symbols import SymbolRegistry, SymbolInfo
+from wrappy.mockserver import MockExchangeServer
+
+
+@pytest.mark.parametrize("bot_class, symbol", [(GMO, "BTC_JPY"), (BitBank, "btc_jpy"), (bitflyer, "FX_BTC_JPY")])
+def test_load_symbol_info_from_base_urls(tmp_path, bot_class, symbol):
+    async def run():
+        async with MockExchangeServer() as server:
+            config = {"log_dir": str(tmp_path), "gmocoin": ["key", "secret"], "bitbank": ["key", "secret"],
+                      "bitflyer": ["key", "secret"], **server.config()}
+            bot = bot_class(config, symbol)
+            bot.logger.setLevel(logging.WARNING)
+            registry = SymbolRegistry(cache_dir=str(tmp_path / "cache"))
+            info = await bot.load_symbol_info(registry)
+            return info, sum(server.requests.values())
+    info, requests = asyncio.run(run())
+    assert info is not None and info.symbol == symbol
+    assert requests == 1
+    # 本番と違うURLの情報はファイルにキャッシュしません
+    assert not (tmp_path / "cache").exists()
+
+
+@pytest.mark.parametrize("cache", [
+    "not json",
+    json.dumps({"symbols": {}}),
+    json.dumps({"fetched_at": time.time(), "symbols": {"BTC_JPY": {"tick_size": "1"}}}),
+    json.dumps({"fetched_at": time.time(), "symbols": {"BTC_JPY": {"tick_size": "x", "size_step": "1",
+                                                                    "min_size": "1", "max_size": None}}}),
+    json.dumps([]),
+])
+def test_malformed_cache_is_a_miss(tmp_path, cache):
+    registry = SymbolRegistry(cache_dir=str(tmp_path))
+    with open(registry._cache_path("gmo"), "w", encoding="utf-8") as f:
+        f.write(cache)
+    assert registry._read_cache("gmo") is None
+
+
+def test_cache_round_trip(tmp_path):
+    registry = SymbolRegistry(cache_dir=str(tmp_path))
+    registry._write_cache("gmo", {"BTC_JPY": SymbolInfo("gmo", "BTC_JPY", "1", "0.0001", "0.0001", "5")})
+    info = registry._read_cache("gmo")["BTC_JPY"]
+    assert info.to_dict() == {"tick_size": "1", "size_step": "0.0001", "min_size": "0.0001", "max_size": "5"}
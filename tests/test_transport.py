@@ -0,0 +1,33 @@
+import asyncio
+from wrappy.transport import TransportPool
+from wrappy.mockserver import MockExchangeServer
+
+
+def test_pool_reuses_and_replaces_closed_clients():
+    async def run():
+        async with MockExchangeServer() as server:
+            pool = TransportPool()
+            client = pool.client(base_url=server.url)
+            assert pool.client(base_url=server.url) is client
+            r = await client.request("GET", "/public/v1/ticker", params={"symbol": "BTC_JPY"})
+            await r.read()
+            assert pool.stats() == {"clients": 1, "in_flight": 0}
+            await client.close()
+            replaced = pool.client(base_url=server.url)
+            assert replaced is not client and not replaced.closed
+            await pool.close()
+    asyncio.run(run())
+
+
+def test_in_flight_counts_requests():
+    async def run():
+        async with MockExchangeServer(latency=0.2) as server:
+            pool = TransportPool()
+            client = pool.client(base_url=server.url)
+            task = asyncio.ensure_future(client.request("GET", "/public/v1/ticker", params={"symbol": "BTC_JPY"}))
+            await asyncio.sleep(0.1)
+            during = pool.in_flight
+            await (await task).read()
+            await pool.close()
+            return during, pool.in_flight
+    assert asyncio.run(run()) == (1, 0)
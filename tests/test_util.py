@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from wrappy.util import np_shift
+
+
+def test_np_shift_float():
+    out = np_shift(np.array([1.0, 2.0, 3.0]), 1)
+    assert np.isnan(out[0]) and list(out[1:]) == [1.0, 2.0]
+
+
+def test_np_shift_signed_int_uses_min():
+    out = np_shift(np.array([1, 2, 3], dtype=np.int32), -1)
+    assert list(out) == [2, 3, np.iinfo(np.int32).min]
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint32, np.uint64])
+def test_np_shift_unsigned_nan_raises(dtype):
+    with pytest.raises(ValueError):
+        np_shift(np.array([0, 1, 2], dtype=dtype), 1)
+
+
+def test_np_shift_unsigned_explicit_fill():
+    out = np_shift(np.array([0, 1, 2], dtype=np.uint8), 1, fill_value=255)
+    assert list(out) == [255, 0, 1]
@@ -1,3 +1,5 @@
+import importlib
+import types
 from .log import Log
 from .notify import Notify
 from .base import BotBase
@@ -5,6 +7,45 @@ from .gmo import GMO
 from .bitbank import BitBank
 from .bitflyer import bitflyer
 from .coincheck import CoinCheck
-from .exceptions import APIException, RequestException
-from .util import *
-from .time_util import now_jst, now_jst_str, now_utc, now_utc_str, now_gmt, now_gmt_str, fromISOformat
\ No newline at end of file
+from .exceptions import APIException, RequestException, InvalidOrderException, ConfigException
+from .config import Config, load_config
+from .time_util import now_jst, now_jst_str, now_utc, now_utc_str, now_gmt, now_gmt_str, fromISOformat, JST, UTC, GMT
+from .transport import TransportPool
+from .ratelimit import RateLimiter
+
+# 分析とグラフの関数は numpy, pandas, polars, matplotlib を読み込むので, 最初に使うときに読み込みます
+# 発注だけのボットは import wrappy でこれらを読み込みません {名前: (モジュール, 属性 Noneはモジュール自体)}
+_LAZY = {name: (".util", name) for name in (
+    "simple_regression", "plot_corrcoef", "np_shift", "np_shift_view", "np_lags", "np_stack", "resample_ohlc",
+    "iter_time_windows", "time_windows", "df_list", "trades_to_historical", "params_key", "Objective")}
+# ペーパートレードの約定シミュレーター(aiohttp.web)も使うときに読み込みます
+_LAZY["PaperTrading"] = (".paper", "PaperTrading")
+# 複数のボットの実行(multiprocessing), メトリクス, リプレイ, ループの監視も使うときに読み込みます
+_LAZY.update({"Runtime": (".runtime", "Runtime"), "ShardedRuntime": (".shard", "ShardedRuntime"),
+              "SharedRateLimiter": (".shard", "SharedRateLimiter"), "LoopLagMonitor": (".loop", "LoopLagMonitor"),
+              "MetricsRegistry": (".metrics", "MetricsRegistry"), "OrderLatency": (".metrics", "OrderLatency"),
+              "Recorder": (".replay", "Recorder"), "Replay": (".replay", "Replay")})
+# 以前の from .util import * で公開されていた名前です
+_LAZY.update({"np": ("numpy", None), "pd": ("pandas", None), "pl": ("polars", None),
+              "plt": ("matplotlib.pyplot", None), "datetime": ("datetime", "datetime"),
+              "timedelta": ("datetime", "timedelta")})
+
+__all__ = [name for name, value in globals().items()
+           if not name.startswith("_") and not isinstance(value, types.ModuleType)] + list(_LAZY)
+
+
+def __getattr__(name):
+    try:
+        module_name, attr = _LAZY[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = importlib.import_module(module_name, __name__)
+    if attr is not None:
+        value = getattr(value, attr)
+    # 2回目からは__getattr__を通さずに返します
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,114 @@
+import numpy as np
+from typing import Literal
+from .util import np_shift
+
+
+def _ohlc_arrays(ohlcv):
+    """
+    resample_ohlc / trades_to_historical の結果(pandas), polars, dictのどれでもnumpyの配列にします
+    """
+    return tuple(np.ascontiguousarray(np.asarray(ohlcv[col], dtype=np.float64))
+                 for col in ("open", "high", "low", "close"))
+
+
+def _market_fills(open_, target, latency):
+    """
+    成行注文: bar iの終値で決めたtargetがlatency本後の始値で約定します(ループなし)
+    """
+    position = np_shift(target, latency, fill_value=0.0)
+    trades = np.diff(position, prepend=0.0)
+    return position, trades, open_
+
+
+def _limit_fills(high, low, close, target, latency, offset):
+    """
+    指値注文: bar iの終値からoffset離した指値を出し, latency本後のbarで価格が指値を
+    抜けた(タッチでは約定しない)場合だけ約定します. 約定しなければ次のbarで出し直します
+    約定は前の約定に依存するので, numpy配列上の素朴なループで処理します
+    """
+    n = close.shape[0]
+    position = np.zeros(n)
+    trades = np.zeros(n)
+    prices = np.zeros(n)
+    buy_px = close - offset
+    sell_px = close + offset
+    pos = 0.0
+    for j in range(latency, n):
+        i = j - latency
+        want = target[i] - pos
+        if want > 0.0 and low[j] < buy_px[i]:
+            trades[j] = want
+            prices[j] = buy_px[i]
+            pos = target[i]
+        elif want < 0.0 and high[j] > sell_px[i]:
+            trades[j] = want
+            prices[j] = sell_px[i]
+            pos = target[i]
+        position[j] = pos
+    return position, trades, prices
+
+
+def _stats(equity, trades, fees, periods_per_year):
+    returns = np.diff(equity, prepend=0.0)
+    std = returns.std()
+    peak = np.maximum.accumulate(equity)
+    n_trades = int(np.count_nonzero(trades))
+    return {
+        "pnl": float(equity[-1]) if equity.size else 0.0,
+        "sharpe": float(returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0,
+        "max_drawdown": float((peak - equity).max()) if equity.size else 0.0,
+        "trades": n_trades,
+        "turnover": float(np.abs(trades).sum()),
+        "fees": float(fees.sum()),
+    }
+
+
+def backtest(ohlcv, signal, order_type: Literal["market", "limit"] = "market", size: float = 1.0,
+             fee: float = 0.0, maker_fee: float = None, latency: int = 1, limit_offset: float = 0.0,
+             periods_per_year: int = 365 * 24 * 60) -> dict:
+    """
+    シグナル配列からバックテストをします. Objective.optimizationの中で使う想定です
+
+    class MyObjective(Objective):
+        def optimization(self, window, k):
+            ma = self.df["close"].rolling(window).mean()
+            signal = np.sign(self.df["close"] - ma * k).fillna(0)
+            return backtest(self.df, signal, fee=0.0002)["stats"]["sharpe"]
+
+    :param ohlcv: open, high, low, closeを持つDataFrame (resample_ohlc, trades_to_historicalの戻り値など)
+    :param signal: 各barの終値時点で持ちたいポジション(+1: long, -1: short, 0: flat, 小数も可)
+    :param order_type: market: 始値で約定 / limit: 終値±limit_offsetの指値
+    :param size: signal 1あたりの数量
+    :param fee: takerの手数料率 (0.0002 = 0.02%)
+    :param maker_fee: makerの手数料率 (指定なしはfee, マイナスならリベート)
+    :param latency: 発注から約定判定までのbar数 (1以上)
+    :param limit_offset: 指値を終値からどれだけ離すか(価格)
+    :param periods_per_year: sharpeの年率換算に使うbar数
+    :return: {"equity": ndarray, "position": ndarray, "trades": ndarray, "stats": dict}
+    """
+    if latency < 1:
+        raise ValueError("latency must be >= 1 bar to avoid look-ahead")
+    open_, high, low, close = _ohlc_arrays(ohlcv)
+    target = np.nan_to_num(np.asarray(signal, dtype=np.float64)) * size
+    if target.shape != close.shape:
+        raise ValueError(f"signal length {target.shape[0]} does not match ohlcv length {close.shape[0]}")
+
+    if order_type == "market":
+        position, trades, prices = _market_fills(open_, target, latency)
+        fee_rate = fee
+    elif order_type == "limit":
+        position, trades, prices = _limit_fills(high, low, close, target, latency, limit_offset)
+        fee_rate = fee if maker_fee is None else maker_fee
+    else:
+        raise ValueError(f"unknown order_type: {order_type}")
+
+    notional = trades * prices
+    fees = np.abs(notional) * fee_rate
+    cash = np.cumsum(-notional - fees)
+    equity = cash + position * close
+    return {
+        "equity": equity,
+        "position": position,
+        "trades": trades,
+        "stats": _stats(equity, trades, fees, periods_per_year),
+    }
@@ -1,14 +1,91 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from aiohttp.payload import BytesPayload
 from .notify import Notify
+from .websocket import WebSocketSupervisor
+from .fastjson import ws_connect_kwargs, dumps
+from .models import Numeric
+from .fixedpoint import FixedPoint
+from .symbols import symbol_registry, SYMBOL_PATHS
+from .transport import client_session
+from .loop import LoopLagMonitor, run as run_loop
+from .metrics import registry as metrics_registry, start_request, clear_request, OrderLatency
+from .replay import Recorder, stream_name
+from .signing import get_signer
+from .exceptions import ConfigException
 
 class BotBase(Notify):
+    # symbol_registryで使う取引所名 子クラスで設定します
+    exchange_id = None
+    # REST APIとwebsocketのURL 子クラスで設定します
+    base_url = None
+    ws_url = None
+    # privateのwebsocketで発注からack, 約定までの時間を記録します(OrderLatency) 注文のイベントが無い取引所はFalse
+    track_order_latency = True
+
     def __init__(self, path):
         super().__init__(path)
         self.stop_flag = False
+        # websocketの監視
+        self.ws_supervisors = []
+        # 取引所のURLを差し替えます(ローカルのモックサーバーなど)
+        # "base_urls": {"gmo": "http://127.0.0.1:8080"}, "ws_urls": {"gmo": "ws://127.0.0.1:8080/ws"}
+        base_urls = self.config.value("base_urls")
+        self.custom_url = self.exchange_id in base_urls
+        if self.custom_url:
+            self.base_url = base_urls[self.exchange_id]
+        ws_urls = self.config.value("ws_urls")
+        if self.exchange_id in ws_urls:
+            self.ws_url = ws_urls[self.exchange_id]
+        # 共有のClient(TransportPool)とレートリミッター Runtimeで動かすときに設定されます
+        self.transport = None
+        self.rate_limiter = None
+        # privateのAPIの署名をAPIキーごとに準備したSignerで行います(_signed)
+        self.fast_signing = self.config.value("fast_signing")
+        # リクエストの段階ごとの時間と発注からack/約定までの時間を記録します "metrics": false で無効
+        self.metrics = metrics_registry if self.config.value("metrics") else None
+        if self.metrics is not None and self.track_order_latency:
+            self.order_latency = OrderLatency(self.metrics, self.exchange_id)
+        else:
+            self.order_latency = None
         # 発注履歴ファイルを保存するファイルのパラメータ
-        try:
-            self.order_history_dir = self.config["log_dir"]
-        except KeyError:
-            self.order_history_dir = 'log'
+        self.order_history_dir = self.config.value("log_dir")
+        # APIの数値の表現 decimal: Decimal / int: 価格と数量を整数(tick, lot)で扱うfixed-pointモード
+        # "numeric_mode": "int" と "fixed_point" は同じ切り替えです. どちらかを書くとfixed-pointモードになり,
+        # 桁数は "fixed_point" の値(無ければ price_decimals=0, size_decimals=8)を使います
+        numeric_mode = self.config.value("numeric_mode")
+        fixed_point = self.config.value("fixed_point")
+        if fixed_point is not None and "numeric_mode" in self.config and numeric_mode != "int":
+            raise ConfigException("numeric_mode", f"must be 'int' when fixed_point is set, got {numeric_mode!r}")
+        if numeric_mode == "int" or fixed_point is not None:
+            fixed_point = fixed_point or {}
+            self.fixed_point = FixedPoint(fixed_point.get("price_decimals", 0), fixed_point.get("size_decimals", 8))
+            self.numeric = Numeric("int", self.fixed_point.price_decimals, self.fixed_point.size_decimals)
+        else:
+            self.fixed_point = None
+            self.numeric = Numeric()
+        # 通貨ペアの呼値, 最小数量など load_symbol_infoで読み込みます
+        self.symbol_info = None
+        # この秒数を超えるイベントループの遅れを警告します
+        self.loop_lag_threshold = self.config.value("loop_lag_threshold")
+        self.loop_monitor = None
+        # 受信したwebsocketのメッセージを保存するディレクトリ replay.Replayで再生できます
+        self.record_dir = self.config.value("record_dir")
+        self.recorder = None
+        # リプレイ中はwebsocketに接続せず, Replayからメッセージを受け取ります(Replay.attachで設定されます)
+        self.replay = None
+        # ペーパートレード 発注とprivateのAPIをローカルの約定シミュレーターに送ります(paper.py参照)
+        paper = self.config.value("paper")
+        if paper:
+            # 約定シミュレーター(aiohttp.web)はペーパートレードのときだけ読み込みます
+            from .paper import paper_trading
+            self.paper = paper_trading(paper)
+        else:
+            self.paper = None
+        if self.paper is not None:
+            self.log_warning("Paper trading mode: orders are sent to the local fill simulator.")
         self.columns = {}
         # csvファイルを書き込む場所
         self.target_csv_file = f"{self.exchange_name}_{self.bot_name}_order_history.csv"
@@ -39,18 +116,311 @@ class BotBase(Notify):
         """
         
 
+    @asynccontextmanager
+    async def _client(self, apis=None, base_url: str = ""):
+        """
+        _requestsで使うClientです. rate_limiterがあれば待ってから, transportがあれば共有のClientを使います
+        metricsがあればこのリクエストの計測を始めます
+        """
+        if self.metrics is not None:
+            timer = start_request(self.metrics, self.exchange_id)
+        else:
+            timer = None
+            clear_request()
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+            if timer is not None:
+                timer.queued = time.perf_counter()
+        async with client_session(self.transport, apis, base_url) as client:
+            yield client
+
+    async def load_symbol_info(self, registry=None, refresh: bool = False):
+        """
+        通貨ペアの情報を読み込みます. 読み込んだ後は発注前に数量と価格を丸めて確認します
+        :param registry: SymbolRegistry 指定なしはプロセスで共有しているsymbol_registry
+        :return: SymbolInfo
+        """
+        registry = registry or symbol_registry
+        # base_urlsで差し替えたURL(モックサーバーなど)から読み込みます
+        base_url, _, _ = await self._route(SYMBOL_PATHS[self.exchange_id])
+        await registry.load(self.exchange_id, refresh=refresh, base_url=base_url)
+        self.symbol_info = await registry.get(self.exchange_id, self.symbol, base_url=base_url)
+        if self.symbol_info is None:
+            self.log_warning(f"symbol info for {self.exchange_id} {self.symbol} is not found.")
+        return self.symbol_info
+
+    def _prepare_order(self, side: str, size, price=None) -> tuple:
+        """
+        symbol_infoがあれば数量と価格を丸めて確認します. 発注できない注文はInvalidOrderExceptionです
+        fixed-pointモードのint(lot, tick)はここで1回だけ単位の値の文字列にします.
+        返した値はlot, tickではないので, 呼び出し側でもう一度fixed-pointとして変換しないでください
+        :return: (size, price) symbol_infoがあればDecimal
+        """
+        if self.fixed_point is not None:
+            if isinstance(size, int):
+                size = self.fixed_point.size_str(size)
+            if isinstance(price, int):
+                price = self.fixed_point.price_str(price)
+        if self.symbol_info is None:
+            return size, price
+        return self.symbol_info.prepare(side, size, price)
+
+    def _encode_request(self, params=None, data=None, local: bool = False) -> tuple:
+        """
+        URLを差し替えたときはpybottersが署名もJSON化もしないので, Noneの値を除いたparamsとJSONのdataにします
+        :param local: URLを差し替えていなくても, ローカルのサーバーに送るリクエストとしてエンコードします
+        """
+        if not (self.custom_url or local):
+            return params, data
+        if params is not None:
+            params = {k: v for k, v in params.items() if v is not None}
+        if data is not None:
+            # aiohttpのJsonPayloadは標準のjsonを使うので, 速いdumpsでJSONにします
+            data = BytesPayload(dumps(data), content_type="application/json")
+        return params, data
+
+    async def _route(self, url: str, params=None, data=None) -> tuple:
+        """
+        _requestsの送り先です. ペーパートレードではprivateのAPIを約定シミュレーターに送ります
+        :return: (base_url, params, data)
+        """
+        if self.paper is not None and self.paper.routes(self.exchange_id, url):
+            return (await self.paper.base_url(self.exchange_id), *self._encode_request(params, data, local=True))
+        return (self.base_url, *self._encode_request(params, data))
+
+    def _signed(self, method: str, base_url: str, url: str, params=None, data=None, apis=None) -> tuple:
+        """
+        取引所に直接送るリクエストは, pybottersの代わりにAPIキーごとのSigner(signing.py)で署名します
+        "fast_signing": false のとき, 対応していない取引所, ローカルのサーバーに送るときはpybottersに任せます
+        :param apis: pybottersのAPIキー {"gmocoin": [key, secret]}
+        :return: (Clientに渡すapis, client.requestの引数)
+        """
+        if self.fast_signing and apis and base_url == self.base_url and not self.custom_url:
+            (key, secret), = apis.values()
+            signer = get_signer(self.exchange_id, key, secret)
+            if signer is not None:
+                target, body, headers = signer.sign(method, base_url, url, params, data)
+                # 署名済みなのでAPIキーの無いClientを使います. TransportPoolではキーが違っても同じClientになります
+                return None, {"url": target, "data": body, "headers": headers, "auth": None}
+        return apis, {"url": url, "params": params, "data": data}
+
+    def _track_order(self, order_id, sent_at: float):
+        """
+        発注からack, 約定までの計測に注文IDを登録します
+        :param sent_at: 発注直前の time.perf_counter()
+        """
+        if self.order_latency is not None and order_id is not None:
+            self.order_latency.sent(order_id, sent_at)
+
+    def _min_order_size(self, default):
+        """
+        最小発注数量です. symbol_infoが無ければdefaultを使います
+        """
+        if self.symbol_info is not None:
+            return self.symbol_info.min_size
+        return default
+
+    async def flatten(self, moq, timeout: float = 10.0, poll_min: float = 0.05, poll_max: float = 1.0,
+                      orders_empty=None) -> dict:
+        """
+        全ての注文をキャンセルし, 全ての建玉を成行で同時に決済します
+        キャンセルはまとめて並列に送り, 注文が無くなったことを確認してから決済します
+        確認の待ち時間は poll_min から始めて poll_max まで倍々に伸ばします
+        :param moq: 最小ロット これより小さい建玉は決済しません
+        :param timeout: キャンセル, 決済それぞれの最大待ち時間(秒)
+        :param orders_empty: 注文が無いことを確認する関数です. privateのwebsocketで確認する場合に渡します
+                             例 lambda: not store.order.find()  指定なしはREST APIで確認します
+        :return: {"elapsed": 全体の秒数, "cancel_elapsed": キャンセルの秒数, "liquidate_elapsed": 決済の秒数,
+                  "canceled": キャンセルした注文数, "liquidated": [(side, size), ...], "flat": 注文も建玉も無くなればTrue}
+        """
+        moq = self.numeric.size(moq)
+        start = time.monotonic()
+        canceled, orders_done = await self._cancel_until_empty(start + timeout, poll_min, poll_max, orders_empty)
+        cancel_end = time.monotonic()
+        liquidated, positions_done = await self._liquidate_until_flat(moq, cancel_end + timeout, poll_min, poll_max)
+        end = time.monotonic()
+        report = {
+            "elapsed": end - start,
+            "cancel_elapsed": cancel_end - start,
+            "liquidate_elapsed": end - cancel_end,
+            "canceled": canceled,
+            "liquidated": liquidated,
+            "flat": orders_done and positions_done,
+        }
+        self.log_info(f"Flatten finished in {report['elapsed'] * 1000:.0f} ms "
+                      f"(cancel {report['cancel_elapsed'] * 1000:.0f} ms, "
+                      f"liquidate {report['liquidate_elapsed'] * 1000:.0f} ms, flat={report['flat']}).")
+        return report
+
+    async def _cancel_until_empty(self, deadline: float, poll_min: float, poll_max: float, orders_empty=None) -> tuple:
+        """
+        注文が無くなるまでキャンセルを繰り返します
+        :return: (キャンセルした注文数, 注文が無くなればTrue)
+        """
+        canceled = set()
+        delay = poll_min
+        while True:
+            order_ids = await self._open_order_ids()
+            if not order_ids:
+                return len(canceled), True
+            canceled.update(order_ids)
+            self.log_info(f"Canceling {len(order_ids)} open orders.")
+            await self._cancel_order_ids(order_ids)
+            if orders_empty is not None:
+                # ストアの確認はAPIを消費しないので短い間隔で見ます
+                while not orders_empty() and time.monotonic() < deadline:
+                    await asyncio.sleep(poll_min)
+                if orders_empty():
+                    return len(canceled), True
+            if time.monotonic() + delay > deadline:
+                self.log_warning("Open orders still remain after flatten timeout.")
+                return len(canceled), False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, poll_max)
+
+    async def _liquidate_until_flat(self, moq, deadline: float, poll_min: float, poll_max: float) -> tuple:
+        """
+        建玉を同時に決済し, 建玉が無くなるまで待ちます
+        約定の反映が遅れても二重に決済しないように, 再送は発注に失敗した建玉だけです
+        :return: ([(side, size), ...], 建玉が無くなればTrue)
+        """
+        liquidated = []
+        positions = [p for p in await self._open_positions() if p.size >= moq]
+        delay = poll_min
+        while positions:
+            for p in positions:
+                self.log_info(f"Liquidating current {p.side} position {p.size} lot.")
+            results = await asyncio.gather(*(self._close_position(p) for p in positions), return_exceptions=True)
+            failed = []
+            for p, result in zip(positions, results):
+                if isinstance(result, Exception):
+                    self.log_warning(f"Liquidating {p.side} {p.size} failed: {result}")
+                    failed.append(p)
+                else:
+                    liquidated.append((p.side, p.size))
+            positions = failed
+            if not positions:
+                break
+            if time.monotonic() + delay > deadline:
+                return liquidated, False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, poll_max)
+        delay = poll_min
+        while True:
+            if not [p for p in await self._open_positions() if p.size >= moq]:
+                return liquidated, True
+            if time.monotonic() + delay > deadline:
+                self.log_warning("Positions still remain after flatten timeout.")
+                return liquidated, False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, poll_max)
+
+    async def _gather_requests(self, coros, name: str) -> list:
+        """
+        リクエストを並列に送ります. 失敗したものはログに残して結果から除きます
+        """
+        results = await asyncio.gather(*coros, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                self.log_warning(f"{name} failed: {result}")
+        return [result for result in results if not isinstance(result, Exception)]
+
+    async def _open_order_ids(self) -> list:
+        """
+        flattenで使う有効な注文のIDです. 子クラスで実装します.
+        """
+        raise NotImplementedError()
+
+    async def _cancel_order_ids(self, order_ids: list):
+        """
+        flattenで使う注文のキャンセルです. 子クラスで実装します.
+        """
+        raise NotImplementedError()
+
+    async def _open_positions(self) -> list:
+        """
+        flattenで使う建玉(Positionのリスト)です. 子クラスで実装します.
+        """
+        raise NotImplementedError()
+
+    async def _close_position(self, position):
+        """
+        flattenで使う建玉の成行決済です. 子クラスで実装します.
+        """
+        raise NotImplementedError()
+
+    def _size_str(self, size) -> str:
+        """
+        APIに送る数量の文字列です. fixed-pointモードではintをlotとして扱います
+        """
+        if self.fixed_point is not None and isinstance(size, int):
+            return self.fixed_point.size_str(size)
+        return str(size)
+
+    def _price_str(self, price) -> str:
+        """
+        APIに送る価格の文字列です. fixed-pointモードではintをtickとして扱います
+        """
+        if self.fixed_point is not None and isinstance(price, int):
+            return self.fixed_point.price_str(price)
+        return str(price)
+
     async def start(self):
         """
         ボットを起動します.
+        コンフィグに "loop_lag_threshold" を設定すると, 動いている間イベントループの遅れを監視します(self.loop_monitor)
+        """
+        monitor = None
+        # "reload_interval" を設定すると, 動いている間コンフィグを読み直して反映します(_on_config_reload)
+        reload_interval = self.config.value("reload_interval")
+        if reload_interval:
+            self.config.watch(reload_interval)
+        if self.loop_lag_threshold is not None and self.loop_monitor is None:
+            monitor = self.loop_monitor = LoopLagMonitor(threshold=self.loop_lag_threshold, logger=self.logger).start()
+        try:
+            await self._run_logic()
+            self.log_info("Bot started.")
+        finally:
+            if monitor is not None:
+                monitor.stop()
+                self.log_info(f"Event loop lag: {monitor.stats()}")
+                self.loop_monitor = None
+
+    def _on_config_reload(self, changed: dict):
+        """
+        コンフィグを読み直したときに, ループの遅れの閾値とレートリミッターの制限を変えます
+        Runtimeで共有しているリミッターはどのボットから変えても同じ値になります
+        """
+        super()._on_config_reload(changed)
+        if "loop_lag_threshold" in changed:
+            self.loop_lag_threshold = changed["loop_lag_threshold"]
+            if self.loop_monitor is not None and self.loop_lag_threshold is not None:
+                self.loop_monitor.threshold = self.loop_lag_threshold
+        if "rate_limits" in changed:
+            rate_limits = changed["rate_limits"] or {}
+            limiters = ((self.exchange_id, self.rate_limiter),
+                        (f"{self.exchange_id}_order", getattr(self, "order_rate_limiter", None)))
+            for name, limiter in limiters:
+                if limiter is not None and name in rate_limits:
+                    limiter.configure(**rate_limits[name])
+                    self.log_info(f"Rate limit {name} changed: {rate_limits[name]}")
+
+    def run(self, use_uvloop: bool = True, debug: bool = False, eager_tasks: bool = False):
+        """
+        イベントループを作ってボットを起動します. asyncio.run(bot.start()) の代わりです
+        uvloopが入っていればuvloopを使います
+        :param debug: asyncioのデバッグモード
+        :param eager_tasks: python3.12以降でeager_task_factoryを使います
         """
-        await self._run_logic()
-        self.log_info("Bot started.")
+        return run_loop(self.start(), use_uvloop=use_uvloop, debug=debug, eager_tasks=eager_tasks)
 
     def stop(self):
         """
         ボットを停止します.
         """
         self.stop_flag = True
+        if self.recorder is not None:
+            self.recorder.close()
         self.log_info("Logic has been stopped.")
 
     async def _run_logic(self):
@@ -59,11 +429,64 @@ class BotBase(Notify):
         """
         raise NotImplementedError()
 
-    async def ws(self, url, client, store, subscription_commands):
+    async def ws(self, url, client, store, subscription_commands, stale_timeout: float = None,
+                 on_resync=None, channel_timeouts: dict = None):
         """
         websocketのベースです
+        stale_timeoutを指定すると受信が途絶えたときに再接続し, 再接続後にon_resyncを呼びます
+        監視の状態は self.ws_supervisors から取得できます
+        :param stale_timeout: この秒数受信が無ければ再接続します(指定なしは監視しません)
+        :param on_resync: 再接続後に呼ぶコルーチン関数 RESTでスナップショットを取り直す処理など
+        :param channel_timeouts: チャンネル個別のタイムアウト {"orderbooks": 5} など
+        :return: pybotters.WebSocketApp リプレイ中はNone
+        """
+        if self.paper is not None:
+            # ペーパートレードではprivateのチャンネルを約定シミュレーターから購読します
+            subscription_commands, private = self.paper.split(self.exchange_id, subscription_commands)
+            if private:
+                app = await client.ws_connect(await self.paper.ws_url(self.exchange_id, url), send_json=private,
+                                              **ws_connect_kwargs(self._latency_handler(store.onmessage)))
+                if not subscription_commands:
+                    return app
+        handler = self._stream_handler(stream_name(self.exchange_id, url), self._latency_handler(store.onmessage))
+        if handler is None:
+            return None
+        if stale_timeout is None:
+            return await client.ws_connect(
+                url,
+                send_json=subscription_commands,
+                **ws_connect_kwargs(handler))
+        supervisor = WebSocketSupervisor(self, stale_timeout, on_resync=on_resync, channel_timeouts=channel_timeouts)
+        self.ws_supervisors.append(supervisor)
+        return await supervisor.connect(url, client, handler, subscription_commands)
+
+    def _latency_handler(self, handler):
+        """
+        privateのwebsocketのメッセージをハンドラに渡す前にOrderLatencyにも渡して, ackと約定の時刻を記録します
+        """
+        if self.order_latency is None:
+            return handler
+        observe = self.order_latency.onmessage
+
+        def onmessage(msg, ws):
+            observe(msg, ws)
+            handler(msg, ws)
+        return onmessage
+
+    def _stream_handler(self, stream: str, handler):
+        """
+        websocketに渡すハンドラです. リプレイ中はReplayに登録してNoneを返し, record_dirがあれば記録してから渡します
+        ペーパートレードでは受信したメッセージで約定シミュレーターの価格も動かします
         """
-        client.ws_connect(
-            url,
-            send_json=subscription_commands,
-            hdlr_json=store.onmessage)
\ No newline at end of file
+        if self.paper is not None:
+            handler = self.paper.wrap(self.exchange_id, handler)
+        if self.replay is not None:
+            self.replay.subscribe(stream, handler)
+            return None
+        if self.record_dir is None:
+            return handler
+        if self.recorder is None:
+            os.makedirs(self.record_dir, exist_ok=True)
+            name = f"{self.exchange_id}_{getattr(self, 'symbol', '')}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+            self.recorder = Recorder(os.path.join(self.record_dir, f"{name}.jsonl.gz"))
+        return self.recorder.wrap(stream, handler)
@@ -1,12 +1,18 @@
-import asyncio
-import pybotters
+import time
 from typing import Literal, Union
 from decimal import Decimal
 from .base import BotBase
 from .exceptions import APIException, RequestException
+from .fastjson import read_json
+from .models import bitbank_positions, bitbank_orders, bitbank_executions, bitbank_balances
 
 
 class BitBank(BotBase):
+    exchange_id = "bitbank"
+    base_url = "https://api.bitbank.cc/v1"
+    # 注文のイベントを受け取るprivateのwebsocketが無いので, 発注からackまでの時間は記録しません
+    track_order_latency = False
+
     def __init__(self, config: str, symbol: str):
         super().__init__(config)
         # 通貨ペア
@@ -14,14 +20,15 @@ class BitBank(BotBase):
         # APIを呼ぶ回数
         self.total_api_call_count = 0
         # API keyの設定
-        try:
-            self.keys = self.config["bitbank_keys"]
+        self.keys = self.config.value("bitbank_keys")
+        self.check_keys = bool(self.keys)
+        if self.check_keys:
             self.current_key_index = 0
             self.key = {"bitbank": self.keys[self.current_key_index]}
-            self.check_keys = True
-        except KeyError:
+        else:
             self.key = {"bitbank": self.config["bitbank"]}
-            self.check_keys = False
+        # 複数のボット, プロセスでキーの順番を共有するKeyRotation Runtimeで動かすときに設定されます
+        self.key_rotation = None
 
     async def stop(self):
         """
@@ -32,26 +39,17 @@ class BitBank(BotBase):
         await self._cancel_and_liquidate()
         self.log_debug("bitbank stop end")
 
-    async def _cancel_and_liquidate(self):
+    async def _cancel_and_liquidate(self, timeout: float = 10.0, orders_empty=None) -> dict:
         """
         全ての注文をキャンセルした後、ポジションを成行で反対売買してクローズします.
+        :param timeout: キャンセル, 決済それぞれの最大待ち時間(秒)
+        :param orders_empty: privateのwebsocketで注文が無いことを確認する関数 (BotBase.flatten参照)
+        :return: BotBase.flattenの結果
         """
         self.log_debug("_cancel_and_liquidate start.")
-        self.log_info("Canceling all open orders.")
-        # 全てキャンセル.
-        await self.cancel_all_orders()
-        await asyncio.sleep(5)
-        # 5秒置いてさらに全てキャンセル.
-        await self.cancel_all_orders()
-        await asyncio.sleep(5)
-        position = await self.fetch_my_positions(self.symbol)
-        if position['long'] >= 0.0001:
-            self.log_info(f"Liquidating Current Long Position {position['long']} lot.")
-            await self.liquidate_market_order('sell', position['long'])
-        if position['short'] >= 0.0001:
-            self.log_info(f"Liquidating Current Short Position {position['short']} lot.")
-            await self.liquidate_market_order('buy', position['short'])
+        report = await self.flatten(self._min_order_size("0.0001"), timeout=timeout, orders_empty=orders_empty)
         self.log_debug("_cancel_and_liquidate end.")
+        return report
 
     async def spot_stop(self):
         """
@@ -62,41 +60,59 @@ class BitBank(BotBase):
         await self.spot_cancel_and_liquidate()
         self.log_debug("bitbank stop end")
 
-    async def spot_cancel_and_liquidate(self):
+    async def spot_cancel_and_liquidate(self, timeout: float = 10.0, poll_min: float = 0.05, poll_max: float = 1.0):
         """
         全ての注文をキャンセルした後、ポジションを成行で反対売買してクローズします.
         """
         self.log_debug("_cancel_and_liquidate start.")
-        self.log_info("Canceling all open orders.")
-        # 全てキャンセル.
-        await self.cancel_all_orders()
-        await asyncio.sleep(5)
-        # 5秒置いてさらに全てキャンセル.
-        await self.cancel_all_orders()
-        await asyncio.sleep(5)
+        start = time.monotonic()
+        await self._cancel_until_empty(start + timeout, poll_min, poll_max)
         position = await self.spot_fetch_position()
-        if position >= 0.0001:
+        if self.numeric.size(position) >= self.numeric.size(self._min_order_size("0.0001")):
             self.log_info(f"Liquidating current position {position} lot.")
             await self.spot_market_order("sell", position)
+        self.log_info(f"Spot flatten finished in {(time.monotonic() - start) * 1000:.0f} ms.")
         self.log_debug("_cancel_and_liquidate end.")
 
+    async def _open_order_ids(self) -> list:
+        return await self.fetch_open_orders()
+
+    async def _cancel_order_ids(self, order_ids: list):
+        """
+        cancel_ordersは1回30件までなので, 30件ずつ並列に送ります
+        """
+        return await self._gather_requests(
+            [self._cancel_any_orders(order_ids[i:i + 30]) for i in range(0, len(order_ids), 30)], "cancel_orders")
+
+    async def _open_positions(self) -> list:
+        return [p for p in await self.position_models() if p.symbol == self.symbol]
+
+    async def _close_position(self, position):
+        side = "sell" if position.side == "BUY" else "buy"
+        return await self.liquidate_market_order(side, self.numeric.size_str(position.size))
+
     async def _requests(self, method: str, url: str, params=None, data=None):
         # 複数のkeyを使いまわすには"bitbank_keys"をコンフィグに設定します.
         if self.check_keys:
-            self.current_key_index = self.total_api_call_count % len(self.keys)
+            if self.key_rotation is not None:
+                self.current_key_index = self.key_rotation.next(len(self.keys))
+            else:
+                self.current_key_index = self.total_api_call_count % len(self.keys)
             current_key = {"bitbank": self.keys[self.current_key_index]}
             self.total_api_call_count += 1
         else:
             current_key = self.key
 
-        async with pybotters.Client(apis=current_key, base_url='https://api.bitbank.cc/v1') as client:
-            response = await client.request(method, url=url, params=params, data=data)
+        base_url, params, data = await self._route(url, params, data)
+        apis, request = self._signed(method, base_url, url, params, data, current_key)
+        async with self._client(apis=apis, base_url=base_url) as client:
+            response = await client.request(method, **request)
             if not str(response.status).startswith('2'):
                 if str(response.status).startswith("429"):
                     raise RequestException(f"429 Too Many Requests")
                 self.statusNotify(f"Status {response.status} Error")
                 raise APIException(response)
-            data = await response.json()
+            data = await read_json(response)
 
             if data["success"] == 0:
                 raise RequestException(f"[Error code] {data['data']['code']} Error")
@@ -104,19 +120,18 @@ class BitBank(BotBase):
                 return data["data"]
 
     async def _replace_order(self, side, size, order_type, position_side=None, price: any = None, post_only: bool = False, trigger_price: str = None):
-        request = {
-            "pair": self.symbol,
-            "amount": str(size),
-            "side": side,
-            "position_side": position_side,
-            "type": order_type,
-            "post_only": post_only,
-            }
+        size, price = self._prepare_order(side, size, price)
+        # Noneの項目は送りません. dictのままSigner.signで1回だけJSONにします
+        request = {"pair": self.symbol, "amount": self._size_str(size), "side": side}
+        if position_side is not None:
+            request["position_side"] = position_side
+        request["type"] = order_type
+        request["post_only"] = post_only
 
         if order_type == "limit":
-            request["price"] = str(price)
+            request["price"] = self._price_str(price)
         if order_type == "stop" or order_type == "stop_limit":
-            request["trigger_price"] = str(trigger_price)
+            request["trigger_price"] = self._price_str(trigger_price)
 
         return await self._requests('POST', url="/user/spot/order", data=request)
 
@@ -256,18 +271,18 @@ class BitBank(BotBase):
             balance = await self.fetch_balance()
             open_orders = await self._fetch_active_order()
             symbol = self.symbol.replace("_jpy", "")
-            position = "0"
+            position = self.numeric.size("0")
 
             for i in range(1, len(balance["assets"])):
                 if balance["assets"][i]["asset"].startswith(symbol):
-                    position = Decimal(balance["assets"][i]["free_amount"])
+                    position = self.numeric.size(balance["assets"][i]["free_amount"])
                     break
 
-            remaining_amount = sum([Decimal(order["remaining_amount"])
+            remaining_amount = sum([self.numeric.size(order["remaining_amount"])
                                     for order in open_orders["orders"]
                                     if order["side"] == "sell"])
 
-            return str((position + remaining_amount).normalize())
+            return self.numeric.size_str(position + remaining_amount)
         except RequestException as e:
             raise e
         except Exception as e:
@@ -314,18 +329,42 @@ class BitBank(BotBase):
         short: shortポジション数量
         }
         """
-        pos = await self.fetch_positions()
-        for i in range(len(pos['positions'])):
-            if pos['positions'][i]['pair'] == symbol:
-                if pos['positions'][i]['position_side'] == 'long':
-                    long_pos = pos['positions'][i]['open_amount']
+        long_pos = short_pos = self.numeric.size("0")
+        for p in await self.position_models():
+            if p.symbol == symbol:
+                if p.side == 'BUY':
+                    long_pos += p.size
                 else:
-                    short_pos = pos['positions'][i]['open_amount']
+                    short_pos += p.size
         return {
-            'long': Decimal(long_pos),
-            'short': Decimal(short_pos)
+            'long': long_pos,
+            'short': short_pos
             }
 
+    async def position_models(self) -> list:
+        """
+        信用取引の建玉をPositionのリストで取得します (longはBUY, shortはSELL)
+        """
+        return bitbank_positions(await self.fetch_positions(), self.numeric)
+
+    async def order_models(self) -> list:
+        """
+        注文中の情報をOrderのリストで取得します
+        """
+        return bitbank_orders(await self._fetch_active_order(), self.numeric)
+
+    async def execution_models(self) -> list:
+        """
+        自分の約定履歴をExecutionのリストで取得します
+        """
+        return bitbank_executions(await self.fetch_trades_history(), self.numeric)
+
+    async def balance_models(self) -> list:
+        """
+        口座情報をBalanceのリストで取得します
+        """
+        return bitbank_balances(await self.fetch_balance(), self.numeric)
+
     async def cancel_and_fetch_position(self) -> float:
         """
         ポジション数を取得します
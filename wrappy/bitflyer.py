@@ -1,13 +1,17 @@
-import asyncio
-import pybotters
+import time
 from typing import Literal, Union
 from decimal import Decimal
-from .time_util import now_jst
 from .base import BotBase
 from .exceptions import RequestException
+from .fastjson import read_json, json_number
+from .models import Position, net_position, bitflyer_positions, bitflyer_orders, bitflyer_executions, bitflyer_balances
 
 
 class bitflyer(BotBase):
+    exchange_id = "bitflyer"
+    base_url = "https://api.bitflyer.com"
+    ws_url = "wss://ws.lightstream.bitflyer.com/json-rpc"
+
     def __init__(self, config: str, symbol: str):
         super().__init__(config)
         # 通貨ペア
@@ -15,6 +19,8 @@ class bitflyer(BotBase):
         # APIを呼ぶ回数
         self.api_call_count_from_private = 0    #5分間で500回まで
         self.api_call_count_from_order = 0      #5分間で300回まで
+        # 注文系(5分間で300回)のレートリミッター Runtimeで動かすときに設定されます
+        self.order_rate_limiter = None
         # API keyの設定
         self.key = {"bitflyer": self.config["bitflyer"]}
         # 何かしらのエラーがでたときに繰り返す回数
@@ -35,50 +41,67 @@ class bitflyer(BotBase):
         self.log_debug("bitflyer stop end")
 
 
-    async def _cancel_and_liquidate(self, moq = 0.01):
+    async def _cancel_and_liquidate(self, moq = None, timeout: float = 10.0, orders_empty=None) -> dict:
         """
         全ての注文をキャンセルした後、ポジションを成行で反対売買してクローズします.
-        :param moq(Minimum Order Quantity)　最小ロットです
+        :param moq(Minimum Order Quantity)　最小ロットです 指定なしはsymbol_infoの値(読み込んでいなければ0.01)
+        :param timeout: キャンセル, 決済それぞれの最大待ち時間(秒)
+        :param orders_empty: privateのwebsocketで注文が無いことを確認する関数 (BotBase.flatten参照)
+        :return: BotBase.flattenの結果
         """
         self.log_debug("_cancel_and_liquidate start.")
-        self.log_info("Canceling all open orders.")
-        # 全てキャンセル.
-        await self.cancel_all_orders()
-        await asyncio.sleep(5)
-        # 5秒置いてさらに全てキャンセル.
-        await self.cancel_all_orders()
-        await asyncio.sleep(5)
-        position = await self.fetch_my_position()
-        if position:
-            if abs(position["size"]) >= moq:
-                self.log_info(f"Liquidating current position {position['size']} lot.")
-                order_datetime = now_jst()
-                if position["side"] == "BUY":
-                    order = await self.market_order("SELL", position["size"])
-                else:
-                    order = await self.market_order("BUY", position["size"])
+        report = await self.flatten(moq or self._min_order_size(0.01), timeout=timeout, orders_empty=orders_empty)
         self.log_debug("_cancel_and_liquidate end.")
+        return report
+
+
+    async def _open_order_ids(self) -> list:
+        return [order.order_id for order in await self.order_models()]
+
+
+    async def _cancel_order_ids(self, order_ids: list):
+        # cancelallchildordersは1回で全ての注文をキャンセルします
+        await self.cancel_all_orders()
+
+
+    async def _open_positions(self) -> list:
+        position = net_position(await self.position_models(), self.symbol)
+        if not position:
+            return []
+        return [Position(self.symbol, position["side"], position["size"])]
+
+
+    async def _close_position(self, position):
+        side = "SELL" if position.side == "BUY" else "BUY"
+        return await self.market_order(side, self.numeric.size_str(position.size))
 
 
     async def _requests(self, method: str, url: str, params=None, data=None):
-        async with pybotters.Client(apis=self.key, base_url='https://api.bitflyer.com') as client:
-            return await client.request(method, url=url, params=params, data=data)
+        base_url, params, data = await self._route(url, params, data)
+        apis, request = self._signed(method, base_url, url, params, data, self.key)
+        async with self._client(apis=apis, base_url=base_url) as client:
+            r = await client.request(method, **request)
+            # Clientを閉じると読めなくなるので本文を読み込んでおきます(read_jsonは読み込み済みの本文を使います)
+            await r.read()
+            return r
 
 
     async def _replace_order(self, side: str, size: Union[float, int, Decimal], order_type: str, price: any = None,
                              minute_to_expire: int = 43200, time_in_force: str = "GTC"):
-        request = {
-            "product_code": self.symbol,
-            "child_order_type": order_type,
-            "side": side,
-            "size": float(size),
-            "minute_to_expire": minute_to_expire,
-            "time_in_force": time_in_force
-        }
-
+        # fixed-pointモードのint(lot, tick)は_prepare_orderで単位の値になっています
+        size, price = self._prepare_order(side, size, price)
+        # bitflyerは数量と価格を数値で送ります. 元の値と同じ数値になるint/floatにします(json_number)
+        request = {"product_code": self.symbol, "child_order_type": order_type, "side": side, "size": json_number(size)}
+        if minute_to_expire is not None:
+            request["minute_to_expire"] = minute_to_expire
+        if time_in_force is not None:
+            request["time_in_force"] = time_in_force
         if order_type == "LIMIT":
-            request["price"] = price
+            request["price"] = json_number(price)
 
+        if self.order_rate_limiter is not None:
+            await self.order_rate_limiter.acquire()
+        sent_at = time.perf_counter()
         response = await self._requests('POST', url="/v1/me/sendchildorder", data=request)
 
         self.api_call_count_from_private += 1
@@ -86,10 +109,12 @@ class bitflyer(BotBase):
 
         if not str(response.status).startswith('2'):
             if str(response.status).startswith("4"):
-                raise RequestException(f"{response.status} Error {await response.json()}")
+                raise RequestException(f"{response.status} Error {await read_json(response)}")
             else:
                 raise RequestException(f"{response.status} Internal Server Error")
-        return  await response.json()
+        order = await read_json(response)
+        self._track_order(order.get("child_order_acceptance_id"), sent_at)
+        return order
 
 
     async def market_order(self, side: Literal["BUY", "SELL"], size: Union[float, int, Decimal]) -> dict:
@@ -137,21 +162,27 @@ class bitflyer(BotBase):
             "product_code": self.symbol,
         }
 
+        if self.order_rate_limiter is not None:
+            await self.order_rate_limiter.acquire()
         await self._requests('POST', url="/v1/me/cancelallchildorders", data=data)
 
         self.api_call_count_from_private += 1
         self.api_call_count_from_order += 1
 
 
-    async def _fetch_position(self):
-        response = await self._requests("GET", url="/v1/me/getpositions", params={"product_code": self.symbol})
+    async def _fetch(self, url: str, params: dict = None):
+        response = await self._requests("GET", url=url, params=params)
         self.api_call_count_from_private += 1
         if not str(response.status).startswith('2'):
             if str(response.status).startswith("4"):
-                raise RequestException(f"{response.status} Error {await response.json()}")
+                raise RequestException(f"{response.status} Error {await read_json(response)}")
             else:
                 raise RequestException(f"{response.status} Internal Server Error")
-        return  await response.json()
+        return  await read_json(response)
+
+
+    async def _fetch_position(self):
+        return await self._fetch("/v1/me/getpositions", params={"product_code": self.symbol})
 
 
     async def fetch_my_position(self) -> dict:
@@ -159,20 +190,72 @@ class bitflyer(BotBase):
         ポジションを取得します.
         :return {"side": side, "size": size}
         """
-        response = await self._fetch_position()
-        if not response:
+        positions = await self.position_models()
+        if not positions:
             return {}
         else:
-            size = sum([Decimal(str(r["size"])) for r in response])
-            side = response[0]["side"]
+            size = sum([p.size for p in positions])
+            side = positions[0].side
             return {"side": side, "size": size}
 
 
+    async def position_models(self) -> list:
+        """
+        建玉をPositionのリストで取得します
+        """
+        return bitflyer_positions(await self._fetch_position(), self.numeric)
+
+
+    async def order_models(self) -> list:
+        """
+        有効な注文をOrderのリストで取得します
+        """
+        data = await self._fetch("/v1/me/getchildorders", params={"product_code": self.symbol, "child_order_state": "ACTIVE"})
+        return bitflyer_orders(data, self.numeric)
+
+
+    async def execution_models(self) -> list:
+        """
+        約定履歴をExecutionのリストで取得します
+        """
+        return bitflyer_executions(await self._fetch("/v1/me/getexecutions", params={"product_code": self.symbol}), self.numeric)
+
+
+    async def balance_models(self) -> list:
+        """
+        資産残高をBalanceのリストで取得します
+        """
+        return bitflyer_balances(await self._fetch("/v1/me/getbalance"), self.numeric)
+
+
+    def _apply_execution(self, side: str, size) -> bool:
+        """
+        約定をself.positionに反映します. sizeはDecimalかfixed-pointの整数(lot)です
+        :return: ポジションが無い状態からの約定, ドテン, 全決済のときTrue
+        """
+        if not self.position:
+            self.position = {'side': side, 'size': size}
+            return True
+        current_size = self.position['size']
+        if self.position['side'] == side:
+            self.position = {'side': side, 'size': current_size + size}
+            return False
+        remaining_size = current_size - size
+        if remaining_size > 0:
+            self.position = {'side': self.position['side'], 'size': remaining_size}
+            return False
+        if remaining_size < 0:
+            self.position = {'side': side, 'size': -remaining_size}
+        else:
+            self.position = {}
+        return True
+
+
     async def manage_order_and_position(self, store):
         """
         pybotters DataStore childorderevents でイベントが起きたときにorderとpositionの管理を行います.
         example response
-            self.position = {'side': 'BUY' or 'SELL', 'size': Decimal(size)}
+            self.position = {'side': 'BUY' or 'SELL', 'size': Decimal(size)}  (fixed-pointモードではlotの整数)
             self.order_acceptanceID = ['JRF20230702-050152-184972']
         """
         # 初期化
@@ -189,45 +272,11 @@ class bitflyer(BotBase):
                         self.order_acceptanceID.append(child_order_acceptance_id)  # 注文IDを追加
 
                     elif event_type == 'EXECUTION':
-                        side = event_data['side']
-                        size = Decimal(str(event_data['size']))
                         # positionを計算します.
-                        if self.position:
-                            current_size = Decimal(str(self.position['size']))
-                            if self.position['side'] == 'BUY':
-                                if side == 'BUY':
-                                    self.position = {'side': 'BUY', 'size': current_size + size}
-                                else:
-                                    remaining_size = current_size - size
-                                    if remaining_size > 0:
-                                        self.position = {'side': 'BUY', 'size': remaining_size}
-                                    elif remaining_size < 0:
-                                        self.position = {'side': 'SELL', 'size': abs(remaining_size)}
-                                        if child_order_acceptance_id in self.order_acceptanceID:
-                                            self.order_acceptanceID.remove(child_order_acceptance_id)  # 注文を削除
-                                    else:
-                                        self.position = {}
-                                        if child_order_acceptance_id in self.order_acceptanceID:
-                                            self.order_acceptanceID.remove(child_order_acceptance_id)
-                            else:
-                                if side == 'SELL':
-                                    self.position = {'side': 'SELL', 'size': current_size + size}
-                                else:
-                                    remaining_size = current_size - size
-                                    if remaining_size > 0:
-                                        self.position = {'side': 'SELL', 'size': remaining_size}
-                                    elif remaining_size < 0:
-                                        self.position = {'side': 'BUY', 'size': abs(remaining_size)}
-                                        if child_order_acceptance_id in self.order_acceptanceID:
-                                            self.order_acceptanceID.remove(child_order_acceptance_id)
-                                    else:
-                                        self.position = {}
-                                        if child_order_acceptance_id in self.order_acceptanceID:
-                                            self.order_acceptanceID.remove(child_order_acceptance_id)
-                        else:
-                            self.position = {'side': side, 'size': size}
+                        size = self.numeric.size(event_data['size'])
+                        if self._apply_execution(event_data['side'], size):
                             if child_order_acceptance_id in self.order_acceptanceID:
-                                self.order_acceptanceID.remove(child_order_acceptance_id)
+                                self.order_acceptanceID.remove(child_order_acceptance_id)  # 注文を削除
 
                     else:   # event_type が ORDER_FAILED, CANCEL, CANCEL_FAILED, EXPIREの時の処理
                         if child_order_acceptance_id in self.order_acceptanceID:
@@ -3,16 +3,21 @@ import pybotters
 from traceback import format_exc
 from .base import BotBase
 from .exceptions import APIException
+from .fastjson import read_json
 
 
 class CoinCheck(BotBase):
+    exchange_id = "coincheck"
+    base_url = "https://coincheck.com"
+
     def __init__(self, config: str, symbol: str):
         super().__init__(config)
         self.symbol = symbol
 
 
     async def _requests(self, method: str, url: str, params=None, data=None):
-        async with pybotters.Client(apis=None, base_url="https://coincheck.com") as client:
+        params, data = self._encode_request(params, data)
+        async with self._client(apis=None, base_url=self.base_url) as client:
             response = await client.request(method, url=url, params=params, data=data)
             if not str(response.status).startswith('2'):
                 if str(response.status).startswith("429"):
@@ -20,7 +25,7 @@ class CoinCheck(BotBase):
                     await asyncio.sleep(1)
                 self.statusNotify(f"{response.status} error")
                 raise APIException(response)
-            return await response.json()
+            return await read_json(response)
 
 
     async def fetch_ticker(self):
@@ -0,0 +1,308 @@
+"""
+コンフィグファイルの読み込みです
+同じパスのファイルは1回だけ読んで確認し, 全てのボットで1つのConfigを共有します
+
+config = load_config("config.json")
+bot1 = MyGMOBot(config, "BTC_JPY")      # パスを渡しても同じConfigになります
+config.value("log_level")               # 無ければSCHEMAの既定値です
+
+APIキーなどの秘密の値は環境変数で上書きできます(SCHEMAのenv). ファイルに書かずに
+WRAPPY_GMOCOIN_KEY=... WRAPPY_GMOCOIN_SECRET=... python bot.py
+のように渡せます
+
+ホットリロード: "reload_interval": 5 を設定すると, 動いている間ファイルの更新を見て読み直します
+読み直すのは reloadable の値(log_level, rate_limits, loop_lag_threshold)とSCHEMAに無いロジックのパラメータだけです
+APIキーやURLなど再起動が必要な値は変えずに警告します. 読み直したファイルが不正なら前の値のまま動きます
+"""
+import os
+import json
+import asyncio
+import logging
+import weakref
+from .exceptions import ConfigException
+
+
+logger = logging.getLogger(__name__)
+
+
+class Setting(object):
+    """
+    1つの設定項目です
+    """
+    __slots__ = ("types", "default", "secret", "reloadable", "env", "choices", "check")
+
+    def __init__(self, types, default=None, secret: bool = False, reloadable: bool = False, env=None,
+                 choices: tuple = None, check=None):
+        """
+        :param types: 値の型(複数はtuple)
+        :param default: 無いときの値(Config.value)
+        :param secret: 秘密の値 reprで伏せ, 読み直しません
+        :param reloadable: ホットリロードで読み直します
+        :param env: 上書きする環境変数 APIキーは (キーの変数, シークレットの変数)
+        :param choices: 取れる値
+        :param check: 値を確認する関数 不正ならエラーの理由の文字列を返します
+        """
+        self.types = types
+        self.default = default
+        self.secret = secret
+        self.reloadable = reloadable
+        self.env = env
+        self.choices = choices
+        self.check = check
+
+
+def _check_key_pair(value):
+    if len(value) != 2 or not all(isinstance(v, str) for v in value):
+        return "must be [API_KEY, API_SECRET]"
+
+
+def _check_key_pairs(value):
+    for pair in value:
+        if not isinstance(pair, (list, tuple)) or _check_key_pair(pair):
+            return "must be [[API_KEY, API_SECRET], ...]"
+
+
+def _check_rate_limits(value):
+    for exchange, limit in value.items():
+        if not isinstance(limit, dict) or not isinstance(limit.get("rate"), (int, float)) or limit["rate"] <= 0:
+            return f"{exchange} must be {{\"rate\": number > 0, \"per\": seconds, \"burst\": number}}"
+        if set(limit) - {"rate", "per", "burst"}:
+            return f"{exchange} has unknown keys {sorted(set(limit) - {'rate', 'per', 'burst'})}"
+
+
+def _api_key(env: str) -> Setting:
+    return Setting(list, secret=True, env=(f"WRAPPY_{env}_KEY", f"WRAPPY_{env}_SECRET"), check=_check_key_pair)
+
+
+_NUMBER = (int, float)
+
+# コンフィグの項目です. ここに無いキーはロジックのパラメータとして扱い, そのまま読み込んで読み直しもします
+SCHEMA = {
+    "exchange_name": Setting(str, "Exchange"),
+    "bot_name": Setting(str, "Bot"),
+    "log_level": Setting((str, int), "DEBUG", reloadable=True,
+                         choices=("CRITICAL", "ERROR", "WARNING", "INFO", "DEBUG", 50, 40, 30, 20, 10)),
+    "log_dir": Setting((str, type(None)), "log"),
+    "line_notify_token": Setting(str, secret=True, env="WRAPPY_LINE_NOTIFY_TOKEN"),
+    "discordWebhook": Setting(str, secret=True, env="WRAPPY_DISCORD_WEBHOOK"),
+    "gmocoin": _api_key("GMOCOIN"),
+    "bitbank": _api_key("BITBANK"),
+    "bitflyer": _api_key("BITFLYER"),
+    "ftx": _api_key("FTX"),
+    "bybit": _api_key("BYBIT"),
+    "bitbank_keys": Setting(list, secret=True, env="WRAPPY_BITBANK_KEYS", check=_check_key_pairs),
+    "base_urls": Setting(dict, {}),
+    "ws_urls": Setting(dict, {}),
+    "metrics": Setting(bool, True),
+    "numeric_mode": Setting(str, "decimal", choices=("decimal", "int")),
+    "fixed_point": Setting(dict),
+    "loop_lag_threshold": Setting(_NUMBER, reloadable=True),
+    "record_dir": Setting(str),
+    "paper": Setting((bool, dict), False),
+    "rate_limits": Setting(dict, reloadable=True, check=_check_rate_limits),
+    "reload_interval": Setting(_NUMBER),
+    "fast_signing": Setting(bool, True),
+}
+
+
+def validate(data: dict) -> dict:
+    """
+    SCHEMAの項目の型と値を確認します. 不正ならConfigExceptionです
+    """
+    if not isinstance(data, dict):
+        raise ConfigException("<root>", "config must be a JSON object")
+    for key, value in data.items():
+        setting = SCHEMA.get(key)
+        if setting is None or value is None:
+            continue
+        # boolはintの子クラスなので, 数値の項目にtrue/falseを書いたものは弾きます
+        if not isinstance(value, setting.types) or (isinstance(value, bool) and bool not in _types(setting)):
+            raise ConfigException(key, f"must be {' or '.join(t.__name__ for t in _types(setting))}, "
+                                       f"got {type(value).__name__}")
+        if setting.choices is not None and value not in setting.choices:
+            raise ConfigException(key, f"must be one of {setting.choices}, got {value!r}")
+        if setting.check is not None:
+            reason = setting.check(value)
+            if reason:
+                raise ConfigException(key, reason)
+    return data
+
+
+def _types(setting: Setting) -> tuple:
+    return setting.types if isinstance(setting.types, tuple) else (setting.types,)
+
+
+def apply_env(data: dict, environ=None) -> dict:
+    """
+    環境変数で秘密の値を上書きします. APIキーはキーとシークレットの両方があるときだけ上書きします
+    """
+    environ = os.environ if environ is None else environ
+    for key, setting in SCHEMA.items():
+        if setting.env is None:
+            continue
+        if isinstance(setting.env, tuple):
+            values = [environ.get(name) for name in setting.env]
+            if all(values):
+                data[key] = values
+        elif setting.env in environ:
+            value = environ[setting.env]
+            if setting.types is list:
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    raise ConfigException(key, f"{setting.env} must be JSON") from None
+            data[key] = value
+    return data
+
+
+def _stamp(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return validate(apply_env(json.load(f)))
+
+
+class Config(dict):
+    """
+    確認済みのコンフィグです. dictとしてそのまま self.config["gmocoin"] のように使えます
+    """
+    def __init__(self, data: dict = None, path: str = None):
+        super().__init__(data or {})
+        self.path = path
+        self._stamp = _stamp(path) if path else None
+        self._listeners = []
+        self._watcher = None
+
+    @classmethod
+    def load(cls, path: str) -> "Config":
+        stamp = _stamp(path)
+        config = cls(_read(path), path)
+        config._stamp = stamp
+        return config
+
+    def value(self, key: str):
+        """
+        keyの値です. 無ければSCHEMAの既定値(SCHEMAに無いキーはNone)です
+        """
+        try:
+            return self[key]
+        except KeyError:
+            setting = SCHEMA.get(key)
+            return None if setting is None else setting.default
+
+    def __repr__(self):
+        masked = {k: "***" if k in SCHEMA and SCHEMA[k].secret and v else v for k, v in self.items()}
+        return f"Config({masked!r}, path={self.path!r})"
+
+    def __reduce__(self):
+        # プロセスに渡すときは値とパスだけにします(リスナーとタスクは渡せません)
+        return self.__class__, (dict(self), self.path)
+
+    # ホットリロード
+    def subscribe(self, listener):
+        """
+        読み直したときに listener(changed) を呼びます. changedは変わった値の {キー: 新しい値} です(削除はNone)
+        ボットのメソッドは弱参照で持つので, ボットが無くなれば呼ばれません
+        """
+        if hasattr(listener, "__self__"):
+            self._listeners.append(weakref.WeakMethod(listener))
+        else:
+            self._listeners.append(lambda: listener)
+
+    def changed(self) -> bool:
+        """
+        最後に読んでからファイルが更新されていればTrueです
+        """
+        return self.path is not None and _stamp(self.path) != self._stamp
+
+    def reload(self) -> dict:
+        """
+        ファイルを読み直して, 読み直せる値だけを反映します
+        :return: 反映した値 {キー: 新しい値} 読めなかったときは空です
+        """
+        if self.path is None:
+            return {}
+        # 読めなかったときも更新時刻は進めて, 次にファイルが更新されるまで同じ警告を繰り返さないようにします
+        self._stamp = _stamp(self.path)
+        try:
+            data = _read(self.path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"config reload failed, keeping the current values: {e}")
+            return {}
+        changed = {}
+        for key in set(self) | set(data):
+            old, new = self.get(key), data.get(key)
+            if old == new:
+                continue
+            setting = SCHEMA.get(key)
+            if setting is not None and not setting.reloadable:
+                # 秘密の値もキーの名前だけを出します
+                logger.warning(f"config {key} changed but needs a restart to take effect.")
+                continue
+            changed[key] = new
+        for key, new in changed.items():
+            if new is None:
+                self.pop(key, None)
+            else:
+                self[key] = new
+        if changed:
+            logger.info(f"config reloaded: {sorted(changed)}")
+            self._notify(changed)
+        return changed
+
+    def _notify(self, changed: dict):
+        alive = []
+        for ref in self._listeners:
+            listener = ref()
+            if listener is None:
+                continue
+            alive.append(ref)
+            try:
+                listener(changed)
+            except Exception as e:
+                logger.exception(f"config listener failed: {e!r}")
+        self._listeners = alive
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            if self.changed():
+                self.reload()
+
+    def watch(self, interval: float):
+        """
+        interval秒ごとにファイルの更新を見て読み直すタスクを動かします. 何度呼んでも1つだけです
+        """
+        if self.path is None:
+            return None
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.ensure_future(self._watch(interval))
+        return self._watcher
+
+
+# パスごとの読み込み済みのConfigです
+_configs = {}
+
+
+def load_config(path) -> Config:
+    """
+    コンフィグを読み込みます. 同じパスは同じConfigを返し, ファイルが更新されていれば読み直します
+    :param path: ファイルのパスか dict か Config
+    """
+    if isinstance(path, Config):
+        return path
+    if isinstance(path, dict):
+        return Config(validate(apply_env(dict(path))))
+    key = os.path.abspath(path)
+    config = _configs.get(key)
+    if config is None:
+        config = _configs[key] = Config.load(key)
+    elif config.changed():
+        config.reload()
+    return config
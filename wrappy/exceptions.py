@@ -46,4 +46,22 @@ class RequestException(Exception):
         self.message = message
 
     def __str__(self):
-        return f'RequestException: {self.message}'
\ No newline at end of file
+        return f'RequestException: {self.message}'
+
+class InvalidOrderException(Exception):
+    """発注前のチェック(呼値, 最小数量など)で弾いた注文です. APIは呼んでいません"""
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return f'InvalidOrderException: {self.message}'
+
+class ConfigException(ValueError):
+    """コンフィグの値が不正です. キーと理由を持ちます"""
+    def __init__(self, key, message):
+        super().__init__(key, message)
+        self.key = key
+        self.message = message
+
+    def __str__(self):
+        return f'ConfigException: {self.key}: {self.message}'
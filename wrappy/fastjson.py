@@ -0,0 +1,142 @@
+import json
+import math
+import time
+from decimal import Decimal, InvalidOperation
+from .metrics import record_decode
+
+# 使えるものの中で一番速いJSONライブラリを使います orjson > msgspec > json
+try:
+    import orjson
+
+    BACKEND = "orjson"
+    loads = orjson.loads
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    try:
+        import msgspec
+
+        BACKEND = "msgspec"
+        _encoder = msgspec.json.Encoder()
+        _decoder = msgspec.json.Decoder()
+        loads = _decoder.decode
+
+        def dumps(obj) -> bytes:
+            return _encoder.encode(obj)
+    except ImportError:
+        BACKEND = "json"
+        loads = json.loads
+
+        def dumps(obj) -> bytes:
+            return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+try:
+    import msgspec
+    DecodeError = (ValueError, msgspec.DecodeError)
+except ImportError:
+    msgspec = None
+    DecodeError = (ValueError,)
+
+
+def _plain_number(text: str):
+    """
+    指数表記の無い10進数の文字列を, 有効数字15桁までならint/floatにします. それ以外はNoneです
+    """
+    integer, _, fraction = text.partition(".")
+    digits = integer.removeprefix("-") + fraction
+    if not (digits.isdigit() and digits.isascii()):
+        return None
+    if not fraction.rstrip("0"):
+        return int(integer) if integer.removeprefix("-") else 0
+    if len(digits.strip("0")) > 15:
+        return None
+    return float(text)
+
+
+# json_numberの変換結果のキャッシュです {値: int/float} 等しい値は同じ数値になるので型が違っても共有できます
+_numbers = {}
+
+
+def json_number(value):
+    """
+    JSONの数値で送る値(bitflyerの数量と価格)です. orjsonはDecimalをJSONにできないので, 整数はint, 小数はfloatにします
+    有効数字15桁までの小数はfloatのreprが同じ桁に戻るので, 送る数値は元の値と同じです. それより長い桁と数値でない値はValueErrorです
+    発注の数量と価格は同じ値が繰り返し来るので, 変換した結果を65536件までキャッシュします
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"not a JSON number: {value!r}")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError(f"not a JSON number: {value!r}")
+        return value
+    number = _numbers.get(value)
+    if number is None:
+        number = _to_number(value)
+        if len(_numbers) >= 65536:
+            _numbers.clear()
+        _numbers[value] = number
+    return number
+
+
+def _to_number(value):
+    number = _plain_number(value if isinstance(value, str) else str(value))
+    if number is not None:
+        return number
+    # 1E-8 のような指数表記は桁を書き出してから変換します
+    try:
+        decimal = value if isinstance(value, Decimal) else Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"not a JSON number: {value!r}") from None
+    if not decimal.is_finite():
+        raise ValueError(f"not a JSON number: {value!r}")
+    number = _plain_number(format(decimal, "f"))
+    if number is None:
+        raise ValueError(f"more than 15 significant digits: {value!r}")
+    return number
+
+
+def decoder(type_=None):
+    """
+    bytes/strをデコードする関数を返します
+    msgspecがあってtype_(msgspec.Struct)を指定した場合は, dictを作らずに直接type_にデコードします
+    """
+    if type_ is not None and msgspec is not None:
+        return msgspec.json.Decoder(type_).decode
+    return loads
+
+
+async def read_json(response, decode=loads):
+    """
+    response.json()の代わりです 本文のbytesをstrにせずにそのままデコードします
+    """
+    start = time.perf_counter()
+    data = decode(await response.read())
+    record_decode(time.perf_counter() - start)
+    return data
+
+
+def ws_handler(handler, decode=loads):
+    """
+    pybottersのhdlr_str/hdlr_bytesに渡すハンドラを作ります
+    hdlr_jsonは標準のjsonでデコードするので, 代わりにこちらで受けて速いデコーダでデコードします
+    client.ws_connect(url, send_json=..., hdlr_str=ws_handler(store.onmessage), hdlr_bytes=ws_handler(store.onmessage))
+    """
+    def onmessage(raw, ws):
+        try:
+            data = decode(raw)
+        except DecodeError:
+            # "ping", "pong" などJSONでないメッセージ
+            return
+        handler(data, ws)
+    return onmessage
+
+
+def ws_connect_kwargs(handler, decode=loads) -> dict:
+    """
+    client.ws_connectに渡すハンドラ引数です
+    """
+    hdlr = ws_handler(handler, decode)
+    return {"hdlr_str": hdlr, "hdlr_bytes": hdlr}
@@ -0,0 +1,54 @@
+from .models import str_to_fixed, fixed_to_str
+
+
+class FixedPoint(object):
+    """
+    価格と数量を整数(tick, lot)で扱うためのスケールです. 通貨ペアごとに作ります
+    price_decimals=0, size_decimals=8 なら 価格1円 = 1tick, 数量0.00000001 = 1lot です
+    コンフィグに "fixed_point": {"price_decimals": 0, "size_decimals": 8} を書くと有効になり,
+    発注系メソッドに渡したint は tick / lot として扱い, APIに送る直前に文字列へ変換します
+    """
+    __slots__ = ("price_decimals", "size_decimals", "price_scale", "size_scale", "_price_strs", "_size_strs")
+
+    def __init__(self, price_decimals: int = 0, size_decimals: int = 8):
+        self.price_decimals = price_decimals
+        self.size_decimals = size_decimals
+        self.price_scale = 10 ** price_decimals
+        self.size_scale = 10 ** size_decimals
+        # 発注に使う値は限られているので文字列をキャッシュします
+        self._price_strs = {}
+        self._size_strs = {}
+
+    def price(self, value) -> int:
+        """
+        "5000000.5" などをtickの整数にします
+        """
+        return str_to_fixed(value, self.price_decimals)
+
+    def size(self, value) -> int:
+        """
+        "0.01" などをlotの整数にします
+        """
+        return str_to_fixed(value, self.size_decimals)
+
+    def price_str(self, ticks: int) -> str:
+        s = self._price_strs.get(ticks)
+        if s is None:
+            if len(self._price_strs) > 65536:
+                self._price_strs.clear()
+            s = self._price_strs[ticks] = fixed_to_str(ticks, self.price_decimals)
+        return s
+
+    def size_str(self, lots: int) -> str:
+        s = self._size_strs.get(lots)
+        if s is None:
+            if len(self._size_strs) > 65536:
+                self._size_strs.clear()
+            s = self._size_strs[lots] = fixed_to_str(lots, self.size_decimals)
+        return s
+
+    def size_float(self, lots: int) -> float:
+        return lots / self.size_scale
+
+    def price_float(self, ticks: int) -> float:
+        return ticks / self.price_scale
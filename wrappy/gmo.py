@@ -1,3 +1,4 @@
+import time
 import pybotters
 import asyncio
 from pybotters.helpers import GMOCoinHelper
@@ -6,8 +7,15 @@ from typing import Literal, Union
 from .time_util import now_jst
 from .base import BotBase
 from .exceptions import RequestException
+from .fastjson import read_json, ws_connect_kwargs
+from .replay import stream_name
+from .models import gmo_positions, gmo_orders, gmo_executions, gmo_balances
 
 class GMO(BotBase):
+    exchange_id = "gmo"
+    base_url = "https://api.coin.z.com"
+    ws_url = "wss://api.coin.z.com/ws"
+
     def __init__(self, config: str, symbol: str):
         super().__init__(config)
         self.symbol = symbol
@@ -17,11 +25,13 @@ class GMO(BotBase):
         self.position = {}
 
     async def _requests(self, method: str, url: str, params=None, data=None):
-        async with pybotters.Client(apis=self.key, base_url='https://api.coin.z.com') as client:
-            r = await client.request(method, url=url, params=params, data=data)
+        base_url, params, data = await self._route(url, params, data)
+        apis, request = self._signed(method, base_url, url, params, data, self.key)
+        async with self._client(apis=apis, base_url=base_url) as client:
+            r = await client.request(method, **request)
             if not str(r.status).startswith('2'):
                 raise RequestException(f"[{r.status}] server error")
-            data = await r.json()
+            data = await read_json(r)
             if not data['status'] == 0:
                 err_code = data['messages'][0]['message_code']
                 err_msg = str(data['messages'][0]['message_string'])
@@ -42,32 +52,43 @@ class GMO(BotBase):
         self.log_debug("gmocoin stop end")
 
 
-    async def _cancel_and_liquidate(self, moq = 0.01):
+    async def _cancel_and_liquidate(self, moq = None, timeout: float = 10.0, orders_empty=None) -> dict:
         """
         全ての注文をキャンセルした後、ポジションを成行で反対売買してクローズします.
-        :param moq(Minimum Order Quantity)最小ロットです
+        :param moq(Minimum Order Quantity)最小ロットです 指定なしはsymbol_infoの値(読み込んでいなければ0.01)
+        :param timeout: キャンセル, 決済それぞれの最大待ち時間(秒)
+        :param orders_empty: privateのwebsocketで注文が無いことを確認する関数 (BotBase.flatten参照)
+        :return: BotBase.flattenの結果
         """
         self.log_debug("_cancel_and_liquidate start.")
-        self.log_info("Canceling all open orders.")
-        # 全てキャンセル.
-        await asyncio.sleep(1)
-        await self.cancel_all_orders()
-        # 5秒置いてさらに全てキャンセル.
-        await asyncio.sleep(5)
-        await self.cancel_all_orders()
-        position_list = await self.position_summary(self.symbol)
-        if position_list["list"]:
-            for i in range(len(position_list["list"])):
-                size = position_list["list"][i]['sumPositionQuantity']
-                if position_list["list"][i]["side"] == "BUY":
-                    side = "SELL"
-                else:
-                    side = "BUY"
-
-                if Decimal(size) >= Decimal(str(moq)):
-                    order_id = await self.liquidate_order_market(side, size)
-                    self.log_info(f"Liquidating current position {size} lot.")
+        report = await self.flatten(moq or self._min_order_size(0.01), timeout=timeout, orders_empty=orders_empty)
         self.log_debug("_cancel_and_liquidate end.")
+        return report
+
+    async def _open_order_ids(self) -> list:
+        order_ids = []
+        page = 1
+        while True:
+            active_orders = await self.active_orders(self.symbol, page=page, count=100)
+            orders = active_orders.get("list", []) if active_orders else []
+            order_ids += [order["orderId"] for order in orders]
+            if len(orders) < 100:
+                return order_ids
+            page += 1
+
+    async def _cancel_order_ids(self, order_ids: list):
+        """
+        cancelOrdersは1回10件までなので, 10件ずつ並列に送ります
+        """
+        return await self._gather_requests(
+            [self.cancel_any_orders(order_ids[i:i + 10]) for i in range(0, len(order_ids), 10)], "cancelOrders")
+
+    async def _open_positions(self) -> list:
+        return await self.position_models(self.symbol)
+
+    async def _close_position(self, position):
+        side = "SELL" if position.side == "BUY" else "BUY"
+        return await self.liquidate_order_market(side, self.numeric.size_str(position.size))
 
     async def account_margin(self):
         """
@@ -359,12 +380,36 @@ class GMO(BotBase):
         return await self._requests('GET', '/private/v1/positionSummary', params={"symbol": symbol})
 
     async def fetch_my_position(self):
-        data = await self.position_summary(self.symbol)
-        if data["list"]:
-            return {"side": data["list"][0]["side"], "size": Decimal(data["list"][0]["sumPositionQuantity"])}
+        positions = await self.position_models()
+        if positions:
+            return {"side": positions[0].side, "size": positions[0].size}
         else:
             return {}
 
+    async def position_models(self, symbol: str = None) -> list:
+        """
+        建玉サマリーをPositionのリストで取得します
+        """
+        return gmo_positions(await self.position_summary(symbol or self.symbol), self.numeric)
+
+    async def order_models(self) -> list:
+        """
+        有効注文をOrderのリストで取得します
+        """
+        return gmo_orders(await self.active_orders(self.symbol), self.numeric)
+
+    async def execution_models(self) -> list:
+        """
+        直近1日分の約定をExecutionのリストで取得します
+        """
+        return gmo_executions(await self.latest_executions(self.symbol), self.numeric)
+
+    async def balance_models(self) -> list:
+        """
+        資産残高をBalanceのリストで取得します
+        """
+        return gmo_balances(await self.account_assets(), self.numeric)
+
     async def _replace_order(self, side: str,
                              size: Union[float, int, Decimal],
                              order_type: Literal["MARKET", "LIMIT", "STOP"],
@@ -374,29 +419,33 @@ class GMO(BotBase):
                              timeInForce: Literal["FAK", "FAS", "FOK", "SOK"] = None,
                              losscut_price: Union[float, int, Decimal, str] = None,
                              cancelBefore: bool = False):
-        data = {
-            "symbol": self.symbol,
-            "side": side,
-            "executionType": order_type,
-            "timeInForce": timeInForce,
-            "losscutPrice": losscut_price,
-            "cancelBefore": cancelBefore
-        }
+        size, price = self._prepare_order(side, size, price)
+        size = self._size_str(size)
+        # Noneの項目は送りません. dictのままSigner.signで1回だけJSONにします
+        data = {"symbol": self.symbol, "side": side, "executionType": order_type}
+        if timeInForce is not None:
+            data["timeInForce"] = timeInForce
+        if losscut_price is not None:
+            data["losscutPrice"] = self._price_str(losscut_price)
+        data["cancelBefore"] = cancelBefore
 
         if create_or_liquidate == 'create':    # 新規の注文
             url = '/private/v1/order'
-            data["size"] = str(size)
+            data["size"] = size
         elif create_or_liquidate == 'liquidate':  # positionId毎に決済
             url = '/private/v1/closeOrder'
-            data["settlePosition"] = [{"positionId": positionId, "size": str(size)}]
+            data["settlePosition"] = [{"positionId": positionId, "size": size}]
         else:   # 全てのポジションを決済
             url = '/private/v1/closeBulkOrder'
-            data["size"] = str(size)
+            data["size"] = size
 
         if (order_type == 'LIMIT') or (order_type == 'STOP'):
-            data['price'] = str(price)
+            data['price'] = self._price_str(price)
 
-        return await self._requests('POST', url=url, data=data)
+        sent_at = time.perf_counter()
+        order_id = await self._requests('POST', url=url, data=data)
+        self._track_order(order_id, sent_at)
+        return order_id
 
     async def market_order(self, side: Literal["BUY", "SELL"], size: Union[float, int, Decimal],
                            timeInForce: Literal["FAK", "FAS", "FOK", "SOK"] = None,
@@ -592,15 +641,16 @@ class GMO(BotBase):
                                     params={"symbol": symbol, 'interval': interval, 'date': date})
 
     # websocket
-    async def gmo_ws(self, client, store, *subscriptions):
+    async def gmo_ws(self, client, store, *subscriptions, stale_timeout: float = None, on_resync=None):
         """ exsample code
         params = [{"command": "subscribe", "channel": "orderbooks", "symbol": self.symbol},
                   {"command": "subscribe", "channel": "trades", "symbol": self.symbol}]
         async with pybotters.Client() as client:
-            await self.ws(client, store, *params)
+            await self.gmo_ws(client, store, *params, stale_timeout=10)
         """
         subscription_commands = [{"command": subscription["command"], "channel": subscription["channel"], "symbol": subscription["symbol"]} for subscription in subscriptions]
-        await self.ws('wss://api.coin.z.com/ws/public/v1', client, store, subscription_commands)
+        return await self.ws(f'{self.ws_url}/public/v1', client, store, subscription_commands,
+                             stale_timeout=stale_timeout, on_resync=on_resync)
 
     # private websocket
     async def gmo_priv_ws(self, client, store, *subscriptions):
@@ -616,11 +666,25 @@ class GMO(BotBase):
                 それか
                 # tg.create_task(self.gmo_priv_ws(client, store, {"command": "subscribe", "channel": "positionEvents"}, {"command": "subscribe", "channel": "orderEvents"}))
         """
+        # ペーパートレードでは約定シミュレーターに接続します
+        # リプレイ中は接続せず, 記録するときはトークンを除いたURLのストリーム名で記録します
+        local = self.custom_url or self.paper is not None
+        if self.paper is not None:
+            handler = self._latency_handler(store.onmessage)
+        else:
+            handler = self._stream_handler(stream_name(self.exchange_id, f"{self.ws_url}/private/v1"),
+                                           self._latency_handler(store.onmessage))
+            if handler is None:
+                return
         # Create a helper instance for GMOCoin.
         gmohelper = GMOCoinHelper(client)
 
         # Alias for POST /private/v1/ws-auth.
-        token = await gmohelper.create_access_token()
+        if local:
+            # GMOCoinHelperは本番のURLに送るので, URLを差し替えたときは自前で取得します
+            token = await self._requests('POST', '/private/v1/ws-auth')
+        else:
+            token = await gmohelper.create_access_token()
 
         # サブスクリプションコマンドのリストを動的に構築する。
         subscription_commands = []
@@ -630,10 +694,15 @@ class GMO(BotBase):
                 command["option"] = subscription["option"]
             subscription_commands.append(command)
 
+        ws_url = await self.paper.ws_url(self.exchange_id, self.ws_url) if self.paper is not None else self.ws_url
         ws = await client.ws_connect(
-            f"wss://api.coin.z.com/ws/private/v1/{token}",
+            f"{ws_url}/private/v1/{token}",
             send_json=subscription_commands,
-            hdlr_json=store.onmessage
+            **ws_connect_kwargs(handler)
         )
+        if local:
+            # モックサーバーのトークンは期限切れにならないので延長しません
+            await ws.wait()
+            return
         async with asyncio.TaskGroup() as tg:
             tg.create_task(gmohelper.manage_ws_token(ws, token))
\ No newline at end of file
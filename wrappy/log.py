@@ -1,38 +1,57 @@
-import json
 import sys
 import os
 import logging
 from logging.handlers import RotatingFileHandler
+from .time_util import format_time
+from .config import load_config
+from .exceptions import ConfigException
+
+
+class _Formatter(logging.Formatter):
+    """
+    asctimeをtime_util.format_timeで作ります. 同じ秒のログは日時の文字列を使い回します
+    """
+    def formatTime(self, record, datefmt=None):
+        if datefmt is None:
+            return super().formatTime(record, datefmt)
+        return format_time(record.created, None, datefmt)
+
 
 class Log(object):
     def __init__(self, path):
+        """
+        :param path: コンフィグファイルのパス 読み込み済みのdictやConfigも渡せます(複数のボットで使い回す場合)
+                     同じパスのファイルは1回だけ読み, 全てのボットで1つのConfigを共有します(config.load_config)
+        """
         try:
-            self.apis = self.config = json.load(open(path, 'r', encoding="utf-8"))
+            self.apis = self.config = load_config(path)
         except FileNotFoundError as e:
             print("[ERROR] Config file is not found.", file=sys.stderr)
             raise e
+        except ConfigException as e:
+            print(f"[ERROR] Config file is invalid. {e}", file=sys.stderr)
+            raise e
         except ValueError as e:
             print("[ERROR] Json file is invalid.", file=sys.stderr)
             raise e
         self.logger = None
 
-        try:
-            self.exchange_name = self.config["exchange_name"]
-        except KeyError:
-            self.exchange_name = 'Exchange'
-            pass
-        try:
-            self.bot_name = self.config["bot_name"]
-        except KeyError:
-            self.bot_name = 'Bot'
-        try:
-            self.log_level = self.config["log_level"]
-        except KeyError:
-            self.log_level = 'DEBUG'
-        try:
-            self.log_dir = self.config["log_dir"]
-        except KeyError:
-            self.log_dir = 'log'
+        self.exchange_name = self.config.value("exchange_name")
+        self.bot_name = self.config.value("bot_name")
+        self.log_level = self.config.value("log_level")
+        self.log_dir = self.config.value("log_dir")
+        # ホットリロードでlog_levelが変わったらロガーに反映します
+        self.config.subscribe(self._on_config_reload)
+
+    def _on_config_reload(self, changed: dict):
+        if "log_level" not in changed:
+            return
+        self.log_level = self.config.value("log_level")
+        if self.logger:
+            self.logger.setLevel(self.log_level)
+            for handler in self.logger.handlers:
+                handler.setLevel(self.log_level)
+            self.logger.info(f"Log level changed to {self.log_level}.")
 
     def _initialize_logger(self):
         """
@@ -42,8 +61,8 @@ class Log(object):
             self.logger = logging.getLogger(f"{self.exchange_name}_{self.bot_name}")
             self.logger.setLevel(self.log_level)
             if not self.logger.hasHandlers():
-                stream_formatter = logging.Formatter(fmt="[%(levelname)s] %(asctime)s : %(message)s",
-                                                     datefmt="%Y-%m-%d %H:%M:%S")
+                stream_formatter = _Formatter(fmt="[%(levelname)s] %(asctime)s : %(message)s",
+                                              datefmt="%Y-%m-%d %H:%M:%S")
                 stream_handler = logging.StreamHandler()
                 stream_handler.setFormatter(stream_formatter)
                 stream_handler.setLevel(self.log_level)
@@ -52,8 +71,8 @@ class Log(object):
                     # コンフィグファイルでログディレクトリが指定されていた場合、ファイルにも出力します.
                     if not os.path.exists(self.log_dir):
                         os.mkdir(self.log_dir)
-                    file_formatter = logging.Formatter(fmt="[%(levelname)s] %(asctime)s %(module)s: %(message)s",
-                                                       datefmt="%Y-%m-%d %H:%M:%S")
+                    file_formatter = _Formatter(fmt="[%(levelname)s] %(asctime)s %(module)s: %(message)s",
+                                                datefmt="%Y-%m-%d %H:%M:%S")
                     file_handler = RotatingFileHandler(
                         filename=os.path.join(self.log_dir, f"{self.exchange_name}_{self.bot_name}.log"),
                         maxBytes=1024 * 1024 * 2, backupCount=3)
@@ -0,0 +1,153 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def new_event_loop(use_uvloop: bool = True, debug: bool = False, slow_callback_duration: float = 0.1,
+                   eager_tasks: bool = False) -> asyncio.AbstractEventLoop:
+    """
+    イベントループを作ります. uvloopが入っていればuvloopを使います
+    :param debug: asyncioのデバッグモード slow_callback_durationを超えたコールバックがログに出ます
+    :param slow_callback_duration: デバッグモードで遅いとみなす秒数
+    :param eager_tasks: python3.12以降でeager_task_factoryを使います(すぐ終わるタスクのスケジューリングを省きます)
+    """
+    if use_uvloop and uvloop is not None:
+        loop = uvloop.new_event_loop()
+    else:
+        loop = asyncio.new_event_loop()
+    loop.set_debug(debug)
+    loop.slow_callback_duration = slow_callback_duration
+    if eager_tasks and hasattr(asyncio, "eager_task_factory"):
+        loop.set_task_factory(asyncio.eager_task_factory)
+    return loop
+
+
+class LoopLagMonitor(object):
+    """
+    イベントループの遅れ(スケジューリングの遅延)を測ります
+    interval秒ごとにsleepして, 実際に起きるまでの遅れをlagとします
+    別スレッドの見張りがループの止まりを検出し, threshold秒を超えたらその時点のループのスタックをログに出すので,
+    pandasの重い処理や同期のログ出力などループを止めているコードが分かります
+
+    monitor = LoopLagMonitor(threshold=0.1, logger=bot.logger)
+    monitor.start()
+    ...
+    bot.log_info(monitor.stats())
+    """
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, logger=None, capture_stack: bool = True,
+                 on_lag=None):
+        """
+        :param interval: 測る間隔(秒)
+        :param threshold: この秒数を超える遅れを警告します
+        :param logger: 警告を出すロガー 指定なしはwrappy.loop
+        :param capture_stack: ループが止まっている間のスタックをログに出すか
+        :param on_lag: 遅れを検出したときに呼ぶ関数 on_lag(lag)
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.logger = logger or globals()["logger"]
+        self.capture_stack = capture_stack
+        self.on_lag = on_lag
+        self.count = 0
+        self.lag_count = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self._heartbeat = time.monotonic()
+        self._task = None
+        self._thread = None
+        self._loop_thread_id = None
+        self._running = False
+
+    def start(self):
+        """
+        実行中のループで監視を始めます
+        """
+        self._running = True
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        if self.capture_stack:
+            self._thread = threading.Thread(target=self._watch, name="wrappy-loop-watchdog", daemon=True)
+            self._thread.start()
+        return self
+
+    async def _measure(self):
+        while self._running:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - start - self.interval)
+            self.count += 1
+            self.last_lag = lag
+            self.total_lag += lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag > self.threshold:
+                self.lag_count += 1
+                self.logger.warning(f"Event loop lag {lag * 1000:.1f} ms (threshold {self.threshold * 1000:.0f} ms).")
+                if self.on_lag is not None:
+                    self.on_lag(lag)
+
+    def _watch(self):
+        # heartbeatが止まっている間に1回だけループのスタックを出します
+        reported = None
+        while self._running:
+            time.sleep(self.interval)
+            heartbeat = self._heartbeat
+            if time.monotonic() - heartbeat > self.interval + self.threshold and reported != heartbeat:
+                reported = heartbeat
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    stack = "".join(traceback.format_stack(frame))
+                    self.logger.warning(f"Event loop is blocked. Stack of the loop thread:\n{stack}")
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "lag_count": self.lag_count,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "mean_lag": self.total_lag / self.count if self.count else 0.0,
+        }
+
+    def stop(self):
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def run(main, use_uvloop: bool = True, debug: bool = False, slow_callback_duration: float = 0.1,
+        eager_tasks: bool = False, lag_threshold: float = None, lag_interval: float = 0.1, logger=None):
+    """
+    asyncio.runの代わりです. uvloopを使い, lag_thresholdを指定するとLoopLagMonitorを動かします
+    :param main: 実行するコルーチン
+    :param lag_threshold: この秒数を超えるループの遅れを警告します(指定なしは監視しません)
+    :return: mainの戻り値
+    """
+    async def _main():
+        monitor = None
+        if lag_threshold is not None:
+            monitor = LoopLagMonitor(interval=lag_interval, threshold=lag_threshold, logger=logger).start()
+        try:
+            return await main
+        finally:
+            if monitor is not None:
+                monitor.stop()
+
+    with asyncio.Runner(loop_factory=lambda: new_event_loop(use_uvloop, debug, slow_callback_duration,
+                                                             eager_tasks)) as runner:
+        return runner.run(_main())
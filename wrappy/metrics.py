@@ -0,0 +1,370 @@
+import time
+import contextvars
+import aiohttp
+
+
+class Histogram(object):
+    """
+    HDRヒストグラム風の対数-線形バケットで時間(秒)を記録します
+    マイクロ秒の整数にして, 2**precision_bits までは1us刻み, それより上は相対誤差 2**-(precision_bits-1) 以内のバケットに入れます
+    バケットはdictなので使った分だけメモリを使います
+    """
+    __slots__ = ("precision_bits", "_half", "_full", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, precision_bits: int = 7):
+        self.precision_bits = precision_bits
+        self._full = 1 << precision_bits
+        self._half = 1 << (precision_bits - 1)
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, us: int) -> int:
+        if us < self._full:
+            return us
+        shift = us.bit_length() - self.precision_bits
+        return self._full + (shift - 1) * self._half + ((us >> shift) - self._half)
+
+    def _value(self, index: int) -> int:
+        """
+        バケットの下限(マイクロ秒)です
+        """
+        if index < self._full:
+            return index
+        shift, sub = divmod(index - self._full, self._half)
+        return (self._half + sub) << (shift + 1)
+
+    def record(self, seconds: float):
+        us = int(seconds * 1000000)
+        if us < 0:
+            us = 0
+        index = self._index(us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        q分位点(秒)です. 記録が無ければ0です
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index) / 1000000, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min or 0.0,
+            "max": self.max or 0.0,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "p999": self.quantile(0.999),
+        }
+
+
+class MetricsRegistry(object):
+    """
+    ヒストグラムとカウンターを名前とラベルで管理します
+    snapshot()でdict, prometheus()でPrometheusのテキスト形式を返します
+    """
+    quantiles = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self, precision_bits: int = 7):
+        self.precision_bits = precision_bits
+        self.histograms = {}
+        self.counters = {}
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.precision_bits)
+        return histogram
+
+    def observe(self, name: str, seconds: float, **labels):
+        self.histogram(name, **labels).record(seconds)
+
+    def increment(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        self.histograms = {}
+        self.counters = {}
+
+    def snapshot(self) -> dict:
+        """
+        {名前: [{"labels": {...}, "count": ..., "p50": ..., ...}, ...]} です
+        """
+        snapshot = {}
+        for (name, labels), histogram in self.histograms.items():
+            snapshot.setdefault(name, []).append({"labels": dict(labels), **histogram.snapshot()})
+        for (name, labels), value in self.counters.items():
+            snapshot.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return snapshot
+
+    @staticmethod
+    def _labels(labels, **extra) -> str:
+        items = list(labels) + list(extra.items())
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+    def prometheus(self) -> str:
+        """
+        Prometheusのテキスト形式です. ヒストグラムはsummary(分位点, _sum, _count)として出します
+        """
+        lines = []
+        typed = set()
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: repr(item[0])):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} summary")
+            for q in self.quantiles:
+                lines.append(f"{name}{self._labels(labels, quantile=q)} {histogram.quantile(q)}")
+            lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        for (name, labels), value in sorted(self.counters.items(), key=lambda item: repr(item[0])):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# プロセスで共有するレジストリ
+registry = MetricsRegistry()
+
+# 実行中のリクエストの計測 BotBase._clientで設定し, aiohttpのトレースとread_jsonで使います
+_current = contextvars.ContextVar("wrappy_request_timer", default=None)
+
+
+class RequestTimer(object):
+    """
+    1回のリクエストの各段階の時刻です
+    queue: レートリミッターの待ち / build: リクエストの作成と署名 / connect: 接続(再利用なら0)
+    server: ヘッダー送信からレスポンスのヘッダーまで(ネットワーク往復を含みます) / decode: 本文の読み込みとJSONのデコード
+    """
+    __slots__ = ("registry", "exchange", "endpoint", "created", "queued", "started", "connect_start",
+                 "connected", "sent", "decoded")
+
+    def __init__(self, registry: MetricsRegistry, exchange: str):
+        self.registry = registry
+        self.exchange = exchange
+        self.endpoint = None
+        self.created = time.perf_counter()
+        self.queued = self.created
+        self.started = None
+        self.connect_start = None
+        self.connected = None
+        self.sent = None
+        self.decoded = False
+
+    def _observe(self, phase: str, seconds: float):
+        self.registry.observe("wrappy_request_seconds", seconds, exchange=self.exchange, endpoint=self.endpoint,
+                              phase=phase)
+
+    def finish(self, now: float):
+        connect_start = self.connect_start or self.connected or now
+        connected = self.connected or connect_start
+        sent = self.sent or connected
+        self._observe("queue", self.queued - self.created)
+        self._observe("build", connect_start - self.queued)
+        self._observe("connect", connected - connect_start)
+        self._observe("server", now - sent)
+        self._observe("total", now - self.created)
+
+
+def start_request(registry: MetricsRegistry, exchange: str) -> RequestTimer:
+    timer = RequestTimer(registry, exchange)
+    _current.set(timer)
+    return timer
+
+
+def clear_request():
+    _current.set(None)
+
+
+def record_decode(seconds: float):
+    """
+    read_jsonから呼ばれます. 1回のリクエストで1度だけ記録します
+    """
+    timer = _current.get()
+    if timer is not None and timer.endpoint is not None and not timer.decoded:
+        timer.decoded = True
+        timer._observe("decode", seconds)
+
+
+async def _on_request_start(session, ctx, params):
+    timer = _current.get()
+    if timer is not None:
+        timer.endpoint = params.url.path
+        timer.started = time.perf_counter()
+
+
+async def _on_connection_create_start(session, ctx, params):
+    timer = _current.get()
+    if timer is not None:
+        timer.connect_start = time.perf_counter()
+
+
+async def _on_connection_create_end(session, ctx, params):
+    timer = _current.get()
+    if timer is not None:
+        timer.connected = time.perf_counter()
+
+
+async def _on_connection_reuseconn(session, ctx, params):
+    timer = _current.get()
+    if timer is not None:
+        timer.connect_start = timer.connected = time.perf_counter()
+
+
+async def _on_request_headers_sent(session, ctx, params):
+    timer = _current.get()
+    if timer is not None:
+        timer.sent = time.perf_counter()
+
+
+async def _on_request_end(session, ctx, params):
+    timer = _current.get()
+    if timer is not None:
+        timer.finish(time.perf_counter())
+        timer.registry.increment("wrappy_requests_total", exchange=timer.exchange, endpoint=timer.endpoint,
+                                 status=params.response.status)
+
+
+async def _on_request_exception(session, ctx, params):
+    timer = _current.get()
+    if timer is not None:
+        timer.registry.increment("wrappy_request_errors_total", exchange=timer.exchange, endpoint=timer.endpoint,
+                                 error=type(params.exception).__name__)
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """
+    リクエストの各段階を計測するaiohttpのTraceConfigです. ClientSessionのtrace_configsに渡します
+    """
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_on_request_start)
+    config.on_connection_create_start.append(_on_connection_create_start)
+    config.on_connection_create_end.append(_on_connection_create_end)
+    config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    config.on_request_headers_sent.append(_on_request_headers_sent)
+    config.on_request_end.append(_on_request_end)
+    config.on_request_exception.append(_on_request_exception)
+    return config
+
+
+class OrderLatency(object):
+    """
+    発注からack(取引所が注文を受け付けたイベント)と約定までの時間を, privateのwebsocketと突き合わせて記録します
+    発注時に sent(order_id, 送信時刻) を呼び, websocketのメッセージを onmessage に渡します
+    RESTのレスポンスより先にwebsocketのイベントが届いた場合も, 後から突き合わせます
+    約定しないままキャンセルされた注文や, 発注していない注文のイベントはttl秒で捨てます
+    """
+    def __init__(self, registry: MetricsRegistry, exchange: str, max_pending: int = 10000, ttl: float = 300.0):
+        """
+        :param ttl: 突き合わせを待つ秒数
+        """
+        self.registry = registry
+        self.exchange = exchange
+        self.max_pending = max_pending
+        self.ttl = ttl
+        # {注文ID: [送信時刻, ack済み, 約定済み]} {注文ID: {"ack" or "fill": 受信時刻}} どちらも古い順です
+        self._sent = {}
+        self._early = {}
+
+    def _expire(self, now: float):
+        limit = now - self.ttl
+        sent = self._sent
+        while sent:
+            order_id = next(iter(sent))
+            if sent[order_id][0] > limit:
+                break
+            del sent[order_id]
+        early = self._early
+        while early:
+            order_id = next(iter(early))
+            if next(iter(early[order_id].values())) > limit:
+                break
+            del early[order_id]
+
+    def sent(self, order_id, sent_at: float):
+        """
+        :param sent_at: 発注直前の time.perf_counter()
+        """
+        order_id = str(order_id)
+        self._expire(time.perf_counter())
+        if len(self._sent) > self.max_pending:
+            self._sent.clear()
+        self._sent[order_id] = [sent_at, False, False]
+        early = self._early.pop(order_id, None)
+        if early is not None:
+            for kind, at in early.items():
+                self._event(order_id, kind, at)
+
+    def _event(self, order_id: str, kind: str, at: float):
+        state = self._sent.get(order_id)
+        if state is None:
+            self._expire(at)
+            if len(self._early) > self.max_pending:
+                self._early.clear()
+            self._early.setdefault(order_id, {}).setdefault(kind, at)
+            return
+        done = 1 if kind == "ack" else 2
+        if state[done]:
+            return
+        state[done] = True
+        self.registry.observe("wrappy_order_latency_seconds", at - state[0], exchange=self.exchange, kind=kind)
+        if state[2]:
+            del self._sent[order_id]
+
+    def ack(self, order_id):
+        self._event(str(order_id), "ack", time.perf_counter())
+
+    def fill(self, order_id):
+        """
+        最初の約定です
+        """
+        self._event(str(order_id), "fill", time.perf_counter())
+
+    def onmessage(self, msg, ws=None):
+        """
+        privateのwebsocketのメッセージを読みます. GMO(orderEvents, executionEvents) と bitflyer(child_order_events) に対応します
+        """
+        if not isinstance(msg, dict):
+            return
+        channel = msg.get("channel")
+        if channel == "orderEvents":
+            if msg.get("orderStatus") in ("ORDERED", "WAITING"):
+                self.ack(msg["orderId"])
+        elif channel == "executionEvents":
+            self.fill(msg["orderId"])
+        else:
+            params = msg.get("params")
+            if isinstance(params, dict) and params.get("channel") == "child_order_events":
+                for event in params.get("message", []):
+                    if event.get("event_type") == "ORDER":
+                        self.ack(event["child_order_acceptance_id"])
+                    elif event.get("event_type") == "EXECUTION":
+                        self.fill(event["child_order_acceptance_id"])
@@ -0,0 +1,1153 @@
+"""
+GMOコイン, bitbank, bitflyer, CoinCheck のREST/WebSocket APIのローカルのモックサーバーです
+本番に繋がずに発注系の動作確認や負荷試験ができます. マッチングエンジン, 遅延, エラー, レートリミットを再現します
+
+async with MockExchangeServer(latency=0.005) as server:
+    config = {**json.load(open("config.json")), **server.config()}
+    gmo = GMO(config, "BTC_JPY")
+    await gmo.limit_order("BUY", "0.01", 9990000)
+    server.set_price("gmo", "BTC_JPY", 9990000)   # 価格を動かすと指値が約定します
+
+コマンドラインからも起動できます
+python -m wrappy.mockserver --port 8080 --latency 0.01 --tick-interval 1
+"""
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import itertools
+from collections import deque
+from decimal import Decimal, ROUND_FLOOR
+from datetime import datetime, timezone
+from aiohttp import web, WSMsgType
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _d(value) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _s(value) -> str:
+    if value is None:
+        return "0"
+    return format(_d(value).normalize(), "f")
+
+
+class MockError(Exception):
+    """
+    注文が受け付けられないときのエラーです. 各取引所の形式のエラーに変換して返します
+    """
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class MockMarket(object):
+    """
+    1つの通貨ペアの気配です. 板の厚みは無限として, 成行はbid/askで全量約定します
+    """
+    def __init__(self, symbol: str, price, tick="1", spread=None, volatility: float = 0.0):
+        self.symbol = symbol
+        self.tick = _d(tick)
+        self.spread = _d(spread) if spread is not None else self.tick
+        self.volatility = volatility
+        self.bid = self.ask = None
+        self.set_price(price)
+
+    def set_price(self, price):
+        self.bid = (_d(price) / self.tick).quantize(Decimal(1), rounding=ROUND_FLOOR) * self.tick
+        self.ask = self.bid + self.spread
+
+    @property
+    def mid(self) -> Decimal:
+        return (self.bid + self.ask) / 2
+
+
+class MatchingEngine(object):
+    """
+    1つの取引所の注文, 建玉, 約定, 残高を管理します
+    settleは OPEN(新規) / CLOSE(決済) / NET(反対の建玉と相殺して残りを新規 bitflyerのFX) / SPOT(現物) です
+    約定などのイベントは listeners に (kind, data) で通知します kindは order / execution / trade / book です
+    """
+    def __init__(self, markets: dict, balances: dict = None):
+        self.markets = markets
+        self.balances = {k: _d(v) for k, v in (balances or {}).items()}
+        self.orders = {}
+        self.positions = {}
+        self.executions = []
+        self.listeners = []
+        self._order_ids = itertools.count(1)
+        self._execution_ids = itertools.count(1)
+        self._position_ids = itertools.count(1)
+
+    def _emit(self, kind: str, data: dict):
+        for listener in self.listeners:
+            listener(kind, data)
+
+    def market(self, symbol: str) -> MockMarket:
+        market = self.markets.get(symbol)
+        if market is None:
+            raise MockError("unknown_symbol", f"unknown symbol {symbol}")
+        return market
+
+    def active_orders(self, symbol: str = None) -> list:
+        return [o for o in self.orders.values() if o["status"] in ("ORDERED", "WAITING")
+                and (symbol is None or o["symbol"] == symbol)]
+
+    def open_positions(self, symbol: str = None) -> list:
+        return [p for p in self.positions.values() if symbol is None or p["symbol"] == symbol]
+
+    def closable(self, symbol: str, side: str, position_id=None) -> Decimal:
+        held = "SELL" if side == "BUY" else "BUY"
+        return sum((p["size"] for p in self.open_positions(symbol)
+                    if p["side"] == held and (position_id is None or p["position_id"] == position_id)), Decimal(0))
+
+    def submit(self, symbol: str, side: str, order_type: str, size, price=None, settle: str = "OPEN",
+               time_in_force: str = None, post_only: bool = False, position_id=None, order_id=None) -> dict:
+        """
+        注文を受け付けて, 約定できる分はすぐ約定させます
+        :param order_type: MARKET LIMIT STOP
+        """
+        market = self.market(symbol)
+        size = _d(size)
+        if size <= 0:
+            raise MockError("invalid_size", f"invalid size {size}")
+        if order_type in ("LIMIT", "STOP") and (price is None or _d(price) <= 0):
+            raise MockError("invalid_price", f"invalid price {price}")
+        if settle == "CLOSE" and self.closable(symbol, side, position_id) < size:
+            raise MockError("no_position", "insufficient position to close")
+        order = {
+            "order_id": order_id if order_id is not None else next(self._order_ids),
+            "symbol": symbol,
+            "side": side,
+            "type": order_type,
+            "price": None if price is None else _d(price),
+            "size": size,
+            "executed": Decimal(0),
+            "average_price": Decimal(0),
+            "status": "WAITING" if order_type == "STOP" else "ORDERED",
+            "settle": settle,
+            "time_in_force": time_in_force,
+            "post_only": post_only,
+            "position_id": position_id,
+            "timestamp": _now_iso(),
+            "ordered_at": _now_ms(),
+        }
+        self.orders[order["order_id"]] = order
+        crossing = self._crossing(order, market)
+        if order_type == "LIMIT" and crossing and (post_only or time_in_force == "SOK"):
+            order["status"] = "CANCELED"
+            self._emit("order", order)
+            return order
+        self._emit("order", order)
+        if crossing:
+            self._fill(order, market.ask if side == "BUY" else market.bid, taker=True)
+        elif order_type == "MARKET":
+            self._fill(order, market.ask if side == "BUY" else market.bid, taker=True)
+        elif time_in_force in ("FAK", "FOK", "IOC"):
+            order["status"] = "EXPIRED"
+            self._emit("order", order)
+        return order
+
+    @staticmethod
+    def _crossing(order: dict, market: MockMarket) -> bool:
+        if order["type"] == "MARKET":
+            return True
+        if order["type"] == "LIMIT":
+            return order["price"] >= market.ask if order["side"] == "BUY" else order["price"] <= market.bid
+        # STOP: 逆指値は価格が逆指値に届いたら成行になります
+        return market.ask >= order["price"] if order["side"] == "BUY" else market.bid <= order["price"]
+
+    def cancel(self, order_id) -> dict:
+        order = self.orders.get(order_id)
+        if order is None or order["status"] not in ("ORDERED", "WAITING"):
+            raise MockError("not_found", f"order {order_id} is not active")
+        order["status"] = "CANCELED"
+        self._emit("order", order)
+        return order
+
+    def change(self, order_id, price) -> dict:
+        order = self.orders.get(order_id)
+        if order is None or order["status"] not in ("ORDERED", "WAITING"):
+            raise MockError("not_found", f"order {order_id} is not active")
+        order["price"] = _d(price)
+        self._emit("order", order)
+        market = self.markets[order["symbol"]]
+        if self._crossing(order, market):
+            self._fill(order, market.ask if order["side"] == "BUY" else market.bid, taker=True)
+        return order
+
+    def set_price(self, symbol: str, price):
+        """
+        気配を動かして, 価格に届いた指値と逆指値を約定させます
+        """
+        market = self.market(symbol)
+        market.set_price(price)
+        self._emit("book", {"market": market})
+        for order in self.active_orders(symbol):
+            if self._crossing(order, market):
+                if order["type"] == "LIMIT":
+                    # 板に残っていた指値はその価格でmakerとして約定します
+                    self._fill(order, order["price"], taker=False)
+                else:
+                    self._fill(order, market.ask if order["side"] == "BUY" else market.bid, taker=True)
+
+    def step(self):
+        """
+        volatilityを設定した通貨ペアの価格をランダムウォークさせます
+        """
+        for symbol, market in self.markets.items():
+            if market.volatility:
+                self.set_price(symbol, market.mid * _d(math.exp(random.gauss(0.0, market.volatility))))
+
+    def _fill(self, order: dict, price: Decimal, taker: bool, size: Decimal = None):
+        """
+        :param size: 約定させる数量 指定なしは残り全部です
+        """
+        remaining = order["size"] - order["executed"]
+        size = remaining if size is None else min(size, remaining)
+        if order["settle"] == "CLOSE":
+            size = min(size, self.closable(order["symbol"], order["side"], order["position_id"]))
+        if size <= 0:
+            order["status"] = "CANCELED"
+            self._emit("order", order)
+            return
+        position_id = self._apply(order, price, size)
+        order["average_price"] = (order["average_price"] * order["executed"] + price * size) / (order["executed"] + size)
+        order["executed"] += size
+        order["status"] = "EXECUTED" if order["executed"] >= order["size"] else "ORDERED"
+        execution = {
+            "execution_id": next(self._execution_ids),
+            "order_id": order["order_id"],
+            "symbol": order["symbol"],
+            "side": order["side"],
+            "price": price,
+            "size": size,
+            "settle": order["settle"],
+            "position_id": position_id,
+            "taker": taker,
+            "order": order,
+            "timestamp": _now_iso(),
+            "executed_at": _now_ms(),
+        }
+        self.executions.append(execution)
+        self._emit("execution", execution)
+        self._emit("trade", execution)
+        self._emit("order", order)
+
+    def _apply(self, order: dict, price: Decimal, size: Decimal):
+        symbol, side, settle = order["symbol"], order["side"], order["settle"]
+        if settle == "SPOT":
+            base, _, quote = symbol.partition("_")
+            base, quote = base.upper(), (quote or "JPY").upper()
+            sign = 1 if side == "BUY" else -1
+            self.balances[base] = self.balances.get(base, Decimal(0)) + sign * size
+            self.balances[quote] = self.balances.get(quote, Decimal(0)) - sign * size * price
+            return None
+        remaining = size
+        position_id = None
+        if settle in ("CLOSE", "NET"):
+            held = "SELL" if side == "BUY" else "BUY"
+            for position in self.open_positions(symbol):
+                if remaining <= 0:
+                    break
+                if position["side"] != held:
+                    continue
+                if order["position_id"] is not None and position["position_id"] != order["position_id"]:
+                    continue
+                closed = min(remaining, position["size"])
+                position["size"] -= closed
+                remaining -= closed
+                position_id = position["position_id"]
+                if position["size"] <= 0:
+                    del self.positions[position["position_id"]]
+        if remaining > 0 and settle in ("OPEN", "NET"):
+            position_id = next(self._position_ids)
+            self.positions[position_id] = {"position_id": position_id, "symbol": symbol, "side": side,
+                                           "size": remaining, "price": price, "timestamp": _now_iso()}
+        return position_id
+
+
+class _WSClient(object):
+    """
+    websocketの送信を順番どおりに行うためのキューです
+    """
+    def __init__(self, ws: web.WebSocketResponse):
+        self.ws = ws
+        self.channels = set()
+        self.queue = asyncio.Queue()
+        self.task = asyncio.ensure_future(self._pump())
+
+    def send(self, data):
+        self.queue.put_nowait(data)
+
+    async def _pump(self):
+        while True:
+            data = await self.queue.get()
+            if self.ws.closed:
+                return
+            await self.ws.send_str(json.dumps(data))
+
+
+class MockExchangeServer(object):
+    """
+    aiohttpのモックサーバーです. 1つのポートでGMOコイン, bitbank, bitflyer, CoinCheckのAPIを返します
+    config()の値をボットのコンフィグに足すと, ボットのリクエストがこのサーバーに向きます
+    """
+    default_markets = {
+        "gmo": [("BTC_JPY", 10000000, "1"), ("ETH_JPY", 500000, "1"), ("XRP_JPY", 80, "0.001"),
+                ("BTC", 10000000, "1"), ("ETH", 500000, "1")],
+        "bitbank": [("btc_jpy", 10000000, "1"), ("eth_jpy", 500000, "1"), ("xrp_jpy", 80, "0.001")],
+        "bitflyer": [("FX_BTC_JPY", 10000000, "1"), ("BTC_JPY", 10000000, "1"), ("ETH_JPY", 500000, "1")],
+        "coincheck": [("btc_jpy", 10000000, "1")],
+    }
+    default_balances = {"JPY": 100000000, "BTC": 10, "ETH": 100, "XRP": 100000}
+    engine_class = MatchingEngine
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_limits: dict = None, markets: dict = None, volatility: float = 0.0,
+                 tick_interval: float = None, seed: int = None):
+        """
+        :param port: 0なら空いているポートを使います
+        :param latency: レスポンスを返すまでの遅延(秒)
+        :param jitter: 遅延に足す 0〜jitter秒のランダムな揺らぎ
+        :param error_rate: この確率で500エラーを返します
+        :param rate_limits: 取引所ごとのレートリミット {"gmo": (20, 1.0)} 1.0秒に20回を超えると429を返します
+        :param markets: 取引所ごとの通貨ペア {"gmo": [(symbol, price, tick), ...]} 指定なしはdefault_markets
+        :param volatility: tick_intervalごとの価格のランダムウォークの標準偏差(対数)
+        :param tick_interval: この秒数ごとに価格を動かします 指定なしは動かしません(set_priceで動かします)
+        :param seed: 乱数のシード
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limits = rate_limits or {}
+        self.tick_interval = tick_interval
+        self.random = random.Random(seed)
+        if seed is not None:
+            random.seed(seed)
+        self.engines = {}
+        for venue, symbols in (markets or self.default_markets).items():
+            engine = self.engine_class({symbol: MockMarket(symbol, price, tick, volatility=volatility)
+                                         for symbol, price, tick in symbols}, self.default_balances)
+            engine.listeners.append(self._listener(venue))
+            self.engines[venue] = engine
+        self.requests = {venue: 0 for venue in self.engines}
+        self._failures = deque()
+        self._windows = {venue: deque() for venue in self.rate_limits}
+        self._ws_clients = {venue: [] for venue in self.engines}
+        self._tokens = set()
+        self._bitflyer_acceptance_ids = {}
+        self._runner = None
+        self._ticker = None
+        self.app = web.Application(middlewares=[self._middleware])
+        self._add_routes()
+
+    # サーバー
+    async def start(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        if self.tick_interval:
+            self._ticker = asyncio.ensure_future(self._tick())
+        return self
+
+    async def close(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+        for clients in self._ws_clients.values():
+            for client in clients:
+                client.task.cancel()
+                await client.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            for engine in self.engines.values():
+                engine.step()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def config(self) -> dict:
+        """
+        ボットのコンフィグに足す値です
+        """
+        ws = f"ws://{self.host}:{self.port}"
+        return {
+            "base_urls": {"gmo": self.url, "bitbank": f"{self.url}/v1", "bitflyer": self.url, "coincheck": self.url},
+            "ws_urls": {"gmo": f"{ws}/ws", "bitflyer": f"{ws}/json-rpc"},
+        }
+
+    def set_price(self, venue: str, symbol: str, price):
+        self.engines[venue].set_price(symbol, price)
+
+    def fail_next(self, count: int = 1, status: int = 500, venue: str = None):
+        """
+        次のcount回のリクエストをstatusで失敗させます
+        """
+        for _ in range(count):
+            self._failures.append((venue, status))
+
+    # 遅延, エラー, レートリミット
+    @staticmethod
+    def _venue(path: str) -> str:
+        if path.startswith(("/private/", "/public/", "/ws/")):
+            return "gmo"
+        if path.startswith(("/v1/user/", "/v1/spot/")):
+            return "bitbank"
+        if path.startswith(("/v1/", "/json-rpc")):
+            return "bitflyer"
+        return "coincheck"
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        venue = self._venue(request.path)
+        if request.headers.get("Upgrade", "").lower() == "websocket":
+            return await handler(request)
+        self.requests[venue] = self.requests.get(venue, 0) + 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+        if venue in self.rate_limits:
+            limit, per = self.rate_limits[venue]
+            window = self._windows[venue]
+            now = time.monotonic()
+            while window and now - window[0] > per:
+                window.popleft()
+            if len(window) >= limit:
+                return web.json_response({"message": "Too Many Requests"}, status=429)
+            window.append(now)
+        if self._failures and self._failures[0][0] in (None, venue):
+            _, status = self._failures.popleft()
+            return web.json_response({"message": "injected error"}, status=status)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return web.json_response({"message": "injected error"}, status=500)
+        return await handler(request)
+
+    @staticmethod
+    async def _body(request) -> dict:
+        if not request.can_read_body:
+            return {}
+        text = await request.text()
+        if not text:
+            return {}
+        try:
+            return json.loads(text)
+        except ValueError:
+            return dict((await request.post()).items())
+
+    def _add_routes(self):
+        r = self.app.router
+        # GMOコイン
+        r.add_post("/private/v1/order", self._gmo_order)
+        r.add_post("/private/v1/closeOrder", self._gmo_close_order)
+        r.add_post("/private/v1/closeBulkOrder", self._gmo_close_bulk_order)
+        r.add_post("/private/v1/changeOrder", self._gmo_change_order)
+        r.add_post("/private/v1/cancelOrder", self._gmo_cancel_order)
+        r.add_post("/private/v1/cancelOrders", self._gmo_cancel_orders)
+        r.add_post("/private/v1/cancelBulkOrder", self._gmo_cancel_bulk_order)
+        r.add_get("/private/v1/activeOrders", self._gmo_active_orders)
+        r.add_get("/private/v1/orders", self._gmo_orders)
+        r.add_get("/private/v1/executions", self._gmo_executions)
+        r.add_get("/private/v1/latestExecutions", self._gmo_latest_executions)
+        r.add_get("/private/v1/openPositions", self._gmo_open_positions)
+        r.add_get("/private/v1/positionSummary", self._gmo_position_summary)
+        r.add_get("/private/v1/account/margin", self._gmo_margin)
+        r.add_get("/private/v1/account/assets", self._gmo_assets)
+        r.add_post("/private/v1/ws-auth", self._gmo_ws_auth)
+        r.add_put("/private/v1/ws-auth", self._gmo_ws_auth)
+        r.add_get("/public/v1/status", self._gmo_status)
+        r.add_get("/public/v1/ticker", self._gmo_ticker)
+        r.add_get("/public/v1/orderbooks", self._gmo_orderbooks)
+        r.add_get("/public/v1/klines", self._gmo_klines)
+        r.add_get("/public/v1/symbols", self._gmo_symbols)
+        r.add_get("/ws/public/v1", self._gmo_public_ws)
+        r.add_get("/ws/private/v1/{token}", self._gmo_private_ws)
+        # bitbank
+        r.add_post("/v1/user/spot/order", self._bitbank_order)
+        r.add_post("/v1/user/spot/cancel_order", self._bitbank_cancel_order)
+        r.add_post("/v1/user/spot/cancel_orders", self._bitbank_cancel_orders)
+        r.add_get("/v1/user/spot/active_orders", self._bitbank_active_orders)
+        r.add_get("/v1/user/spot/order", self._bitbank_order_info)
+        r.add_post("/v1/user/spot/orders_info", self._bitbank_orders_info)
+        r.add_get("/v1/user/spot/trade_history", self._bitbank_trade_history)
+        r.add_get("/v1/user/assets", self._bitbank_assets)
+        r.add_get("/v1/user/margin/positions", self._bitbank_positions)
+        r.add_get("/v1/spot/status", self._bitbank_status)
+        r.add_get("/v1/spot/pairs", self._bitbank_pairs)
+        # bitflyer
+        r.add_post("/v1/me/sendchildorder", self._bitflyer_order)
+        r.add_post("/v1/me/cancelchildorder", self._bitflyer_cancel_order)
+        r.add_post("/v1/me/cancelallchildorders", self._bitflyer_cancel_all_orders)
+        r.add_get("/v1/me/getpositions", self._bitflyer_positions)
+        r.add_get("/v1/me/getchildorders", self._bitflyer_orders)
+        r.add_get("/v1/me/getexecutions", self._bitflyer_executions)
+        r.add_get("/v1/me/getbalance", self._bitflyer_balance)
+        r.add_get("/v1/markets", self._bitflyer_markets)
+        r.add_get("/v1/getboard", self._bitflyer_board)
+        r.add_get("/json-rpc", self._bitflyer_ws)
+        # CoinCheck
+        r.add_get("/api/ticker", self._coincheck_ticker)
+
+    # websocketへの配信
+    def _listener(self, venue: str):
+        def listener(kind: str, data: dict):
+            for client in list(self._ws_clients[venue]):
+                if client.ws.closed:
+                    self._ws_clients[venue].remove(client)
+                    continue
+                for message in getattr(self, f"_{venue}_ws_messages")(kind, data, client.channels):
+                    client.send(message)
+        return listener
+
+    def _coincheck_ws_messages(self, kind, data, channels):
+        return []
+
+    def _bitbank_ws_messages(self, kind, data, channels):
+        return []
+
+    # GMOコイン
+    @staticmethod
+    def _gmo_ok(data=None):
+        body = {"status": 0, "responsetime": _now_iso()}
+        if data is not None:
+            body["data"] = data
+        return web.json_response(body)
+
+    @staticmethod
+    def _gmo_error(code: str, message: str):
+        return web.json_response({"status": 1, "messages": [{"message_code": code, "message_string": message}],
+                                  "responsetime": _now_iso()})
+
+    _GMO_ERRORS = {"not_found": "ERR-5122", "no_position": "ERR-422", "invalid_size": "ERR-5106",
+                   "invalid_price": "ERR-5106", "unknown_symbol": "ERR-5106"}
+
+    def _gmo_mock_error(self, e: MockError):
+        return self._gmo_error(self._GMO_ERRORS.get(e.code, "ERR-5003"), e.message)
+
+    @staticmethod
+    def _gmo_order_json(o: dict) -> dict:
+        return {
+            "rootOrderId": o["order_id"], "orderId": o["order_id"], "symbol": o["symbol"], "side": o["side"],
+            "orderType": "NORMAL", "executionType": o["type"],
+            "settleType": "CLOSE" if o["settle"] == "CLOSE" else "OPEN",
+            "size": _s(o["size"]), "executedSize": _s(o["executed"]), "price": _s(o["price"]),
+            "losscutPrice": "0", "status": o["status"], "timeInForce": o["time_in_force"] or "FAS",
+            "timestamp": o["timestamp"],
+        }
+
+    @staticmethod
+    def _gmo_execution_json(e: dict) -> dict:
+        return {
+            "executionId": e["execution_id"], "orderId": e["order_id"], "positionId": e["position_id"] or 0,
+            "symbol": e["symbol"], "side": e["side"], "settleType": "CLOSE" if e["settle"] == "CLOSE" else "OPEN",
+            "size": _s(e["size"]), "price": _s(e["price"]), "lossGain": "0", "fee": "0", "timestamp": e["timestamp"],
+        }
+
+    async def _gmo_submit(self, request, settle=None, position_id=None, size=None):
+        body = await self._body(request)
+        symbol = body.get("symbol")
+        if settle is None:
+            settle = "OPEN" if "_" in (symbol or "") else "SPOT"
+        try:
+            order = self.engines["gmo"].submit(symbol, body.get("side"), body.get("executionType"),
+                                               size if size is not None else body.get("size"), body.get("price"),
+                                               settle=settle, time_in_force=body.get("timeInForce"),
+                                               position_id=position_id)
+        except MockError as e:
+            return self._gmo_mock_error(e)
+        return self._gmo_ok(str(order["order_id"]))
+
+    async def _gmo_order(self, request):
+        return await self._gmo_submit(request)
+
+    async def _gmo_close_order(self, request):
+        body = await self._body(request)
+        settle_position = (body.get("settlePosition") or [{}])[0]
+        try:
+            position_id = int(settle_position.get("positionId"))
+        except (TypeError, ValueError):
+            return self._gmo_error("ERR-5106", "invalid positionId")
+        try:
+            order = self.engines["gmo"].submit(body.get("symbol"), body.get("side"), body.get("executionType"),
+                                               settle_position.get("size"), body.get("price"), settle="CLOSE",
+                                               time_in_force=body.get("timeInForce"), position_id=position_id)
+        except MockError as e:
+            return self._gmo_mock_error(e)
+        return self._gmo_ok(str(order["order_id"]))
+
+    async def _gmo_close_bulk_order(self, request):
+        return await self._gmo_submit(request, settle="CLOSE")
+
+    async def _gmo_change_order(self, request):
+        body = await self._body(request)
+        try:
+            self.engines["gmo"].change(int(body.get("orderId")), body.get("price"))
+        except MockError as e:
+            return self._gmo_mock_error(e)
+        return self._gmo_ok()
+
+    async def _gmo_cancel_order(self, request):
+        body = await self._body(request)
+        try:
+            self.engines["gmo"].cancel(int(body.get("orderId")))
+        except MockError as e:
+            return self._gmo_mock_error(e)
+        return self._gmo_ok()
+
+    async def _gmo_cancel_orders(self, request):
+        body = await self._body(request)
+        success, failed = [], []
+        for order_id in body.get("orderIds") or []:
+            try:
+                self.engines["gmo"].cancel(int(order_id))
+                success.append(int(order_id))
+            except MockError as e:
+                failed.append({"message_code": "ERR-5122", "message_string": e.message, "orderId": int(order_id)})
+        return self._gmo_ok({"failed": failed, "success": success})
+
+    async def _gmo_cancel_bulk_order(self, request):
+        body = await self._body(request)
+        symbols = body.get("symbols") or []
+        orders = [o for o in self.engines["gmo"].active_orders()
+                  if o["symbol"] in symbols
+                  and body.get("side") in (None, o["side"])
+                  and body.get("settleType") in (None, "CLOSE" if o["settle"] == "CLOSE" else "OPEN")]
+        orders.sort(key=lambda o: o["order_id"], reverse=bool(body.get("desc")))
+        canceled = []
+        for order in orders[:10]:
+            self.engines["gmo"].cancel(order["order_id"])
+            canceled.append(order["order_id"])
+        return self._gmo_ok(canceled)
+
+    @staticmethod
+    def _page(items: list, query) -> tuple:
+        page = int(query.get("page", 1))
+        count = int(query.get("count", 100))
+        return items[(page - 1) * count:page * count], {"currentPage": page, "count": count}
+
+    async def _gmo_active_orders(self, request):
+        orders = self.engines["gmo"].active_orders(request.query.get("symbol"))
+        items, pagination = self._page(orders, request.query)
+        if not items:
+            return self._gmo_ok({})
+        return self._gmo_ok({"pagination": pagination, "list": [self._gmo_order_json(o) for o in items]})
+
+    @staticmethod
+    def _ids(value) -> list:
+        return [int("".join(c for c in part if c.isdigit())) for part in str(value or "").split(",")
+                if any(c.isdigit() for c in part)]
+
+    async def _gmo_orders(self, request):
+        orders = self.engines["gmo"].orders
+        return self._gmo_ok({"list": [self._gmo_order_json(orders[i]) for i in self._ids(request.query.get("orderId"))
+                                      if i in orders]})
+
+    async def _gmo_executions(self, request):
+        if "orderId" in request.query:
+            ids, key = self._ids(request.query["orderId"]), "order_id"
+        else:
+            ids, key = self._ids(request.query.get("executionId")), "execution_id"
+        return self._gmo_ok({"list": [self._gmo_execution_json(e) for e in self.engines["gmo"].executions
+                                      if e[key] in ids]})
+
+    async def _gmo_latest_executions(self, request):
+        executions = [e for e in reversed(self.engines["gmo"].executions) if e["symbol"] == request.query.get("symbol")]
+        items, pagination = self._page(executions, request.query)
+        return self._gmo_ok({"pagination": pagination, "list": [self._gmo_execution_json(e) for e in items]})
+
+    async def _gmo_open_positions(self, request):
+        positions = self.engines["gmo"].open_positions(request.query.get("symbol"))
+        items, pagination = self._page(positions, request.query)
+        return self._gmo_ok({"pagination": pagination, "list": [
+            {"positionId": p["position_id"], "symbol": p["symbol"], "side": p["side"], "size": _s(p["size"]),
+             "orderdSize": "0", "price": _s(p["price"]), "lossGain": "0", "leverage": "2", "losscutPrice": "0",
+             "timestamp": p["timestamp"]} for p in items]})
+
+    async def _gmo_position_summary(self, request):
+        summary = {}
+        for p in self.engines["gmo"].open_positions(request.query.get("symbol")):
+            s = summary.setdefault((p["symbol"], p["side"]), [Decimal(0), Decimal(0)])
+            s[0] += p["size"]
+            s[1] += p["size"] * p["price"]
+        return self._gmo_ok({"list": [
+            {"averagePositionRate": _s(notional / size), "positionLossGain": "0", "side": side,
+             "sumOrderQuantity": "0", "sumPositionQuantity": _s(size), "symbol": symbol}
+            for (symbol, side), (size, notional) in summary.items()]})
+
+    async def _gmo_margin(self, request):
+        jpy = _s(self.engines["gmo"].balances.get("JPY", 0))
+        return self._gmo_ok({"actualProfitLoss": jpy, "availableAmount": jpy, "margin": "0",
+                             "marginCallStatus": "NORMAL", "marginRatio": "0", "profitLoss": "0"})
+
+    async def _gmo_assets(self, request):
+        engine = self.engines["gmo"]
+        return self._gmo_ok([{"amount": _s(amount), "available": _s(amount),
+                              "conversionRate": _s(engine.markets[a].bid) if a in engine.markets else "1", "symbol": a}
+                             for a, amount in engine.balances.items()])
+
+    async def _gmo_ws_auth(self, request):
+        if request.method == "PUT":
+            return self._gmo_ok()
+        token = f"mock-{len(self._tokens) + 1}"
+        self._tokens.add(token)
+        return self._gmo_ok(token)
+
+    async def _gmo_status(self, request):
+        return self._gmo_ok({"status": "OPEN"})
+
+    def _gmo_ticker_json(self, market: MockMarket) -> dict:
+        return {"ask": _s(market.ask), "bid": _s(market.bid), "high": _s(market.ask), "last": _s(market.bid),
+                "low": _s(market.bid), "symbol": market.symbol, "timestamp": _now_iso(), "volume": "0"}
+
+    def _gmo_book_json(self, market: MockMarket) -> dict:
+        return {"asks": [{"price": _s(market.ask + market.tick * i), "size": "1"} for i in range(5)],
+                "bids": [{"price": _s(market.bid - market.tick * i), "size": "1"} for i in range(5)],
+                "symbol": market.symbol, "timestamp": _now_iso()}
+
+    async def _gmo_ticker(self, request):
+        markets = self.engines["gmo"].markets
+        symbol = request.query.get("symbol")
+        return self._gmo_ok([self._gmo_ticker_json(m) for s, m in markets.items() if symbol in (None, s)])
+
+    async def _gmo_orderbooks(self, request):
+        try:
+            return self._gmo_ok(self._gmo_book_json(self.engines["gmo"].market(request.query.get("symbol"))))
+        except MockError as e:
+            return self._gmo_mock_error(e)
+
+    async def _gmo_klines(self, request):
+        return self._gmo_ok([])
+
+    async def _gmo_symbols(self, request):
+        return self._gmo_ok([{"symbol": s, "minOrderSize": "0.0001", "maxOrderSize": "5", "sizeStep": "0.0001",
+                              "tickSize": _s(m.tick), "takerFee": "0.0005", "makerFee": "-0.0001"}
+                             for s, m in self.engines["gmo"].markets.items()])
+
+    def _gmo_ws_messages(self, kind, data, channels):
+        if kind == "trade":
+            if ("trades", data["symbol"]) in channels:
+                yield {"channel": "trades", "price": _s(data["price"]), "side": data["side"], "size": _s(data["size"]),
+                       "timestamp": data["timestamp"], "symbol": data["symbol"]}
+        elif kind == "book":
+            market = data["market"]
+            if ("orderbooks", market.symbol) in channels:
+                yield {"channel": "orderbooks", **self._gmo_book_json(market)}
+            if ("ticker", market.symbol) in channels:
+                yield {"channel": "ticker", **self._gmo_ticker_json(market)}
+        elif kind == "order" and ("orderEvents", None) in channels:
+            o = data
+            yield {"channel": "orderEvents", "orderId": o["order_id"], "symbol": o["symbol"],
+                   "settleType": "CLOSE" if o["settle"] == "CLOSE" else "OPEN", "executionType": o["type"],
+                   "side": o["side"], "orderStatus": o["status"], "cancelType": "USER" if o["status"] == "CANCELED" else "",
+                   "orderTimestamp": o["timestamp"], "orderPrice": _s(o["price"]), "orderSize": _s(o["size"]),
+                   "orderExecutedSize": _s(o["executed"]), "losscutPrice": "0", "timeInForce": o["time_in_force"] or "FAS",
+                   "msgType": "NOR" if o["status"] in ("ORDERED", "WAITING") else "CAR"}
+        elif kind == "execution" and ("executionEvents", None) in channels:
+            e, o = data, data["order"]
+            yield {"channel": "executionEvents", "orderId": e["order_id"], "executionId": e["execution_id"],
+                   "symbol": e["symbol"], "settleType": "CLOSE" if e["settle"] == "CLOSE" else "OPEN",
+                   "executionType": o["type"], "side": e["side"], "executionPrice": _s(e["price"]),
+                   "executionSize": _s(e["size"]), "positionId": e["position_id"] or 0,
+                   "orderTimestamp": o["timestamp"], "executionTimestamp": e["timestamp"], "lossGain": "0",
+                   "fee": "0", "orderPrice": _s(o["price"]), "orderSize": _s(o["size"]),
+                   "orderExecutedSize": _s(o["executed"]), "timeInForce": o["time_in_force"] or "FAS", "msgType": "ER"}
+
+    async def _ws_session(self, request, venue: str, on_message):
+        ws = web.WebSocketResponse(heartbeat=None)
+        await ws.prepare(request)
+        client = _WSClient(ws)
+        self._ws_clients[venue].append(client)
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    try:
+                        data = json.loads(msg.data)
+                    except ValueError:
+                        continue
+                    on_message(client, data)
+                elif msg.type in (WSMsgType.CLOSE, WSMsgType.ERROR):
+                    break
+        finally:
+            client.task.cancel()
+            if client in self._ws_clients[venue]:
+                self._ws_clients[venue].remove(client)
+        return ws
+
+    async def _gmo_public_ws(self, request):
+        def on_message(client, data):
+            key = (data.get("channel"), data.get("symbol"))
+            if data.get("command") == "subscribe":
+                client.channels.add(key)
+                market = self.engines["gmo"].markets.get(data.get("symbol"))
+                if market is not None:
+                    for message in self._gmo_ws_messages("book", {"market": market}, {key}):
+                        client.send(message)
+            elif data.get("command") == "unsubscribe":
+                client.channels.discard(key)
+        return await self._ws_session(request, "gmo", on_message)
+
+    async def _gmo_private_ws(self, request):
+        if request.match_info["token"] not in self._tokens:
+            return web.json_response({"message": "invalid token"}, status=401)
+
+        def on_message(client, data):
+            if data.get("command") == "subscribe":
+                client.channels.add((data.get("channel"), None))
+            elif data.get("command") == "unsubscribe":
+                client.channels.discard((data.get("channel"), None))
+        return await self._ws_session(request, "gmo", on_message)
+
+    # bitbank
+    @staticmethod
+    def _bitbank_ok(data):
+        return web.json_response({"success": 1, "data": data})
+
+    _BITBANK_ERRORS = {"not_found": 50010, "no_position": 50062, "invalid_size": 30012, "invalid_price": 30013,
+                       "unknown_symbol": 40014}
+
+    def _bitbank_error(self, e: MockError):
+        return web.json_response({"success": 0, "data": {"code": self._BITBANK_ERRORS.get(e.code, 10000)}})
+
+    @staticmethod
+    def _bitbank_order_json(o: dict) -> dict:
+        if o["status"] in ("ORDERED", "WAITING"):
+            status = "PARTIALLY_FILLED" if o["executed"] else "UNFILLED"
+        elif o["status"] == "EXECUTED":
+            status = "FULLY_FILLED"
+        else:
+            status = "CANCELED_PARTIALLY_FILLED" if o["executed"] else "CANCELED_UNFILLED"
+        if o["settle"] == "SPOT":
+            position_side = None
+        elif (o["settle"] == "OPEN") == (o["side"] == "BUY"):
+            position_side = "long"
+        else:
+            position_side = "short"
+        return {
+            "order_id": o["order_id"], "pair": o["symbol"], "side": o["side"].lower(), "position_side": position_side,
+            "type": o["type"].lower(), "start_amount": _s(o["size"]), "remaining_amount": _s(o["size"] - o["executed"]),
+            "executed_amount": _s(o["executed"]), "price": None if o["price"] is None else _s(o["price"]),
+            "post_only": o["post_only"], "average_price": _s(o["average_price"]), "ordered_at": o["ordered_at"],
+            "status": status,
+        }
+
+    async def _bitbank_order(self, request):
+        body = await self._body(request)
+        side = str(body.get("side", "")).upper()
+        position_side = body.get("position_side")
+        if not position_side:
+            settle = "SPOT"
+        elif (position_side == "long") == (side == "BUY"):
+            settle = "OPEN"
+        else:
+            settle = "CLOSE"
+        order_type = {"market": "MARKET", "limit": "LIMIT", "stop": "STOP", "stop_limit": "STOP"}.get(body.get("type"))
+        price = body.get("trigger_price") if order_type == "STOP" else body.get("price")
+        try:
+            order = self.engines["bitbank"].submit(body.get("pair"), side, order_type, body.get("amount"), price,
+                                                   settle=settle, post_only=bool(body.get("post_only")))
+        except MockError as e:
+            return self._bitbank_error(e)
+        return self._bitbank_ok(self._bitbank_order_json(order))
+
+    async def _bitbank_cancel_order(self, request):
+        body = await self._body(request)
+        try:
+            order = self.engines["bitbank"].cancel(int(body.get("order_id")))
+        except MockError as e:
+            return self._bitbank_error(e)
+        return self._bitbank_ok(self._bitbank_order_json(order))
+
+    async def _bitbank_cancel_orders(self, request):
+        body = await self._body(request)
+        orders = []
+        for order_id in body.get("order_ids") or []:
+            try:
+                orders.append(self._bitbank_order_json(self.engines["bitbank"].cancel(int(order_id))))
+            except MockError:
+                pass
+        return self._bitbank_ok({"orders": orders})
+
+    async def _bitbank_active_orders(self, request):
+        return self._bitbank_ok({"orders": [self._bitbank_order_json(o)
+                                            for o in self.engines["bitbank"].active_orders(request.query.get("pair"))]})
+
+    async def _bitbank_order_info(self, request):
+        order = self.engines["bitbank"].orders.get(int(request.query.get("order_id", 0)))
+        if order is None:
+            return self._bitbank_error(MockError("not_found", "order not found"))
+        return self._bitbank_ok(self._bitbank_order_json(order))
+
+    async def _bitbank_orders_info(self, request):
+        body = await self._body(request)
+        orders = self.engines["bitbank"].orders
+        return self._bitbank_ok({"orders": [self._bitbank_order_json(orders[int(i)])
+                                            for i in body.get("order_ids") or [] if int(i) in orders]})
+
+    async def _bitbank_trade_history(self, request):
+        pair = request.query.get("pair")
+        return self._bitbank_ok({"trades": [
+            {"trade_id": e["execution_id"], "pair": e["symbol"], "order_id": e["order_id"], "side": e["side"].lower(),
+             "position_side": self._bitbank_order_json(e["order"])["position_side"], "type": e["order"]["type"].lower(),
+             "amount": _s(e["size"]), "price": _s(e["price"]), "maker_taker": "taker" if e["taker"] else "maker",
+             "fee_amount_base": "0", "fee_amount_quote": "0", "executed_at": e["executed_at"]}
+            for e in self.engines["bitbank"].executions if pair in (None, e["symbol"])]})
+
+    async def _bitbank_assets(self, request):
+        balances = self.engines["bitbank"].balances
+        # 本物と同じようにjpyを先頭にします
+        assets = sorted(balances.items(), key=lambda item: item[0] != "JPY")
+        return self._bitbank_ok({"assets": [
+            {"asset": asset.lower(), "free_amount": _s(amount), "amount_precision": 4, "onhand_amount": _s(amount),
+             "locked_amount": "0", "withdrawal_fee": "0", "stop_deposit": False, "stop_withdrawal": False}
+            for asset, amount in assets]})
+
+    async def _bitbank_positions(self, request):
+        summary = {}
+        for p in self.engines["bitbank"].open_positions():
+            s = summary.setdefault((p["symbol"], "long" if p["side"] == "BUY" else "short"), [Decimal(0), Decimal(0)])
+            s[0] += p["size"]
+            s[1] += p["size"] * p["price"]
+        return self._bitbank_ok({
+            "notice": {"what": None, "occurred_at": None, "amount": None, "due_date_at": None},
+            "payables": {"amount": "0"},
+            "positions": [{"pair": pair, "position_side": side, "open_amount": _s(size), "product": _s(notional),
+                           "average_price": _s(notional / size), "unrealized_fee_amount": "0",
+                           "unrealized_interest_amount": "0"}
+                          for (pair, side), (size, notional) in summary.items()],
+            "losscut_threshold": {"individual": "0", "company": "0"},
+        })
+
+    async def _bitbank_status(self, request):
+        return self._bitbank_ok({"statuses": [{"pair": pair, "status": "NORMAL", "min_amount": "0.0001"}
+                                              for pair in self.engines["bitbank"].markets]})
+
+    async def _bitbank_pairs(self, request):
+        pairs = []
+        for pair, market in self.engines["bitbank"].markets.items():
+            base, _, quote = pair.partition("_")
+            pairs.append({"name": pair, "base_asset": base, "quote_asset": quote, "unit_amount": "0.0001",
+                          "limit_max_amount": "1000", "price_digits": max(0, -market.tick.normalize().as_tuple().exponent),
+                          "amount_digits": 4, "is_enabled": True})
+        return self._bitbank_ok({"pairs": pairs})
+
+    # bitflyer
+    def _bitflyer_acceptance_id(self, order_id: int) -> str:
+        acceptance_id = f"JRF{order_id:012d}"
+        self._bitflyer_acceptance_ids[acceptance_id] = order_id
+        return acceptance_id
+
+    def _bitflyer_order_json(self, o: dict) -> dict:
+        state = {"ORDERED": "ACTIVE", "WAITING": "ACTIVE", "EXECUTED": "COMPLETED", "CANCELED": "CANCELED",
+                 "EXPIRED": "EXPIRED"}[o["status"]]
+        remaining = o["size"] - o["executed"]
+        return {
+            "id": o["order_id"], "child_order_id": f"JOR{o['order_id']:012d}", "product_code": o["symbol"],
+            "side": o["side"], "child_order_type": o["type"], "price": float(o["price"] or 0),
+            "average_price": float(o["average_price"]), "size": float(o["size"]), "child_order_state": state,
+            "expire_date": "", "child_order_date": o["timestamp"],
+            "child_order_acceptance_id": self._bitflyer_acceptance_id(o["order_id"]),
+            "outstanding_size": float(remaining if state == "ACTIVE" else 0),
+            "cancel_size": float(remaining if state in ("CANCELED", "EXPIRED") else 0),
+            "executed_size": float(o["executed"]), "total_commission": 0, "time_in_force": o["time_in_force"] or "GTC",
+        }
+
+    async def _bitflyer_order(self, request):
+        body = await self._body(request)
+        symbol = body.get("product_code")
+        settle = "NET" if str(symbol).startswith("FX_") else "SPOT"
+        try:
+            order = self.engines["bitflyer"].submit(symbol, body.get("side"), body.get("child_order_type"),
+                                                    body.get("size"), body.get("price"), settle=settle,
+                                                    time_in_force=body.get("time_in_force"))
+        except MockError as e:
+            return web.json_response({"status": -1, "error_message": e.message}, status=400)
+        return web.json_response({"child_order_acceptance_id": self._bitflyer_acceptance_id(order["order_id"])})
+
+    async def _bitflyer_cancel_order(self, request):
+        body = await self._body(request)
+        order_id = self._bitflyer_acceptance_ids.get(body.get("child_order_acceptance_id"))
+        if order_id is None and body.get("child_order_id"):
+            order_id = int(str(body["child_order_id"])[3:])
+        try:
+            self.engines["bitflyer"].cancel(order_id)
+        except MockError:
+            pass
+        return web.Response(status=200)
+
+    async def _bitflyer_cancel_all_orders(self, request):
+        body = await self._body(request)
+        engine = self.engines["bitflyer"]
+        for order in engine.active_orders(body.get("product_code")):
+            engine.cancel(order["order_id"])
+        return web.Response(status=200)
+
+    async def _bitflyer_positions(self, request):
+        return web.json_response([
+            {"product_code": p["symbol"], "side": p["side"], "price": float(p["price"]), "size": float(p["size"]),
+             "commission": 0, "swap_point_accumulate": 0, "require_collateral": float(p["price"] * p["size"] / 2),
+             "open_date": p["timestamp"], "leverage": 2, "pnl": 0, "sfd": 0}
+            for p in self.engines["bitflyer"].open_positions(request.query.get("product_code"))])
+
+    async def _bitflyer_orders(self, request):
+        state = request.query.get("child_order_state")
+        orders = [self._bitflyer_order_json(o) for o in self.engines["bitflyer"].orders.values()
+                  if o["symbol"] == request.query.get("product_code")]
+        return web.json_response([o for o in reversed(orders) if state in (None, o["child_order_state"])])
+
+    async def _bitflyer_executions(self, request):
+        return web.json_response([
+            {"id": e["execution_id"], "child_order_id": f"JOR{e['order_id']:012d}", "product_code": e["symbol"],
+             "side": e["side"], "price": float(e["price"]), "size": float(e["size"]), "commission": 0,
+             "exec_date": e["timestamp"], "child_order_acceptance_id": self._bitflyer_acceptance_id(e["order_id"])}
+            for e in reversed(self.engines["bitflyer"].executions) if e["symbol"] == request.query.get("product_code")])
+
+    async def _bitflyer_balance(self, request):
+        return web.json_response([{"currency_code": asset, "amount": float(amount), "available": float(amount)}
+                                  for asset, amount in self.engines["bitflyer"].balances.items()])
+
+    async def _bitflyer_markets(self, request):
+        return web.json_response([{"product_code": symbol, "market_type": "FX" if symbol.startswith("FX_") else "Spot"}
+                                  for symbol in self.engines["bitflyer"].markets])
+
+    @staticmethod
+    def _bitflyer_board_json(market: MockMarket) -> dict:
+        return {"mid_price": float(market.mid),
+                "bids": [{"price": float(market.bid - market.tick * i), "size": 1.0} for i in range(5)],
+                "asks": [{"price": float(market.ask + market.tick * i), "size": 1.0} for i in range(5)]}
+
+    async def _bitflyer_board(self, request):
+        market = self.engines["bitflyer"].markets.get(request.query.get("product_code", "BTC_JPY"))
+        if market is None:
+            return web.json_response({"status": -1, "error_message": "unknown product"}, status=400)
+        return web.json_response(self._bitflyer_board_json(market))
+
+    def _bitflyer_ws_messages(self, kind, data, channels):
+        def message(channel, body):
+            return {"jsonrpc": "2.0", "method": "channelMessage", "params": {"channel": channel, "message": body}}
+        if kind == "trade":
+            channel = f"lightning_executions_{data['symbol']}"
+            if channel in channels:
+                acceptance_id = self._bitflyer_acceptance_id(data["order_id"])
+                yield message(channel, [{
+                    "id": data["execution_id"], "side": data["side"], "price": float(data["price"]),
+                    "size": float(data["size"]), "exec_date": data["timestamp"],
+                    "buy_child_order_acceptance_id": acceptance_id if data["side"] == "BUY" else "",
+                    "sell_child_order_acceptance_id": acceptance_id if data["side"] == "SELL" else ""}])
+        elif kind == "book":
+            market = data["market"]
+            for prefix in ("lightning_board_snapshot_", "lightning_board_"):
+                if f"{prefix}{market.symbol}" in channels:
+                    yield message(f"{prefix}{market.symbol}", self._bitflyer_board_json(market))
+            if f"lightning_ticker_{market.symbol}" in channels:
+                yield message(f"lightning_ticker_{market.symbol}", {
+                    "product_code": market.symbol, "timestamp": _now_iso(), "best_bid": float(market.bid),
+                    "best_ask": float(market.ask), "ltp": float(market.bid)})
+        elif kind in ("order", "execution") and "child_order_events" in channels:
+            o = data if kind == "order" else data["order"]
+            event = {"product_code": o["symbol"], "child_order_id": f"JOR{o['order_id']:012d}",
+                     "child_order_acceptance_id": self._bitflyer_acceptance_id(o["order_id"]), "event_date": _now_iso()}
+            if kind == "execution":
+                event.update({"event_type": "EXECUTION", "exec_id": data["execution_id"], "side": data["side"],
+                              "price": float(data["price"]), "size": float(data["size"]), "commission": 0, "sfd": 0,
+                              "outstanding_size": float(o["size"] - o["executed"])})
+            elif o["status"] in ("ORDERED", "WAITING") and not o["executed"]:
+                event.update({"event_type": "ORDER", "child_order_type": o["type"], "side": o["side"],
+                              "price": float(o["price"] or 0), "size": float(o["size"]), "expire_date": ""})
+            elif o["status"] == "CANCELED":
+                event["event_type"] = "CANCEL"
+            elif o["status"] == "EXPIRED":
+                event["event_type"] = "EXPIRE"
+            else:
+                return
+            yield message("child_order_events", [event])
+
+    async def _bitflyer_ws(self, request):
+        def on_message(client, data):
+            method = data.get("method")
+            channel = (data.get("params") or {}).get("channel")
+            if method not in ("auth", "subscribe", "unsubscribe"):
+                return
+            if "id" in data:
+                client.send({"jsonrpc": "2.0", "id": data["id"], "result": True})
+            if method == "unsubscribe":
+                client.channels.discard(channel)
+            elif method == "subscribe":
+                client.channels.add(channel)
+                # FX_BTC_JPY は BTC_JPY でも終わるので長い方を優先します
+                markets = [m for s, m in self.engines["bitflyer"].markets.items() if str(channel).endswith(f"_{s}")]
+                market = max(markets, key=lambda m: len(m.symbol), default=None)
+                if market is not None:
+                    for message in self._bitflyer_ws_messages("book", {"market": market}, {channel}):
+                        client.send(message)
+        return await self._ws_session(request, "bitflyer", on_message)
+
+    # CoinCheck
+    async def _coincheck_ticker(self, request):
+        market = self.engines["coincheck"].markets.get(request.query.get("pair", "btc_jpy"))
+        if market is None:
+            return web.json_response({"success": False, "error": "invalid pair"}, status=400)
+        return web.json_response({"last": float(market.bid), "bid": float(market.bid), "ask": float(market.ask),
+                                  "high": float(market.ask), "low": float(market.bid), "volume": 0.0,
+                                  "timestamp": int(time.time())})
+
+
+async def _serve(args):
+    rate_limits = {}
+    for item in args.rate_limit or []:
+        venue, limit = item.split("=")
+        count, _, per = limit.partition("/")
+        rate_limits[venue] = (int(count), float(per or 1.0))
+    server = MockExchangeServer(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                                error_rate=args.error_rate, rate_limits=rate_limits, volatility=args.volatility,
+                                tick_interval=args.tick_interval, seed=args.seed)
+    await server.start()
+    print(json.dumps(server.config(), indent=2))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="wrappy mock exchange server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", action="append", help="gmo=20/1.0 のように指定します")
+    parser.add_argument("--volatility", type=float, default=0.0005)
+    parser.add_argument("--tick-interval", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
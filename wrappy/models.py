@@ -0,0 +1,283 @@
+from decimal import Decimal, ROUND_DOWN
+from typing import Literal
+from functools import lru_cache
+
+
+_POW10 = [10 ** i for i in range(40)]
+
+
+# decimalsごとの変換結果のキャッシュです {値: 整数} APIの数量や価格は同じ値が繰り返し来ます
+_fixed_caches = [{} for _ in _POW10]
+
+
+def str_to_fixed(value, decimals: int) -> int:
+    """
+    "0.0123" のような文字列を 10**decimals 倍した整数にします(Decimalを作りません)
+    decimalsより細かい桁は切り捨てます. floatは repr の文字列(1.5e-05 など)から変換します
+    変換した結果はdecimalsごとに65536件までキャッシュします(等しい値は同じ整数になるので型が違っても共有できます)
+    str_to_fixed("0.0123", 4) -> 123
+    """
+    cache = _fixed_caches[decimals]
+    fixed = cache.get(value)
+    if fixed is None:
+        fixed = _to_fixed(value, decimals)
+        if len(cache) >= 65536:
+            cache.clear()
+        cache[value] = fixed
+    return fixed
+
+
+def _to_fixed(value, decimals: int) -> int:
+    s = value if isinstance(value, str) else repr(value) if isinstance(value, float) else str(value)
+    if "e" in s or "E" in s:
+        return int((Decimal(s) * _POW10[decimals]).to_integral_value(rounding=ROUND_DOWN))
+    i = s.find(".")
+    if i < 0:
+        return int(s) * _POW10[decimals]
+    frac_len = len(s) - i - 1
+    if frac_len <= decimals:
+        return int(s[:i] + s[i + 1:]) * _POW10[decimals - frac_len]
+    return int(s[:i] + s[i + 1:i + 1 + decimals])
+
+
+@lru_cache(maxsize=65536)
+def fixed_to_str(value: int, decimals: int) -> str:
+    """
+    fixed-pointの整数をAPIに送る文字列に戻します(末尾の0は付けません)
+    fixed_to_str(123, 4) -> "0.0123"
+    """
+    if decimals == 0:
+        return str(value)
+    whole, frac = divmod(-value if value < 0 else value, _POW10[decimals])
+    if not frac:
+        return f"-{whole}" if value < 0 else str(whole)
+    frac = str(frac).rjust(decimals, "0").rstrip("0")
+    return f"-{whole}.{frac}" if value < 0 else f"{whole}.{frac}"
+
+
+class Numeric(object):
+    """
+    APIの数値文字列をDecimalかfixed-pointの整数のどちらかに変換します
+    int の場合 price は 10**price_decimals 倍, size は 10**size_decimals 倍した整数になります
+    """
+    __slots__ = ("mode", "price_decimals", "size_decimals")
+
+    def __init__(self, mode: Literal["decimal", "int"] = "decimal", price_decimals: int = 0, size_decimals: int = 8):
+        if mode not in ("decimal", "int"):
+            raise ValueError(f"unknown numeric mode: {mode}")
+        self.mode = mode
+        self.price_decimals = price_decimals
+        self.size_decimals = size_decimals
+
+    def price(self, value):
+        if self.mode == "int":
+            return str_to_fixed(value, self.price_decimals)
+        return Decimal(value if isinstance(value, str) else str(value))
+
+    def size(self, value):
+        if self.mode == "int":
+            return str_to_fixed(value, self.size_decimals)
+        return Decimal(value if isinstance(value, str) else str(value))
+
+    def size_str(self, value) -> str:
+        """
+        size()で変換した値を文字列に戻します
+        """
+        if self.mode == "int":
+            return fixed_to_str(value, self.size_decimals)
+        # normalize()だけでは 100 が "1E+2" になるので指数表記にしません
+        return format(value.normalize(), "f")
+
+    def fee(self, value):
+        """
+        円などの決済通貨の手数料です. int の場合は価格と同じ 10**price_decimals 倍の整数です
+        """
+        return self.price(value)
+
+
+class _Model(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class Position(_Model):
+    """
+    建玉 side は "BUY" / "SELL" にそろえます
+    """
+    __slots__ = ("symbol", "side", "size", "price", "position_id")
+
+    def __init__(self, symbol: str, side: str, size, price=None, position_id=None):
+        self.symbol = symbol
+        self.side = side
+        self.size = size
+        self.price = price
+        self.position_id = position_id
+
+
+class Order(_Model):
+    __slots__ = ("order_id", "symbol", "side", "order_type", "price", "size", "executed_size", "status", "timestamp")
+
+    def __init__(self, order_id, symbol: str, side: str, order_type: str, price, size, executed_size, status: str,
+                 timestamp=None):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.size = size
+        self.executed_size = executed_size
+        self.status = status
+        self.timestamp = timestamp
+
+
+class Execution(_Model):
+    __slots__ = ("execution_id", "order_id", "symbol", "side", "price", "size", "fee", "timestamp")
+
+    def __init__(self, execution_id, order_id, symbol: str, side: str, price, size, fee=None, timestamp=None):
+        self.execution_id = execution_id
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.size = size
+        self.fee = fee
+        self.timestamp = timestamp
+
+
+class Balance(_Model):
+    __slots__ = ("asset", "amount", "available")
+
+    def __init__(self, asset: str, amount, available):
+        self.asset = asset
+        self.amount = amount
+        self.available = available
+
+
+# GMOコイン
+def gmo_positions(data: dict, num: Numeric) -> list:
+    """
+    /private/v1/positionSummary
+    """
+    return [Position(p["symbol"], p["side"], num.size(p["sumPositionQuantity"]), num.price(p["averagePositionRate"]))
+            for p in data.get("list", [])]
+
+
+def gmo_orders(data: dict, num: Numeric) -> list:
+    """
+    /private/v1/orders, /private/v1/activeOrders
+    """
+    return [Order(o["orderId"], o["symbol"], o["side"], o["executionType"], num.price(o["price"]),
+                  num.size(o["size"]), num.size(o["executedSize"]), o["status"], o["timestamp"])
+            for o in data.get("list", [])]
+
+
+def gmo_executions(data: dict, num: Numeric) -> list:
+    """
+    /private/v1/executions, /private/v1/latestExecutions
+    """
+    return [Execution(e["executionId"], e["orderId"], e["symbol"], e["side"], num.price(e["price"]),
+                      num.size(e["size"]), num.fee(e["fee"]), e["timestamp"])
+            for e in data.get("list", [])]
+
+
+def gmo_balances(data: list, num: Numeric) -> list:
+    """
+    /private/v1/account/assets
+    """
+    return [Balance(b["symbol"], num.size(b["amount"]), num.size(b["available"])) for b in data]
+
+
+# bitbank
+_BITBANK_SIDE = {"buy": "BUY", "sell": "SELL", "long": "BUY", "short": "SELL"}
+
+
+def bitbank_positions(data: dict, num: Numeric) -> list:
+    """
+    /user/margin/positions
+    """
+    return [Position(p["pair"], _BITBANK_SIDE[p["position_side"]], num.size(p["open_amount"]), num.price(p["average_price"]))
+            for p in data.get("positions", [])]
+
+
+def bitbank_orders(data: dict, num: Numeric) -> list:
+    """
+    /user/spot/active_orders, /user/spot/orders_info
+    """
+    return [Order(o["order_id"], o["pair"], _BITBANK_SIDE[o["side"]], o["type"].upper(),
+                  num.price(o["price"]) if o.get("price") else None, num.size(o["start_amount"]),
+                  num.size(o["executed_amount"]), o["status"], o.get("ordered_at"))
+            for o in data.get("orders", [])]
+
+
+def bitbank_executions(data: dict, num: Numeric) -> list:
+    """
+    /user/spot/trade_history
+    """
+    return [Execution(t["trade_id"], t["order_id"], t["pair"], _BITBANK_SIDE[t["side"]], num.price(t["price"]),
+                      num.size(t["amount"]), num.fee(t["fee_amount_quote"]), t.get("executed_at"))
+            for t in data.get("trades", [])]
+
+
+def bitbank_balances(data: dict, num: Numeric) -> list:
+    """
+    /user/assets
+    """
+    return [Balance(b["asset"], num.size(b["onhand_amount"]), num.size(b["free_amount"]))
+            for b in data.get("assets", [])]
+
+
+# bitflyer
+def bitflyer_positions(data: list, num: Numeric) -> list:
+    """
+    /v1/me/getpositions
+    """
+    return [Position(p["product_code"], p["side"], num.size(p["size"]), num.price(p["price"])) for p in data]
+
+
+def bitflyer_orders(data: list, num: Numeric) -> list:
+    """
+    /v1/me/getchildorders
+    """
+    return [Order(o["child_order_acceptance_id"], o["product_code"], o["side"], o["child_order_type"],
+                  num.price(o["price"]), num.size(o["size"]), num.size(o["executed_size"]),
+                  o["child_order_state"], o["child_order_date"])
+            for o in data]
+
+
+def bitflyer_executions(data: list, num: Numeric) -> list:
+    """
+    /v1/me/getexecutions  commissionは建玉の通貨(BTCなど)なので数量と同じ桁で扱います
+    """
+    return [Execution(e["id"], e["child_order_acceptance_id"], e.get("product_code"), e["side"], num.price(e["price"]),
+                      num.size(e["size"]), num.size(e["commission"]), e["exec_date"])
+            for e in data]
+
+
+def bitflyer_balances(data: list, num: Numeric) -> list:
+    """
+    /v1/me/getbalance
+    """
+    return [Balance(b["currency_code"], num.size(b["amount"]), num.size(b["available"])) for b in data]
+
+
+def net_position(positions: list, symbol: str = None) -> dict:
+    """
+    Positionのリストを {"side": "BUY" or "SELL", "size": 合計} にまとめます. 建玉が無ければ{}
+    """
+    net = 0
+    for p in positions:
+        if symbol is not None and p.symbol != symbol:
+            continue
+        net += p.size if p.side == "BUY" else -p.size
+    if not net:
+        return {}
+    return {"side": "BUY" if net > 0 else "SELL", "size": abs(net)}
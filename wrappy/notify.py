@@ -7,16 +7,9 @@ class Notify(Log):
         self._initialize_logger()
 
         # ラインに稼働状況を通知
-        try:
-            self.line_notify_token = self.config["line_notify_token"]
-        except KeyError:
-            pass
-        # Discordに稼働状況を通知するWebHook
-        try:
-            self.discordWebhook = self.config["discordWebhook"]
-        except KeyError:
-            # 設定されていなければNoneにしておく
-            self.discordWebhook = None
+        self.line_notify_token = self.config.value("line_notify_token")
+        # Discordに稼働状況を通知するWebHook 設定されていなければNone
+        self.discordWebhook = self.config.value("discordWebhook")
 
     async def lineNotify(self, message, fileName=None):
         payload = {'message': message}
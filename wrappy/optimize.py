@@ -0,0 +1,214 @@
+import os
+import pickle
+import multiprocessing
+import tempfile
+import numpy as np
+import polars as pl
+import optuna
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .util import _sorted_by, _slice_windows
+
+# polarsはスレッドプールを持つのでforkすると子プロセスが固まることがあります. spawnで起動します
+_mp_context = multiprocessing.get_context("spawn")
+
+
+def _dump_frame(df, path_base: str) -> tuple:
+    """
+    ワーカーが毎回pickleを受け取らなくていいようにデータをファイルに書き出します
+    polars: Arrow IPC (memory_mapで読めます) / numpy: .npy (mmap_modeで読めます) / pandas: pickle
+    """
+    if isinstance(df, pl.DataFrame):
+        path = f"{path_base}.arrow"
+        df.write_ipc(path)
+        return "polars", path
+    if isinstance(df, np.ndarray):
+        path = f"{path_base}.npy"
+        np.save(path, df)
+        return "numpy", path
+    path = f"{path_base}.pkl"
+    with open(path, "wb") as f:
+        pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return "pickle", path
+
+
+def _load_frame(kind: str, path: str):
+    if kind == "polars":
+        # read_ipcは標準でmemory mapして読み込みます
+        return pl.read_ipc(path)
+    if kind == "numpy":
+        return np.load(path, mmap_mode="r")
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def share_dataset(df, workdir: str) -> tuple:
+    """
+    dfまたはdfのリストをworkdirに書き出し, ワーカーに渡す軽い参照を返します
+    """
+    if isinstance(df, list):
+        return "list", [_dump_frame(d, os.path.join(workdir, f"fold_{i}")) for i, d in enumerate(df)]
+    return "single", _dump_frame(df, os.path.join(workdir, "data"))
+
+
+def load_dataset(ref: tuple):
+    kind, body = ref
+    if kind == "list":
+        return [_load_frame(*r) for r in body]
+    return _load_frame(*body)
+
+
+def _journal_storage(path: str):
+    """
+    プロセス間で共有できるファイルベースのstorageを作ります(optunaのバージョン差を吸収)
+    """
+    try:
+        from optuna.storages.journal import JournalFileBackend
+        return optuna.storages.JournalStorage(JournalFileBackend(path))
+    except ImportError:
+        return optuna.storages.JournalStorage(optuna.storages.JournalFileStorage(path))
+
+
+def _open_storage(storage):
+    if isinstance(storage, str) and storage.endswith(".log"):
+        return _journal_storage(storage)
+    return storage
+
+
+def _worker(objective_cls, data_ref: tuple, params: dict, objective_kwargs: dict,
+            study_name: str, storage, pruner, n_trials: int, seed: int) -> int:
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    storage = _open_storage(storage)
+    study = optuna.load_study(study_name=study_name, storage=storage, pruner=pruner,
+                              sampler=optuna.samplers.TPESampler(seed=seed))
+    objective = objective_cls(load_dataset(data_ref), params, **objective_kwargs)
+    study.optimize(objective, n_trials=n_trials)
+    return n_trials
+
+
+def optimize(objective_cls, df, params: dict, n_trials: int = 100, n_jobs: int = None,
+             direction: str = "maximize", study_name: str = "wrappy", storage=None,
+             pruner=None, workdir: str = None, seed: int = None, **objective_kwargs) -> optuna.Study:
+    """
+    Objectiveの子クラスを複数プロセスで並列に最適化します
+    データは一度だけファイルに書き出し, 各ワーカーはmemory_map/mmapで開くので試行ごとにpickleしません
+    deterministic=Trueをobjective_kwargsで渡すと, 同じパラメータの結果をワーカーのプロセスの中で使い回します
+    objective_clsはモジュールのトップレベルで定義してください(プロセスに渡すためpickleされます)
+
+    study = optimize(MyObjective, df_list, {"window": (5, 100, 5),
+                                            "k": {"type": "float", "low": 1e-3, "high": 1.0, "log": True},
+                                            "ma": {"type": "categorical", "choices": ["ema", "sma"]}},
+                     n_trials=1000, pruner=optuna.pruners.MedianPruner())
+    :param objective_cls: Objectiveの子クラス
+    :param df: DataFrame/ndarray またはそのリスト(walk-forwardのfold)
+    :param params: Objectiveに渡すパラメータ範囲
+    :param n_trials: 全プロセス合計のtrial数
+    :param n_jobs: プロセス数 (指定なしはCPU数)
+    :param storage: optunaのstorage URL または ".log" で終わるJournalファイルのパス (指定なしはworkdirに作ります)
+    :param workdir: データとJournalを置くディレクトリ (指定なしは一時ディレクトリ)
+    :return: optuna.Study
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        if storage is None:
+            storage = os.path.join(tmp, "journal.log")
+        study = optuna.create_study(study_name=study_name, storage=_open_storage(storage),
+                                    direction=direction, pruner=pruner, load_if_exists=True)
+        data_ref = share_dataset(df, tmp)
+        per_worker = [n_trials // n_jobs + (1 if i < n_trials % n_jobs else 0) for i in range(n_jobs)]
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=_mp_context) as executor:
+            futures = [executor.submit(_worker, objective_cls, data_ref, params, objective_kwargs,
+                                       study_name, storage, pruner, n, None if seed is None else seed + i)
+                       for i, n in enumerate(per_worker) if n]
+            for future in futures:
+                future.result()
+        # Journalファイルは一時ディレクトリと一緒に消えるので結果をメモリに移します
+        if isinstance(storage, str) and storage.startswith(tmp):
+            result = optuna.create_study(study_name=study_name, direction=direction)
+            result.add_trials(study.get_trials(deepcopy=False))
+            return result
+        return study
+
+
+def walk_forward_splits(df: pl.DataFrame, dt_col: str, train: timedelta, test: timedelta,
+                        step: timedelta = None, start: datetime = None, anchored: bool = False):
+    """
+    時間順のdfからwalk-forwardの(学習, 検証)の組を作ります. どちらもコピーしないsliceです
+    :param train: 学習期間
+    :param test: 検証期間
+    :param step: foldをずらす幅 (指定なしはtest)
+    :param start: 最初の学習期間の開始 (指定なしはdt_colの最小値)
+    :param anchored: Trueなら学習期間の開始をstartに固定して伸ばしていきます
+    :return: [(train_df, test_df, (train_start, test_start, test_end)), ...]
+    """
+    df = _sorted_by(df, dt_col)
+    if df.is_empty():
+        return []
+    ts = df[dt_col]
+    step = step or test
+    first = ts[0] if start is None else start
+    bounds = []
+    k = 0
+    while True:
+        test_start = first + train + step * k
+        if test_start > ts[-1]:
+            break
+        train_start = first if anchored else test_start - train
+        bounds.append((train_start, test_start, test_start + test))
+        k += 1
+    slices = _slice_windows(df, dt_col, [w for b in bounds for w in ((b[0], b[1]), (b[1], b[2]))])
+    return [(slices[2 * k], slices[2 * k + 1], b) for k, b in enumerate(bounds)]
+
+
+def _fold_worker(objective_cls, fold: int, train_ref: tuple, test_ref: tuple, params: dict,
+                 objective_kwargs: dict, n_trials: int, direction: str, seed: int) -> dict:
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.create_study(direction=direction, sampler=optuna.samplers.TPESampler(seed=seed))
+    study.optimize(objective_cls(load_dataset(train_ref), params, **objective_kwargs), n_trials=n_trials)
+    test_objective = objective_cls(load_dataset(test_ref), params, **objective_kwargs)
+    return {
+        "fold": fold,
+        "best_params": study.best_params,
+        "train_value": study.best_value,
+        "test_value": test_objective(optuna.trial.FixedTrial(study.best_params)),
+    }
+
+
+def walk_forward(objective_cls, df: pl.DataFrame, dt_col: str, params: dict, train: timedelta, test: timedelta,
+                 step: timedelta = None, start: datetime = None, anchored: bool = False, n_trials: int = 100,
+                 n_jobs: int = None, direction: str = "maximize", workdir: str = None, seed: int = None,
+                 **objective_kwargs):
+    """
+    walk-forwardの各foldを別プロセスで並列に最適化し, 終わったfoldから順に結果を返すジェネレータです
+    各foldでは学習期間でoptunaを回し, best_paramsで次の検証期間を評価します
+
+    for r in walk_forward(MyObjective, df, "datetime", params, train=timedelta(days=180), test=timedelta(days=30), n_jobs=32):
+        print(r["fold"], r["test_start"], r["best_params"], r["test_value"])
+
+    optimization_foldを実装したObjectiveには, 学習期間と検証期間をそれぞれ1つのfoldのリストとして渡します
+    :param start: 最初の学習期間の開始 (指定なしはdt_colの最小値)
+    :return: {"fold", "train_start", "test_start", "test_end", "best_params", "train_value", "test_value"}
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    splits = walk_forward_splits(df, dt_col, train, test, step=step, start=start, anchored=anchored)
+    folds = objective_cls.uses_folds()
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp, \
+            ProcessPoolExecutor(max_workers=n_jobs, mp_context=_mp_context) as executor:
+        futures = {}
+        for fold, (train_df, test_df, bounds) in enumerate(splits):
+            fold_dir = os.path.join(tmp, f"fold_{fold}")
+            os.mkdir(fold_dir)
+            train_frame = _dump_frame(train_df, os.path.join(fold_dir, "train"))
+            test_frame = _dump_frame(test_df, os.path.join(fold_dir, "test"))
+            if folds:
+                train_ref, test_ref = ("list", [train_frame]), ("list", [test_frame])
+            else:
+                train_ref, test_ref = ("single", train_frame), ("single", test_frame)
+            future = executor.submit(_fold_worker, objective_cls, fold, train_ref, test_ref, params, objective_kwargs,
+                                     n_trials, direction, None if seed is None else seed + fold)
+            futures[future] = bounds
+        for future in as_completed(futures):
+            train_start, test_start, test_end = futures[future]
+            result = future.result()
+            result.update({"train_start": train_start, "test_start": test_start, "test_end": test_end})
+            yield result
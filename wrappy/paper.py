@@ -0,0 +1,397 @@
+"""
+ペーパートレード(仮想の発注)です
+コンフィグに "paper" を設定すると, ボットの発注, キャンセル, 注文・建玉・残高の取得(privateのREST API)とprivateのwebsocketが
+ローカルの約定シミュレーターに向きます. 板, 約定, 価格の取得(publicのAPIとwebsocket)は本番のままです
+
+"paper": true
+"paper": {"latency": 0.03, "jitter": 0.01, "balances": {"JPY": 1000000, "BTC": 0.1}}
+
+約定シミュレーターはモックサーバー(mockserver.MockExchangeServer)と同じAPIを返すので, レスポンスの形とprivateのイベントは本番と同じです
+価格は BotBase.ws で受信した本番の板, ティッカー, 約定で動きます(GMOコイン, bitflyer, bitbank)
+指値は発注した時点で同じ価格に並んでいる数量の後ろに並び, その価格の約定で前の数量が無くなってから約定します
+成行と価格を越えた指値は板を上から順に食って約定します
+latency, jitter にボットのメトリクス(OrderLatency)の発注からackまでの時間を設定すると, 本番に近い遅延で約定します
+
+同じ設定のボットは1つのシミュレーターを共有します(同じ口座として建玉と残高を共有します)
+Runtime.subscribe など BotBase.ws を通さずに購読するときは, ハンドラを self.paper.wrap(self.exchange_id, handler) で包んでください
+"""
+import json
+import asyncio
+from decimal import Decimal
+from urllib.parse import urlsplit, urlunsplit
+from .mockserver import MockExchangeServer, MatchingEngine, MockMarket, MockError, _d
+
+
+class PaperMarket(MockMarket):
+    """
+    本番の板を写した気配です. bids, asks は {価格: 数量} です
+    """
+    def __init__(self, symbol: str, bid, ask, tick="0.00000001"):
+        self.symbol = symbol
+        self.tick = _d(tick)
+        self.volatility = 0.0
+        self.bid = _d(bid)
+        self.ask = _d(ask)
+        self.spread = self.ask - self.bid
+        self.bids = {}
+        self.asks = {}
+
+    def set_price(self, price):
+        self.set_quote(price, price)
+
+    def set_quote(self, bid, ask):
+        self.bid = _d(bid)
+        self.ask = _d(ask)
+        self.spread = self.ask - self.bid
+
+    def levels(self, side: str) -> list:
+        """
+        sideの注文が約定する相手の板を良い順に返します [(価格, 数量), ...]
+        """
+        if side == "BUY":
+            return sorted(self.asks.items())
+        return sorted(self.bids.items(), reverse=True)
+
+    def displayed(self, side: str, price: Decimal) -> Decimal:
+        """
+        sideの注文と同じ側の, priceに並んでいる数量です
+        """
+        return (self.bids if side == "BUY" else self.asks).get(price, Decimal(0))
+
+    def visible(self, side: str, price: Decimal) -> bool:
+        """
+        sideの側の板のうち, 受信している範囲にpriceが入っていればTrueです
+        """
+        book = self.bids if side == "BUY" else self.asks
+        if not book:
+            return False
+        return price >= min(book) if side == "BUY" else price <= max(book)
+
+
+class PaperEngine(MatchingEngine):
+    """
+    本番の板と約定で動くマッチングエンジンです
+    指値の注文には queue (前に並んでいる数量)を持たせて, その価格の約定で減らします
+    """
+    def market(self, symbol: str) -> PaperMarket:
+        market = self.markets.get(symbol)
+        if market is None:
+            raise MockError("unknown_symbol", f"no market data for {symbol} yet")
+        return market
+
+    def _market(self, symbol: str, bid, ask) -> PaperMarket:
+        market = self.markets.get(symbol)
+        if market is None:
+            market = self.markets[symbol] = PaperMarket(symbol, bid, ask)
+        return market
+
+    def submit(self, symbol: str, side: str, order_type: str, size, price=None, settle: str = "OPEN",
+               time_in_force: str = None, post_only: bool = False, position_id=None, order_id=None) -> dict:
+        order = super().submit(symbol, side, order_type, size, price, settle=settle, time_in_force=time_in_force,
+                               post_only=post_only, position_id=position_id, order_id=order_id)
+        if order["status"] == "ORDERED" and time_in_force in ("FAK", "FOK", "IOC"):
+            # 板を食いきれなかった残りは取消です
+            order["status"] = "EXPIRED"
+            self._emit("order", order)
+        elif order["status"] == "ORDERED" and order["type"] == "LIMIT" and "queue" not in order:
+            order["queue"] = self.markets[symbol].displayed(side, order["price"])
+        return order
+
+    def change(self, order_id, price) -> dict:
+        order = super().change(order_id, price)
+        if order["status"] == "ORDERED" and order["type"] == "LIMIT":
+            # 価格を変えると列の最後に並び直します
+            order["queue"] = self.markets[order["symbol"]].displayed(order["side"], order["price"])
+        return order
+
+    def _fill(self, order: dict, price: Decimal, taker: bool, size: Decimal = None):
+        market = self.markets.get(order["symbol"])
+        if not taker or market is None or not market.levels(order["side"]):
+            super()._fill(order, price, taker, size)
+            return
+        # 板を良い順に食って, 約定した数量を板から減らします. 板に見えている数量で足りなければ, 成行は最後の価格で残りを約定させます
+        book = market.asks if order["side"] == "BUY" else market.bids
+        level_price = price
+        for level_price, level_size in market.levels(order["side"]):
+            if order["type"] == "LIMIT" and (level_price > order["price"] if order["side"] == "BUY"
+                                             else level_price < order["price"]):
+                break
+            executed = order["executed"]
+            super()._fill(order, level_price, True, level_size)
+            left = level_size - (order["executed"] - executed)
+            if left > 0:
+                book[level_price] = left
+            else:
+                book.pop(level_price, None)
+            if order["status"] != "ORDERED":
+                break
+        if order["status"] == "ORDERED":
+            if order["type"] != "LIMIT":
+                super()._fill(order, level_price, True)
+            else:
+                # 食べ残した指値は板の先頭に並びます
+                order["queue"] = Decimal(0)
+        if market.bids and market.asks:
+            market.set_quote(max(market.bids), min(market.asks))
+
+    def update_book(self, symbol: str, bids=None, asks=None, snapshot: bool = True):
+        """
+        板を更新します
+        :param bids: [(価格, 数量), ...]
+        :param asks: [(価格, 数量), ...]
+        :param snapshot: Trueは板全体の置き換え, Falseは差分(数量0は削除)です
+        """
+        bids = [(_d(p), _d(s)) for p, s in bids or []]
+        asks = [(_d(p), _d(s)) for p, s in asks or []]
+        market = self.markets.get(symbol)
+        if market is None:
+            if not bids or not asks:
+                return
+            market = self._market(symbol, max(p for p, _ in bids), min(p for p, _ in asks))
+        for book, levels in ((market.bids, bids), (market.asks, asks)):
+            if snapshot:
+                book.clear()
+            for p, s in levels:
+                if s > 0:
+                    book[p] = s
+                else:
+                    book.pop(p, None)
+        if market.bids and market.asks:
+            market.set_quote(max(market.bids), min(market.asks))
+        self._on_quote(market)
+
+    def update_quote(self, symbol: str, bid, ask):
+        """
+        最良気配だけを更新します(ティッカー)
+        """
+        market = self._market(symbol, bid, ask)
+        market.set_quote(bid, ask)
+        self._on_quote(market)
+
+    def _on_quote(self, market: PaperMarket):
+        self._emit("book", {"market": market})
+        for order in self.active_orders(market.symbol):
+            if order["type"] == "LIMIT" and "queue" in order and market.visible(order["side"], order["price"]):
+                # 前に並んでいた数量が取り消されたら, 板に見えている数量まで前に進みます
+                order["queue"] = min(order["queue"], market.displayed(order["side"], order["price"]))
+            if self._crossing(order, market):
+                if order["type"] == "LIMIT":
+                    self._fill(order, order["price"], taker=False)
+                else:
+                    self._fill(order, market.ask if order["side"] == "BUY" else market.bid, taker=True)
+
+    def trade(self, symbol: str, side: str, price, size):
+        """
+        本番の約定で, 並んでいる指値を約定させます
+        :param side: 約定した成行(taker)の売買方向 BUY なら売りの指値が約定します
+        """
+        price, volume = _d(price), _d(size)
+        self._market(symbol, price, price)
+        maker_side = {"BUY": "SELL", "SELL": "BUY"}.get(str(side).upper())
+        if maker_side is None:
+            return
+        if maker_side == "BUY":
+            orders = [o for o in self.active_orders(symbol)
+                      if o["type"] == "LIMIT" and o["side"] == "BUY" and o["price"] >= price]
+            orders.sort(key=lambda o: (-o["price"], o["order_id"]))
+        else:
+            orders = [o for o in self.active_orders(symbol)
+                      if o["type"] == "LIMIT" and o["side"] == "SELL" and o["price"] <= price]
+            orders.sort(key=lambda o: (o["price"], o["order_id"]))
+        for order in orders:
+            if order["price"] != price:
+                # 約定が指値の価格を越えたので, 指値は全て約定しています
+                self._fill(order, order["price"], taker=False)
+                continue
+            if volume <= 0:
+                break
+            queue = order.get("queue", Decimal(0))
+            ahead = min(queue, volume)
+            order["queue"] = queue - ahead
+            volume -= ahead
+            if volume > 0:
+                remaining = order["size"] - order["executed"]
+                self._fill(order, price, taker=False, size=volume)
+                volume -= min(volume, remaining)
+
+
+class PaperServer(MockExchangeServer):
+    """
+    PaperEngineで約定させるモックサーバーです. 通貨ペアは本番のデータを受信したときに作ります
+    """
+    engine_class = PaperEngine
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 balances: dict = None, seed: int = None):
+        if balances is not None:
+            self.default_balances = balances
+        super().__init__(host, port, latency=latency, jitter=jitter,
+                         markets={venue: [] for venue in self.default_markets}, seed=seed)
+
+
+# 取引所ごとのprivateのREST APIのパスです
+PRIVATE_PATHS = {
+    "gmo": ("/private/",),
+    "bitbank": ("/user/",),
+    "bitflyer": ("/v1/me/",),
+}
+# privateのwebsocketのチャンネルです(bitflyerはpublicと同じ接続で購読します)
+PRIVATE_CHANNELS = {
+    "bitflyer": ("child_order_events", "parent_order_events"),
+}
+
+
+def _bitbank_message(msg):
+    if isinstance(msg, str) and msg.startswith("42"):
+        msg = json.loads(msg[2:])
+    if isinstance(msg, list) and len(msg) == 2:
+        msg = msg[1]
+    return msg if isinstance(msg, dict) and "room_name" in msg else None
+
+
+class PaperTrading(object):
+    """
+    ボットとPaperServerをつなぎます. BotBase.paper に設定されます
+    """
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, balances: dict = None, seed: int = None):
+        """
+        :param latency: 発注などのレスポンスを返すまでの遅延(秒) 本番の発注からackまでの時間に合わせます
+        :param jitter: 遅延に足す 0〜jitter秒のランダムな揺らぎ
+        :param balances: 最初の残高 {"JPY": 1000000} 指定なしはMockExchangeServer.default_balances
+        :param seed: 遅延の揺らぎの乱数のシード
+        """
+        self.server = PaperServer(latency=latency, jitter=jitter, balances=balances, seed=seed)
+        self._started = None
+
+    async def start(self) -> PaperServer:
+        """
+        シミュレーターを起動します. 何度呼んでも1回だけ起動します
+        """
+        if self._started is None:
+            self._started = asyncio.ensure_future(self.server.start())
+        return await asyncio.shield(self._started)
+
+    async def close(self):
+        if self._started is not None:
+            await self.server.close()
+            self._started = None
+
+    def engine(self, exchange_id: str) -> PaperEngine:
+        return self.server.engines[exchange_id]
+
+    # REST API
+    @staticmethod
+    def routes(exchange_id: str, url: str) -> bool:
+        """
+        urlがシミュレーターに送るprivateのAPIならTrueです
+        """
+        return urlsplit(str(url)).path.startswith(PRIVATE_PATHS.get(exchange_id, ()))
+
+    async def base_url(self, exchange_id: str) -> str:
+        await self.start()
+        return self.server.config()["base_urls"][exchange_id]
+
+    async def ws_url(self, exchange_id: str, url: str = "") -> str:
+        """
+        本番のwebsocketのURLのパスをシミュレーターのURLに付け替えます
+        """
+        await self.start()
+        host = urlsplit(self.server.url)
+        return urlunsplit(("ws", host.netloc, urlsplit(str(url)).path, "", ""))
+
+    # websocket
+    @staticmethod
+    def split(exchange_id: str, subscription_commands) -> tuple:
+        """
+        購読コマンドをpublicとprivateに分けます
+        :return: (publicの購読コマンド, privateの購読コマンド)
+        """
+        channels = PRIVATE_CHANNELS.get(exchange_id)
+        if not channels or subscription_commands is None:
+            return subscription_commands, []
+        commands = subscription_commands if isinstance(subscription_commands, list) else [subscription_commands]
+        public, private = [], []
+        for command in commands:
+            params = command.get("params") if isinstance(command, dict) else None
+            channel = params.get("channel") if isinstance(params, dict) else None
+            (private if channel in channels else public).append(command)
+        return public, private
+
+    def wrap(self, exchange_id: str, handler):
+        """
+        受信したメッセージでシミュレーターの価格を動かしてからhandlerに渡すハンドラを返します
+        """
+        feed = getattr(self, f"_feed_{exchange_id}", None)
+        if feed is None:
+            return handler
+
+        def onmessage(msg, ws):
+            # シミュレーターの失敗でボットのストアの更新を止めないようにします
+            try:
+                feed(self.server.engines[exchange_id], msg)
+            except (KeyError, TypeError, ValueError, ArithmeticError):
+                pass
+            handler(msg, ws)
+        return onmessage
+
+    @staticmethod
+    def _feed_gmo(engine: PaperEngine, msg):
+        if not isinstance(msg, dict):
+            return
+        channel, symbol = msg.get("channel"), msg.get("symbol")
+        if channel == "orderbooks":
+            engine.update_book(symbol, [(b["price"], b["size"]) for b in msg["bids"]],
+                               [(a["price"], a["size"]) for a in msg["asks"]])
+        elif channel == "ticker":
+            engine.update_quote(symbol, msg["bid"], msg["ask"])
+        elif channel == "trades":
+            engine.trade(symbol, msg["side"], msg["price"], msg["size"])
+
+    @staticmethod
+    def _feed_bitflyer(engine: PaperEngine, msg):
+        if not isinstance(msg, dict) or msg.get("method") != "channelMessage":
+            return
+        channel, body = msg["params"]["channel"], msg["params"]["message"]
+        for prefix, snapshot in (("lightning_board_snapshot_", True), ("lightning_board_", False)):
+            if channel.startswith(prefix):
+                engine.update_book(channel[len(prefix):], [(b["price"], b["size"]) for b in body["bids"]],
+                                   [(a["price"], a["size"]) for a in body["asks"]], snapshot=snapshot)
+                return
+        if channel.startswith("lightning_ticker_"):
+            engine.update_quote(body["product_code"], body["best_bid"], body["best_ask"])
+        elif channel.startswith("lightning_executions_"):
+            for e in body:
+                engine.trade(channel[len("lightning_executions_"):], e["side"], e["price"], e["size"])
+
+    @staticmethod
+    def _feed_bitbank(engine: PaperEngine, msg):
+        msg = _bitbank_message(msg)
+        if msg is None:
+            return
+        room, data = msg["room_name"], msg["message"]["data"]
+        if room.startswith("depth_whole_"):
+            engine.update_book(room[len("depth_whole_"):], data["bids"], data["asks"])
+        elif room.startswith("depth_diff_"):
+            engine.update_book(room[len("depth_diff_"):], data.get("b"), data.get("a"), snapshot=False)
+        elif room.startswith("ticker_"):
+            engine.update_quote(room[len("ticker_"):], data["buy"], data["sell"])
+        elif room.startswith("transactions_"):
+            for t in data["transactions"]:
+                engine.trade(room[len("transactions_"):], t["side"], t["price"], t["amount"])
+
+
+# 同じ設定のボットで共有するPaperTradingです
+_paper = {}
+
+
+def paper_trading(settings) -> PaperTrading:
+    """
+    コンフィグの "paper" の値からPaperTradingを返します. 同じ設定なら同じPaperTradingです
+    :param settings: True か {"latency": 0.03, "jitter": 0.01, "balances": {...}, "seed": 0}
+    """
+    settings = {} if settings is True else dict(settings)
+    key = json.dumps(settings, sort_keys=True)
+    paper = _paper.get(key)
+    if paper is None:
+        paper = _paper[key] = PaperTrading(**settings)
+    return paper
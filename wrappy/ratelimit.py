@@ -0,0 +1,70 @@
+import time
+import asyncio
+
+
+class RateLimiter(object):
+    """
+    トークンバケットのレートリミッターです. per秒あたりrate回までリクエストを通します
+    同じ取引所のボットで1つを共有すると, 合計で取引所の制限を守れます
+
+    limiter = RateLimiter(rate=20, per=1.0)
+    await limiter.acquire()
+    """
+    def __init__(self, rate: float, per: float = 1.0, burst: float = None):
+        """
+        :param rate: per秒あたりの回数
+        :param per: 期間(秒)
+        :param burst: 一度に通せる最大回数 指定なしはrate
+        """
+        self.configure(rate, per, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.count = 0
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    def configure(self, rate: float, per: float = 1.0, burst: float = None):
+        """
+        動いている間に制限を変えます(コンフィグのホットリロード). 貯まっているトークンはburstまでに減らします
+        """
+        self.rate = rate / per
+        self.burst = burst or rate
+        if hasattr(self, "tokens"):
+            self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost: float = 1):
+        """
+        トークンが貯まるまで待ちます
+        """
+        async with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens < cost:
+                wait = (cost - self.tokens) / self.rate
+                self.waited += wait
+                await asyncio.sleep(wait)
+                self._refill(time.monotonic())
+            self.tokens -= cost
+            self.count += 1
+
+    def stats(self) -> dict:
+        return {"count": self.count, "waited": self.waited, "tokens": self.tokens}
+
+
+class KeyRotation(object):
+    """
+    複数のAPIキーを順番に使うためのカウンターです. 同じ取引所のボットで共有すると, ボットをまたいで均等に回ります
+    """
+    def __init__(self):
+        self.count = 0
+
+    def next(self, n_keys: int) -> int:
+        """
+        :return: 次に使うキーの番号
+        """
+        index = self.count % n_keys
+        self.count += 1
+        return index
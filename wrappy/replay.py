@@ -0,0 +1,269 @@
+"""
+websocketのメッセージの記録とリプレイです
+
+記録: コンフィグに "record_dir" を設定すると, BotBase.ws と GMO.gmo_priv_ws で受信したメッセージをJSON Linesで保存します
+1行が {"t": 受信時刻(エポック秒), "s": ストリーム名, "m": メッセージ} です. ストリーム名は "gmo:/ws/public/v1" のように取引所とURLのパスです
+
+リプレイ: 記録したファイルを時刻順に読み, 同じ store.onmessage に流します. ボットのロジック(_run_logic)も同じコードのまま動きます
+replay = Replay(["log/record/gmo_BTC_JPY_20240101_000000.jsonl.gz"], speed=None)
+await replay.run(bot)
+
+リプレイの間は time_util の時計が記録の時刻になるので, now_jst / now_utc は記録した時点の時刻を返します
+ボットの発注はそのまま取引所に送られるので, モックサーバー(base_urls)かペーパートレードと組み合わせてください
+"""
+import gzip
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from urllib.parse import urlparse
+from .fastjson import loads, dumps
+from .time_util import set_clock
+
+
+logger = logging.getLogger(__name__)
+
+
+def stream_name(exchange_id: str, url: str) -> str:
+    """
+    記録とリプレイでストリームを対応させる名前です. ホストを除くので本番とモックサーバーで同じ名前になります
+    """
+    return f"{exchange_id}:{urlparse(str(url)).path}"
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+class Recorder(object):
+    """
+    受信したメッセージをJSON Linesで保存します
+    """
+    def __init__(self, path: str, flush_every: int = 1000):
+        """
+        :param path: 保存するファイル .gzで終わればgzipで圧縮します
+        :param flush_every: この行数ごとにファイルに書き出します
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.count = 0
+        self._file = _open(path, "ab")
+
+    def write(self, stream: str, msg, t: float = None):
+        if self._file.closed:
+            return
+        self._file.write(dumps({"t": time.time() if t is None else t, "s": stream, "m": msg}) + b"\n")
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self._file.flush()
+
+    def wrap(self, stream: str, handler):
+        """
+        handler(msg, ws) の前に記録するハンドラを返します
+        """
+        def onmessage(msg, ws):
+            self.write(stream, msg)
+            handler(msg, ws)
+        return onmessage
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_records(path: str):
+    """
+    記録したファイルを (時刻, ストリーム名, メッセージ) で1行ずつ返します
+    """
+    with _open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                record = loads(line)
+                yield record["t"], record["s"], record["m"]
+
+
+class ReplayClock(object):
+    """
+    リプレイ中の時計です. 時刻はリプレイが流したメッセージの記録時刻で進みます
+    sleepはリプレイの時刻がその秒数進むまで待ちます
+    """
+    def __init__(self, now: float = 0.0):
+        self.now = now
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, now: float):
+        if now > self.now:
+            self.now = now
+        while self._waiters and self._waiters[0][0] <= self.now:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+
+    def release(self):
+        """
+        リプレイの終わりに待っている全てのsleepを起こします
+        """
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+
+    async def sleep(self, seconds: float):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (self.now + seconds, next(self._seq), future))
+        await future
+
+
+class Replay(object):
+    """
+    記録したメッセージを時刻順に流します
+    speed: None はできるだけ速く, 1.0 は実時間, 60 は60倍速です
+    同じ時刻のメッセージはファイルの指定順, ファイルの中の順で流すので, 何度実行しても同じ順番になります
+    メッセージを1つ流すごとにイベントループに処理を返すので, store.watch() などで待っているタスクも順番に動きます
+    """
+    def __init__(self, paths, speed: float = None, start: float = None, end: float = None, ready_timeout: float = 10.0):
+        """
+        :param paths: 記録したファイルのパス(複数可)
+        :param speed: 再生速度の倍率 Noneはできるだけ速く
+        :param start: この時刻(エポック秒)より前のメッセージを飛ばします
+        :param end: この時刻(エポック秒)より後のメッセージで終わります
+        :param ready_timeout: run(bot)でボットが記録の全てのストリームを購読する(またはready()を呼ぶ)まで待つ秒数
+        """
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.speed = speed
+        self.start = start
+        self.end = end
+        self.ready_timeout = ready_timeout
+        self.clock = ReplayClock()
+        self.handlers = {}
+        self.count = 0
+        self.dropped = 0
+        self._streams = None
+        self._ready = asyncio.Event()
+
+    def subscribe(self, stream: str, handler):
+        """
+        ストリームのメッセージを渡すハンドラを登録します handler(msg, ws) で呼び, wsはNoneです
+        """
+        self.handlers.setdefault(stream, []).append(handler)
+        if self._streams is not None and self._streams <= self.handlers.keys():
+            self._ready.set()
+
+    def ready(self):
+        """
+        ボットの準備ができたことを知らせます. 記録の一部のストリームしか購読しないボットは, これを呼ぶとすぐにリプレイが始まります
+        """
+        self._ready.set()
+
+    def streams(self) -> set:
+        """
+        start から end までに記録されているストリーム名です
+        """
+        names = set()
+        for t, stream, _ in self.records():
+            if self.start is not None and t < self.start:
+                continue
+            if self.end is not None and t > self.end:
+                break
+            names.add(stream)
+        return names
+
+    def attach(self, bot):
+        """
+        ボットのwebsocketの購読をこのリプレイにつなぎます(BotBase.wsが接続の代わりにsubscribeを呼びます)
+        """
+        bot.replay = self
+        return bot
+
+    def records(self):
+        """
+        全てのファイルを時刻順にまとめた (時刻, ストリーム名, メッセージ) です
+        """
+        return heapq.merge(*(read_records(path) for path in self.paths), key=lambda record: record[0])
+
+    async def _pace(self, t: float, data_start: float, wall_start: float):
+        if self.speed is None:
+            await asyncio.sleep(0)
+            return
+        delay = wall_start + (t - data_start) / self.speed - time.monotonic()
+        await asyncio.sleep(max(0.0, delay))
+
+    async def play(self) -> dict:
+        """
+        メッセージを最後まで流します. 時計は差し替えないので, 通常はrunを使います
+        """
+        wall_start = time.monotonic()
+        data_start = data_end = None
+        for t, stream, msg in self.records():
+            if self.start is not None and t < self.start:
+                continue
+            if self.end is not None and t > self.end:
+                break
+            if data_start is None:
+                data_start = t
+                self.clock.advance(t)
+            await self._pace(t, data_start, wall_start)
+            self.clock.advance(t)
+            data_end = t
+            handlers = self.handlers.get(stream)
+            if not handlers:
+                self.dropped += 1
+                continue
+            self.count += 1
+            for handler in handlers:
+                try:
+                    handler(msg, None)
+                except Exception as e:
+                    logger.exception(f"replay handler failed: {e!r}")
+        self.clock.release()
+        elapsed = time.monotonic() - wall_start
+        span = (data_end - data_start) if data_start is not None else 0.0
+        return {"messages": self.count, "dropped": self.dropped, "elapsed": elapsed, "span": span,
+                "speedup": span / elapsed if elapsed else 0.0}
+
+    async def run(self, bot=None) -> dict:
+        """
+        時計を差し替えてリプレイします. botを渡すとボットのロジックを動かしながら流し, 終わったらロジックを止めます
+        :return: {"messages": 流した数, "dropped": ハンドラの無いストリームの数, "elapsed": 実時間, "span": 記録の時間, "speedup": 倍率}
+        """
+        previous = set_clock(self.clock)
+        task = None
+        try:
+            if bot is not None:
+                self.attach(bot)
+                # 最初の記録時刻から始めます(ロジックの初期化でnow_jstなどを使う場合のため)
+                for t, _, _ in self.records():
+                    if self.start is None or t >= self.start:
+                        self.clock.advance(t)
+                        break
+                # 後から購読するストリーム(awaitの後のprivateなど)のメッセージを落とさないように, 全て揃うまで待ちます
+                self._streams = self.streams()
+                if self._streams <= self.handlers.keys():
+                    self._ready.set()
+                task = asyncio.ensure_future(bot.start())
+                try:
+                    await asyncio.wait_for(self._ready.wait(), self.ready_timeout)
+                except asyncio.TimeoutError:
+                    missing = sorted(self._streams - self.handlers.keys())
+                    logger.warning(f"bot did not subscribe {missing} before the replay started.")
+            stats = await self.play()
+            if bot is not None:
+                bot.log_info(f"Replay finished: {stats}")
+            return stats
+        finally:
+            if task is not None:
+                bot.stop_flag = True
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                bot.replay = None
+            set_clock(previous)
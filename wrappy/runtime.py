@@ -0,0 +1,150 @@
+import json
+import asyncio
+import logging
+from .transport import TransportPool
+from .ratelimit import RateLimiter, KeyRotation
+from .fastjson import ws_connect_kwargs
+
+
+logger = logging.getLogger(__name__)
+
+
+class Runtime(object):
+    """
+    1つのプロセス, 1つのイベントループで複数の通貨ペア/取引所のボットを動かします
+    ボット同士でHTTPの接続(TransportPool), 取引所ごとのレートリミッター, 同じ購読のwebsocketを共有します
+    ボットの状態はそれぞれのインスタンスに持ち, 1つのボットが例外で落ちても他のボットは止まりません
+
+    config = load_config("config.json")       # 同じパスは1回だけ読み, 全てのボットで共有します
+    runtime = Runtime(rate_limits=config.value("rate_limits"))   # {"gmo": {"rate": 20}, "bitbank": {"rate": 10}}
+    for symbol in ["BTC_JPY", "ETH_JPY"]:
+        runtime.add(MyGMOBot(config, symbol))
+    await runtime.run()
+    """
+    def __init__(self, rate_limits: dict = None, restart: bool = True, restart_delay: float = 5.0,
+                 transport: TransportPool = None, key_rotations: dict = None):
+        """
+        :param rate_limits: 取引所ごとのRateLimiterの引数 {"gmo": {"rate": 20, "per": 1.0}} exchange_idで指定します
+                            作成済みのリミッター(SharedRateLimiterなど)も渡せます
+                            bitflyerの注文系の制限は "bitflyer_order" で指定します
+        :param restart: ボットが例外で止まったときに再起動するか
+        :param restart_delay: 再起動までの秒数
+        :param transport: 共有するTransportPool 指定なしは新しく作ります
+        :param key_rotations: 取引所ごとのAPIキーのローテーション 指定なしはこのRuntimeの中で共有します
+        """
+        self.transport = transport or TransportPool()
+        self.rate_limiters = {exchange: RateLimiter(**limit) if isinstance(limit, dict) else limit
+                              for exchange, limit in (rate_limits or {}).items()}
+        self.key_rotations = key_rotations or {}
+        self.restart = restart
+        self.restart_delay = restart_delay
+        self.bots = []
+        self.failures = {}
+        self._tasks = {}
+        self._streams = {}
+
+    def add(self, bot):
+        """
+        ボットを登録します. 共有のtransportとレートリミッターを設定します
+        """
+        bot.transport = self.transport
+        if bot.exchange_id in self.rate_limiters:
+            bot.rate_limiter = self.rate_limiters[bot.exchange_id]
+        if hasattr(bot, "order_rate_limiter") and f"{bot.exchange_id}_order" in self.rate_limiters:
+            bot.order_rate_limiter = self.rate_limiters[f"{bot.exchange_id}_order"]
+        if hasattr(bot, "key_rotation"):
+            bot.key_rotation = self.key_rotations.setdefault(bot.exchange_id, KeyRotation())
+        self.bots.append(bot)
+        self.failures[id(bot)] = 0
+        return bot
+
+    @staticmethod
+    def _name(bot) -> str:
+        return f"{bot.exchange_id}:{getattr(bot, 'symbol', None)}:{bot.bot_name}"
+
+    async def _run_bot(self, bot):
+        while not bot.stop_flag:
+            try:
+                await bot.start()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failures[id(bot)] += 1
+                bot.log_exception(f"{self._name(bot)} crashed ({self.failures[id(bot)]} times).")
+                if not self.restart:
+                    return
+            await asyncio.sleep(self.restart_delay)
+
+    async def run(self):
+        """
+        全てのボットを起動し, 全て終わるまで待ちます
+        """
+        for bot in self.bots:
+            if id(bot) not in self._tasks:
+                self._tasks[id(bot)] = asyncio.create_task(self._run_bot(bot), name=self._name(bot))
+        try:
+            await asyncio.gather(*self._tasks.values())
+        finally:
+            await self.close()
+
+    async def stop(self):
+        """
+        全てのボットのstopを呼びます. 1つが失敗しても残りのボットは止めます
+        """
+        results = []
+        for bot in self.bots:
+            result = bot.stop()
+            if asyncio.iscoroutine(result):
+                results.append(result)
+        for result in await asyncio.gather(*results, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"stop failed: {result!r}")
+
+    async def subscribe(self, url: str, subscription_commands, handler, apis=None):
+        """
+        websocketを購読します. 同じurl, 同じ購読コマンドは1本の接続を共有し, 受信したメッセージを全てのhandlerに渡します
+        :param handler: handler(msg, ws) store.onmessage など
+        :return: pybotters.WebSocketApp
+        """
+        key = (url, json.dumps(subscription_commands, sort_keys=True), json.dumps(apis, sort_keys=True))
+        stream = self._streams.get(key)
+        if stream is not None:
+            stream["handlers"].append(handler)
+            return await asyncio.shield(stream["app"])
+        handlers = [handler]
+
+        def dispatch(msg, ws):
+            for h in handlers:
+                try:
+                    h(msg, ws)
+                except Exception as e:
+                    logger.exception(f"websocket handler failed: {e!r}")
+
+        # 接続中に同じ購読が来ても2本目を張らないように, 接続のタスクを共有します
+        app = asyncio.ensure_future(self.transport.client(apis).ws_connect(
+            url, send_json=subscription_commands, **ws_connect_kwargs(dispatch)))
+        self._streams[key] = {"handlers": handlers, "app": app}
+        try:
+            return await asyncio.shield(app)
+        except Exception:
+            self._streams.pop(key, None)
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "bots": {self._name(bot): {"running": id(bot) in self._tasks and not self._tasks[id(bot)].done(),
+                                       "failures": self.failures[id(bot)]} for bot in self.bots},
+            "streams": len(self._streams),
+            "transport": self.transport.stats(),
+            "rate_limiters": {exchange: limiter.stats() for exchange, limiter in self.rate_limiters.items()},
+        }
+
+    async def close(self):
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks = {}
+        self._streams = {}
+        await self.transport.close()
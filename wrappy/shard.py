@@ -0,0 +1,181 @@
+import time
+import signal
+import asyncio
+import logging
+import multiprocessing
+from .runtime import Runtime
+
+
+logger = logging.getLogger(__name__)
+
+# polarsなどスレッドを持つライブラリを読み込んだ後にforkすると固まるのでspawnを使います
+_mp_context = multiprocessing.get_context("spawn")
+
+
+class SharedRateLimiter(object):
+    """
+    プロセス間で共有するトークンバケットです. 状態を共有メモリに置くので, 全てのワーカーの合計で制限を守ります
+    RateLimiterと同じようにacquireを待ってからリクエストします
+    ロックを持つのはトークンの計算の間だけで, 待つ間はロックを離してasyncio.sleepします
+    """
+    def __init__(self, rate: float, per: float = 1.0, burst: float = None, ctx=None):
+        """
+        :param rate: per秒あたりの回数
+        :param per: 期間(秒)
+        :param burst: 一度に通せる最大回数 指定なしはrate
+        """
+        ctx = ctx or _mp_context
+        self.rate = rate / per
+        self.burst = burst or rate
+        # tokens, updated, count, waited
+        self._state = ctx.Array("d", [self.burst, time.monotonic(), 0.0, 0.0])
+
+    def configure(self, rate: float, per: float = 1.0, burst: float = None):
+        """
+        このプロセスの制限を変えます. ワーカーはそれぞれコンフィグを読み直すので, 全てのワーカーで同じ値になります
+        """
+        self.rate = rate / per
+        self.burst = burst or rate
+
+    async def acquire(self, cost: float = 1):
+        state = self._state
+        while True:
+            with state.get_lock():
+                now = time.monotonic()
+                tokens = min(self.burst, state[0] + (now - state[1]) * self.rate)
+                state[1] = now
+                if tokens >= cost:
+                    state[0] = tokens - cost
+                    state[2] += 1
+                    return
+                state[0] = tokens
+                wait = (cost - tokens) / self.rate
+                state[3] += wait
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        with self._state.get_lock():
+            return {"count": int(self._state[2]), "waited": self._state[3], "tokens": self._state[0]}
+
+
+class SharedKeyRotation(object):
+    """
+    プロセス間で共有するAPIキーのローテーションです
+    """
+    def __init__(self, ctx=None):
+        self._count = (ctx or _mp_context).Value("q", 0)
+
+    def next(self, n_keys: int) -> int:
+        with self._count.get_lock():
+            index = self._count.value % n_keys
+            self._count.value += 1
+        return index
+
+
+def _run_shard(index: int, specs: list, runtime_kwargs: dict):
+    # Ctrl+Cのときは親にだけSIGINTを処理させ, ワーカーは親が送るSIGTERMでボットを止めて建玉を決済してから終わります
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    async def main():
+        runtime = Runtime(**runtime_kwargs)
+        for factory, args, kwargs in specs:
+            runtime.add(factory(*args, **kwargs))
+
+        async def shutdown():
+            await runtime.stop()
+            await runtime.close()
+
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(shutdown()))
+        except NotImplementedError:
+            # Windows
+            pass
+        logger.info(f"shard {index} started with {len(specs)} bots.")
+        await runtime.run()
+
+    asyncio.run(main())
+
+
+class ShardedRuntime(object):
+    """
+    ボットを複数のワーカープロセスに分けて動かします. 各ワーカーの中はRuntimeです
+    レートリミットとAPIキーのローテーションは共有メモリで全ワーカーが共有するので,
+    プロセスを増やしても合計で取引所の制限を超えません
+
+    ボットはワーカーの中で作るので, クラスと引数を登録します(クラスはimportできる場所に定義してください)
+    sharded = ShardedRuntime(workers=4, rate_limits={"gmo": {"rate": 20}, "bitflyer_order": {"rate": 1}})
+    for symbol in symbols:
+        sharded.add(MyGMOBot, config, symbol)
+    sharded.run()
+    """
+    def __init__(self, workers: int = None, rate_limits: dict = None, restart: bool = True,
+                 restart_delay: float = 5.0, key_rotation_exchanges=("bitbank",)):
+        """
+        :param workers: ワーカープロセス数 指定なしはCPU数
+        :param rate_limits: 取引所ごとのSharedRateLimiterの引数 {"gmo": {"rate": 20, "per": 1.0}}
+        :param restart: ボットが例外で止まったときに再起動するか
+        :param restart_delay: 再起動までの秒数
+        :param key_rotation_exchanges: APIキーのローテーションを共有する取引所
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.rate_limiters = {exchange: SharedRateLimiter(**limit) for exchange, limit in (rate_limits or {}).items()}
+        self.key_rotations = {exchange: SharedKeyRotation() for exchange in key_rotation_exchanges}
+        self.restart = restart
+        self.restart_delay = restart_delay
+        self.specs = []
+        self.processes = []
+
+    def add(self, factory, *args, **kwargs):
+        """
+        ボットを登録します. ワーカーの中で factory(*args, **kwargs) を呼んでボットを作ります
+        """
+        self.specs.append((factory, args, kwargs))
+
+    def shards(self) -> list:
+        """
+        ボットをワーカーに順番に割り当てます
+        """
+        return [self.specs[i::self.workers] for i in range(min(self.workers, len(self.specs)))]
+
+    def start(self):
+        runtime_kwargs = {"rate_limits": self.rate_limiters, "key_rotations": self.key_rotations,
+                          "restart": self.restart, "restart_delay": self.restart_delay}
+        for index, specs in enumerate(self.shards()):
+            process = _mp_context.Process(target=_run_shard, args=(index, specs, runtime_kwargs),
+                                          name=f"wrappy-shard-{index}")
+            process.start()
+            self.processes.append(process)
+
+    def join(self):
+        for process in self.processes:
+            process.join()
+
+    def stop(self, timeout: float = 30.0):
+        """
+        ワーカーにSIGTERMを送ってボットのstopを呼ばせます. timeout秒で終わらなければkillします
+        """
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+
+    def run(self):
+        """
+        ワーカーを起動し, 全て終わるまで待ちます. Ctrl+Cで全てのワーカーを止めます
+        """
+        self.start()
+        try:
+            self.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stats(self) -> dict:
+        return {
+            "workers": {process.name: process.is_alive() for process in self.processes},
+            "rate_limiters": {exchange: limiter.stats() for exchange, limiter in self.rate_limiters.items()},
+        }
@@ -0,0 +1,170 @@
+"""
+privateのAPIの署名です(GMO, bitbank, bitflyer)
+pybottersはリクエストごとにHMACの鍵の準備, JSON化, ヘッダーの組み立てをします
+ここでは APIキーごとに鍵を準備したSignerを1つだけ作り, ボットの間で共有します
+
+signer = get_signer("gmo", key, secret)
+url, body, headers = signer.sign("POST", "https://api.coin.z.com", "/private/v1/order", None, {"symbol": "BTC_JPY", ...})
+client.request("POST", url, data=body, headers=headers, auth=None)
+
+タイムスタンプ(nonce)はAPIキーごとに単調増加で, 同じミリ秒の2つ目は1ミリ秒進めるので重なりません
+"""
+import time
+import hashlib
+import threading
+from yarl import URL
+from .fastjson import dumps
+
+_IPAD = bytes(x ^ 0x36 for x in range(256))
+_OPAD = bytes(x ^ 0x5c for x in range(256))
+
+
+class HmacKey(object):
+    """
+    HMAC-SHA256の鍵です. 鍵とipad, opadのXORを1回だけハッシュしておき, 署名ごとにそのコピーを使います
+    hmac.new(secret, text, hashlib.sha256).hexdigest() と同じ値です
+    """
+    __slots__ = ("_inner", "_outer")
+
+    def __init__(self, secret):
+        if isinstance(secret, str):
+            secret = secret.encode()
+        block_size = hashlib.sha256().block_size
+        if len(secret) > block_size:
+            secret = hashlib.sha256(secret).digest()
+        secret = secret.ljust(block_size, b"\0")
+        self._inner = hashlib.sha256(secret.translate(_IPAD))
+        self._outer = hashlib.sha256(secret.translate(_OPAD))
+
+    def hexdigest(self, *parts: bytes) -> str:
+        inner = self._inner.copy()
+        for part in parts:
+            inner.update(part)
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.hexdigest()
+
+
+class Nonce(object):
+    """
+    ミリ秒のタイムスタンプを単調増加で返します. 時計が戻ったり同じミリ秒に続けて呼んでも前の値+1になります
+    スレッドから呼んでも重ならないようにロックします(プロセスの間では共有しません)
+    """
+    __slots__ = ("last", "_lock")
+
+    def __init__(self):
+        self.last = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> int:
+        now = int(time.time() * 1000)
+        with self._lock:
+            if now <= self.last:
+                now = self.last + 1
+            self.last = now
+        return now
+
+
+class Signer(object):
+    """
+    1つのAPIキーの署名です. 取引所ごとの子クラスで _text と ヘッダーの名前を設定します
+    """
+    key_header = None
+    time_header = None
+    sign_header = None
+
+    def __init__(self, key: str, secret):
+        self.key = key
+        self.hmac = HmacKey(secret)
+        self.nonce = Nonce()
+        # 毎回変わらないヘッダーです. 署名ごとにコピーして時刻と署名だけを入れます
+        self._headers = {self.key_header: key}
+        self._json_headers = {self.key_header: key, "Content-Type": "application/json"}
+        # パースしたURLのキャッシュです. 同じエンドポイントを何度も呼ぶのでURLのパースを1回にします
+        self._urls = {}
+
+    def sign(self, method: str, base_url: str, url: str, params=None, data=None) -> tuple:
+        """
+        :param url: base_urlからのパス "/private/v1/order"
+        :param params: クエリ Noneの値は除きます
+        :param data: 本文のdict JSON化して送ります JSONのbytesはそのまま送ります
+        :return: (リクエストするURL, 本文のbytesかNone, ヘッダー)
+        """
+        target = self._urls.get(base_url + url)
+        if target is None:
+            if len(self._urls) >= 256:
+                self._urls.clear()
+            target = self._urls[base_url + url] = URL(base_url + url)
+        if params:
+            target = target.update_query({k: v for k, v in params.items() if v is not None})
+        body = data if isinstance(data, bytes) else dumps(data) if data else b""
+        timestamp = str(self.nonce.next())
+        headers = (self._json_headers if data else self._headers).copy()
+        headers[self.time_header] = timestamp
+        headers[self.sign_header] = self.hmac.hexdigest(*self._text(method, target, timestamp, body))
+        return str(target), body or None, headers
+
+    def _text(self, method: str, target: URL, timestamp: str, body: bytes) -> tuple:
+        raise NotImplementedError()
+
+
+class GMOSigner(Signer):
+    """
+    timestamp + method + パス(/private を除いたもの, クエリ無し) + 本文(POSTだけ)
+    """
+    key_header = "API-KEY"
+    time_header = "API-TIMESTAMP"
+    sign_header = "API-SIGN"
+
+    def _text(self, method, target, timestamp, body):
+        path = target.path
+        path = path[path.find("/", 1):] if path.count("/") > 1 else "/"
+        if method == "POST":
+            return f"{timestamp}{method}{path}".encode(), body
+        return f"{timestamp}{method}{path}".encode(),
+
+
+class BitbankSigner(Signer):
+    """
+    GET: request time + パスとクエリ / POST: request time + 本文
+    """
+    key_header = "ACCESS-KEY"
+    time_header = "ACCESS-REQUEST-TIME"
+    sign_header = "ACCESS-SIGNATURE"
+
+    def _text(self, method, target, timestamp, body):
+        if method == "GET":
+            return f"{timestamp}{target.raw_path_qs}".encode(),
+        return timestamp.encode(), body
+
+
+class BitflyerSigner(Signer):
+    """
+    timestamp + method + パスとクエリ + 本文
+    """
+    key_header = "ACCESS-KEY"
+    time_header = "ACCESS-TIMESTAMP"
+    sign_header = "ACCESS-SIGN"
+
+    def _text(self, method, target, timestamp, body):
+        return f"{timestamp}{method}{target.raw_path_qs}".encode(), body
+
+
+# {exchange_id: Signerの子クラス}
+SIGNERS = {"gmo": GMOSigner, "bitbank": BitbankSigner, "bitflyer": BitflyerSigner}
+# 作成済みのSigner {(exchange_id, key, secret): Signer} 同じキーのボットは同じnonceを使います
+_signers = {}
+
+
+def get_signer(exchange_id: str, key: str, secret):
+    """
+    APIキーのSignerを返します. 対応していない取引所はNoneです
+    """
+    cache_key = (exchange_id, key, secret)
+    signer = _signers.get(cache_key)
+    if signer is None:
+        signer_class = SIGNERS.get(exchange_id)
+        if signer_class is None:
+            return None
+        signer = _signers[cache_key] = signer_class(key, secret)
+    return signer
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import asyncio
+import pybotters
+from decimal import Decimal, ROUND_FLOOR, ROUND_CEILING, ROUND_HALF_EVEN
+from .exceptions import InvalidOrderException
+from .fastjson import read_json
+from .fixedpoint import FixedPoint
+
+
+class SymbolInfo(object):
+    """
+    通貨ペアの呼値(tick_size), 数量の刻み(size_step), 最小/最大発注数量です
+    """
+    __slots__ = ("exchange", "symbol", "tick_size", "size_step", "min_size", "max_size")
+
+    def __init__(self, exchange: str, symbol: str, tick_size, size_step, min_size, max_size=None):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.tick_size = Decimal(str(tick_size))
+        self.size_step = Decimal(str(size_step))
+        self.min_size = Decimal(str(min_size))
+        self.max_size = None if max_size is None else Decimal(str(max_size))
+
+    def __repr__(self):
+        return (f"SymbolInfo({self.exchange} {self.symbol} tick={self.tick_size} step={self.size_step} "
+                f"min={self.min_size} max={self.max_size})")
+
+    def to_dict(self) -> dict:
+        return {"tick_size": str(self.tick_size), "size_step": str(self.size_step),
+                "min_size": str(self.min_size), "max_size": None if self.max_size is None else str(self.max_size)}
+
+    def round_price(self, price, side: str = None) -> Decimal:
+        """
+        価格を呼値に丸めます. 買いは切り下げ, 売りは切り上げ(約定しにくい側), sideなしは最も近い値です
+        """
+        price = Decimal(str(price))
+        if side is None:
+            rounding = ROUND_HALF_EVEN
+        elif side.upper() == "BUY":
+            rounding = ROUND_FLOOR
+        else:
+            rounding = ROUND_CEILING
+        return (price / self.tick_size).quantize(Decimal(1), rounding=rounding) * self.tick_size
+
+    def round_size(self, size) -> Decimal:
+        """
+        数量を刻みに切り下げます
+        """
+        size = Decimal(str(size))
+        return (size / self.size_step).quantize(Decimal(1), rounding=ROUND_FLOOR) * self.size_step
+
+    def validate(self, size, price=None):
+        """
+        丸めた後の数量, 価格が発注できる値か確認します. ダメならInvalidOrderExceptionです
+        """
+        if size < self.min_size:
+            raise InvalidOrderException(f"{self.symbol} size {size} is below minimum {self.min_size}")
+        if self.max_size is not None and size > self.max_size:
+            raise InvalidOrderException(f"{self.symbol} size {size} is above maximum {self.max_size}")
+        if price is not None and price <= 0:
+            raise InvalidOrderException(f"{self.symbol} price {price} must be positive")
+
+    def prepare(self, side: str, size, price=None) -> tuple:
+        """
+        発注前に数量と価格を丸めて確認します
+        :return: (size, price) 共にDecimal (priceが無ければNone)
+        """
+        size = self.round_size(size)
+        if price is not None:
+            price = self.round_price(price, side)
+        self.validate(size, price)
+        return size, price
+
+    def fixed_point(self) -> FixedPoint:
+        """
+        この通貨ペアに合ったfixed-pointのスケールです
+        """
+        return FixedPoint(max(0, -self.tick_size.normalize().as_tuple().exponent),
+                          max(0, -self.size_step.normalize().as_tuple().exponent))
+
+
+# bitflyerは呼値を返すAPIが無いので既知の値を使います
+_BITFLYER_SYMBOLS = {
+    "BTC_JPY": ("1", "0.00000001", "0.001"),
+    "FX_BTC_JPY": ("1", "0.00000001", "0.01"),
+    "ETH_JPY": ("1", "0.00000001", "0.01"),
+    "ETH_BTC": ("0.00001", "0.00000001", "0.01"),
+    "BCH_BTC": ("0.00001", "0.00000001", "0.01"),
+    "XRP_JPY": ("0.01", "0.00000001", "0.1"),
+}
+
+
+# 公開APIの既定のURLとパスです. URLは各取引所クラスのbase_urlと同じで, ボットはbase_urlsで差し替えたURLを渡します
+BASE_URLS = {"gmo": "https://api.coin.z.com", "bitbank": "https://api.bitbank.cc/v1", "bitflyer": "https://api.bitflyer.com"}
+SYMBOL_PATHS = {"gmo": "/public/v1/symbols", "bitbank": "/spot/pairs", "bitflyer": "/v1/markets"}
+
+
+async def _fetch_json(base_url: str, url: str):
+    async with pybotters.Client(base_url=base_url) as client:
+        r = await client.request("GET", url)
+        return await read_json(r)
+
+
+async def _load_gmo(base_url: str) -> dict:
+    data = await _fetch_json(base_url, SYMBOL_PATHS["gmo"])
+    return {s["symbol"]: SymbolInfo("gmo", s["symbol"], s["tickSize"], s["sizeStep"], s["minOrderSize"], s["maxOrderSize"])
+            for s in data["data"]}
+
+
+async def _load_bitbank(base_url: str) -> dict:
+    data = await _fetch_json(base_url, SYMBOL_PATHS["bitbank"])
+    return {p["name"]: SymbolInfo("bitbank", p["name"], Decimal(1).scaleb(-int(p["price_digits"])),
+                                  Decimal(1).scaleb(-int(p["amount_digits"])), p["unit_amount"],
+                                  p.get("limit_max_amount"))
+            for p in data["data"]["pairs"]}
+
+
+async def _load_bitflyer(base_url: str) -> dict:
+    markets = await _fetch_json(base_url, SYMBOL_PATHS["bitflyer"])
+    symbols = {}
+    for m in markets:
+        code = m["product_code"]
+        if code in _BITFLYER_SYMBOLS:
+            symbols[code] = SymbolInfo("bitflyer", code, *_BITFLYER_SYMBOLS[code])
+    return symbols
+
+
+class SymbolRegistry(object):
+    """
+    取引所ごとの通貨ペア情報です. 公開APIから一度だけ読み込み, cache_dirにttl秒キャッシュします
+    同じプロセスのボットはモジュールの symbol_registry を共有します
+
+    info = await symbol_registry.get("gmo", "BTC_JPY")
+    size, price = info.prepare("BUY", 0.00123, 5000000.7)
+    """
+    loaders = {"gmo": _load_gmo, "bitbank": _load_bitbank, "bitflyer": _load_bitflyer}
+
+    def __init__(self, cache_dir: str = None, ttl: float = 86400):
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser("~"), ".cache", "wrappy")
+        self.ttl = ttl
+        self._symbols = {}
+        self._locks = {}
+
+    def _cache_path(self, exchange: str) -> str:
+        return os.path.join(self.cache_dir, f"symbols_{exchange}.json")
+
+    def _read_cache(self, exchange: str):
+        """
+        壊れたキャッシュ(JSONでない, キーが無いなど)は無いものとして扱い, APIから読み直します
+        """
+        try:
+            with open(self._cache_path(exchange), "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if time.time() - cache["fetched_at"] > self.ttl:
+                return None
+            return {symbol: SymbolInfo(exchange, symbol, **info) for symbol, info in cache["symbols"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, ArithmeticError):
+            return None
+
+    def _write_cache(self, exchange: str, symbols: dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._cache_path(exchange) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(),
+                       "symbols": {symbol: info.to_dict() for symbol, info in symbols.items()}}, f)
+        os.replace(tmp, self._cache_path(exchange))
+
+    async def load(self, exchange: str, refresh: bool = False, base_url: str = None) -> dict:
+        """
+        取引所の全通貨ペアを読み込みます. キャッシュが新しければAPIは呼びません
+        :param base_url: 公開APIのURL 指定なしは本番のURLです
+                         モックサーバーなど本番と違うURLはファイルにキャッシュせず, このプロセスの中だけで使います
+        """
+        base_url = base_url or BASE_URLS[exchange]
+        live = base_url == BASE_URLS[exchange]
+        key = exchange if live else (exchange, base_url)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if not refresh and key in self._symbols:
+                return self._symbols[key]
+            symbols = None if refresh or not live else self._read_cache(exchange)
+            if symbols is None:
+                symbols = await self.loaders[exchange](base_url)
+                if live:
+                    self._write_cache(exchange, symbols)
+            self._symbols[key] = symbols
+            return symbols
+
+    async def get(self, exchange: str, symbol: str, base_url: str = None):
+        """
+        :return: SymbolInfo 不明な通貨ペアならNone
+        """
+        return (await self.load(exchange, base_url=base_url)).get(symbol)
+
+
+symbol_registry = SymbolRegistry()
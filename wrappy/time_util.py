@@ -1,12 +1,110 @@
+import time as _time
+import asyncio
 import datetime
 
+# タイムゾーン 呼ぶたびに作らないようにモジュールで1つだけ作ります
+JST = datetime.timezone(datetime.timedelta(hours=9), 'JST')
+GMT = datetime.timezone(datetime.timedelta(hours=0), 'GMT')
+UTC = datetime.timezone.utc
+
+# 時刻の取得元です. リプレイやバックテストでは模擬の時計に差し替えます(set_clock)
+# 時計は time() でエポック秒を返し, async sleep(seconds) でその時計の秒数だけ待つオブジェクトです
+# monotonic() があれば monotonic / monotonic_ns はそれを使い, 無ければ time() を使います
+_clock = None
+
+# 秒までの文字列のキャッシュです {(tz, date_format): (エポック秒, 文字列)}
+_formatted = {}
+
+
+def set_clock(clock=None):
+    """
+    now_jstなどが使う時計を差し替えます. Noneでシステムの時計に戻します
+    :return: 差し替える前の時計
+    """
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+def get_clock():
+    return _clock
+
+
+def time() -> float:
+    """
+    現在時刻のエポック秒です. 時計を差し替えている間はその時計の時刻です
+    """
+    if _clock is None:
+        return _time.time()
+    return _clock.time()
+
+
+def monotonic() -> float:
+    """
+    経過時間を測るための単調増加する秒数です(time.monotonic). 時計を差し替えている間はその時計の秒数です
+    """
+    if _clock is None:
+        return _time.monotonic()
+    return getattr(_clock, "monotonic", _clock.time)()
+
+
+def monotonic_ns() -> int:
+    """
+    monotonicのナノ秒の整数版です. floatの丸めが無いので短い区間の計測に使います
+    """
+    if _clock is None:
+        return _time.monotonic_ns()
+    return int(monotonic() * 1_000_000_000)
+
+
+async def sleep(seconds: float):
+    """
+    asyncio.sleepの代わりです. 時計を差し替えている間はその時計の秒数で待ちます
+    ロジックのループでこちらを使うと, リプレイを早送りしたときに待ち時間も早送りされます
+    """
+    if _clock is None:
+        await asyncio.sleep(seconds)
+    else:
+        await _clock.sleep(seconds)
+
+
+def format_time(t: float, tz=None, date_format="%Y-%m-%d %H:%M:%S") -> str:
+    """
+    エポック秒を文字列にします. 同じ秒の2回目からはキャッシュした文字列を返します
+    %f など秒より細かい書式はキャッシュしません
+    :param tz: タイムゾーン Noneはローカル時刻
+    """
+    if "%f" in date_format:
+        return datetime.datetime.fromtimestamp(t, tz).strftime(date_format)
+    second = int(t // 1)
+    key = (tz, date_format)
+    cached = _formatted.get(key)
+    if cached is not None and cached[0] == second:
+        return cached[1]
+    text = datetime.datetime.fromtimestamp(second, tz).strftime(date_format)
+    _formatted[key] = (second, text)
+    return text
+
+
+def format_time_ms(t: float, tz=None, date_format="%Y-%m-%d %H:%M:%S") -> str:
+    """
+    format_timeにミリ秒を付けます "2024-01-01 09:00:00.123"
+    """
+    return f"{format_time(t, tz, date_format)}.{int(t * 1000) % 1000:03d}"
+
+
+def _now(tz):
+    if _clock is None:
+        return datetime.datetime.now(tz)
+    return datetime.datetime.fromtimestamp(_clock.time(), tz)
+
 
 def now_jst():
     """
     現在時刻をJSTで取得.
     :return: datetime.
     """
-    return datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=9), 'JST'))
+    return _now(JST)
 
 
 def now_jst_str(date_format="%Y-%m-%d %H:%M:%S"):
@@ -14,7 +112,7 @@ def now_jst_str(date_format="%Y-%m-%d %H:%M:%S"):
     現在時刻を日本時間の文字型で出力します
     :return:
     """
-    return datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=9), 'JST')).strftime(date_format)
+    return format_time(time(), JST, date_format)
 
 
 def now_gmt():
@@ -22,7 +120,7 @@ def now_gmt():
     現在時刻をGMTで取得.
     :return: datetime
     """
-    return datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=0), 'GMT'))
+    return _now(GMT)
 
 
 def now_gmt_str(date_format="%Y-%m-%d %H:%M:%S"):
@@ -30,7 +128,7 @@ def now_gmt_str(date_format="%Y-%m-%d %H:%M:%S"):
     現在時刻をGMT時間の文字型で出力します
     :return:
     """
-    return datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=0), 'GMT')).strftime(date_format)
+    return format_time(time(), GMT, date_format)
 
 
 def now_utc():
@@ -38,7 +136,7 @@ def now_utc():
     現在時刻をUTCで取得.
     :return: datetime
     """
-    return datetime.datetime.now(datetime.timezone.utc)
+    return _now(UTC)
 
 
 def now_utc_str(date_format="%Y-%m-%d %H:%M:%S"):
@@ -46,8 +144,8 @@ def now_utc_str(date_format="%Y-%m-%d %H:%M:%S"):
     現在時刻をUTC時間の文字型で出力します
     :return:
     """
-    return datetime.datetime.utcnow().strftime(date_format)
+    return format_time(time(), UTC, date_format)
 
 
 def fromISOformat(d):
-    return datetime.datetime.fromisoformat(d)
\ No newline at end of file
+    return datetime.datetime.fromisoformat(d)
@@ -0,0 +1,89 @@
+import json
+import aiohttp
+import pybotters
+from contextlib import asynccontextmanager
+from .metrics import trace_config
+
+
+class _PooledClient(pybotters.Client):
+    """
+    閉じたかどうかをTransportPoolが自分で分かるようにしたClientです
+    """
+    closed = False
+
+    async def close(self):
+        self.closed = True
+        await super().close()
+
+
+class TransportPool(object):
+    """
+    pybotters.Clientを base_url と APIキーごとに使い回します
+    全てのClientは1つのTCPConnectorを共有するので, ボットが増えても接続はホストごとにまとまります
+    BotBase.transport に設定すると_requestsはこのClientを使います(Runtimeが設定します)
+    """
+    def __init__(self, limit: int = 100, limit_per_host: int = 0, keepalive_timeout: float = 30.0,
+                 ttl_dns_cache: int = 300):
+        """
+        :param limit: 全体の同時接続数
+        :param limit_per_host: ホストごとの同時接続数 0は無制限
+        :param keepalive_timeout: 使っていない接続を残しておく秒数
+        :param ttl_dns_cache: DNSのキャッシュ秒数
+        """
+        self.connector_kwargs = {"limit": limit, "limit_per_host": limit_per_host,
+                                 "keepalive_timeout": keepalive_timeout, "ttl_dns_cache": ttl_dns_cache}
+        self._connector = None
+        self._clients = {}
+        # 送信中のリクエストの数 共有のコネクターから借りている接続の数と同じです
+        self.in_flight = 0
+        self._trace_config = aiohttp.TraceConfig()
+        self._trace_config.on_request_start.append(self._on_request_start)
+        self._trace_config.on_request_end.append(self._on_request_done)
+        self._trace_config.on_request_exception.append(self._on_request_done)
+
+    async def _on_request_start(self, session, context, params):
+        self.in_flight += 1
+
+    async def _on_request_done(self, session, context, params):
+        self.in_flight -= 1
+
+    @staticmethod
+    def _key(apis, base_url: str) -> tuple:
+        return base_url, None if apis is None else json.dumps(apis, sort_keys=True)
+
+    def client(self, apis=None, base_url: str = "") -> pybotters.Client:
+        """
+        共有のClientを返します. 呼び出し側では閉じないでください
+        """
+        key = self._key(apis, base_url)
+        client = self._clients.get(key)
+        if client is None or client.closed:
+            if self._connector is None or self._connector.closed:
+                self._connector = aiohttp.TCPConnector(**self.connector_kwargs)
+            client = self._clients[key] = _PooledClient(apis=apis, base_url=base_url,
+                                                        connector=self._connector, connector_owner=False,
+                                                        trace_configs=[trace_config(), self._trace_config])
+        return client
+
+    def stats(self) -> dict:
+        return {"clients": len(self._clients), "in_flight": self.in_flight}
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.close()
+        self._clients = {}
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+
+@asynccontextmanager
+async def client_session(transport, apis=None, base_url: str = ""):
+    """
+    transportがあれば共有のClientを, 無ければリクエストごとに新しいClientを使います
+    """
+    if transport is not None:
+        yield transport.client(apis, base_url)
+    else:
+        async with pybotters.Client(apis=apis, base_url=base_url, trace_configs=[trace_config()]) as client:
+            yield client
@@ -1,9 +1,10 @@
 import os
+import json
+import hashlib
 import numpy as np
 import pandas as pd
 import polars as pl
 from datetime import datetime, timedelta
-from matplotlib import pyplot as plt
 from abc import ABCMeta, abstractmethod
 
 
@@ -18,13 +19,15 @@ def simple_regression(x: np.ndarray, y: np.ndarray, plot_graph=False, title: str
         return r2
 
     N = len(x)
-    p, cov, _ = np.polyfit(x, y, 1, cov=True)
+    p, cov = np.polyfit(x, y, 1, cov=True)
     a = p[0]
     b = p[1]
     sigma_a = np.sqrt(cov[0, 0])
     sigma_b = np.sqrt(cov[1, 1])
     sigma_y = np.sqrt(1 / (N - 2) * np.sum([(a * xi + b - yi) ** 2 for xi, yi in zip(x, y)]))
     yy = a * x + b
+    # matplotlibは読み込みが重いので, グラフを描くときに読み込みます
+    from matplotlib import pyplot as plt
     fig = plt.figure()
     fig.suptitle(title)
     ax = fig.add_subplot(111)
@@ -106,7 +109,7 @@ def plot_corrcoef(arr1, arr2, output_dir: str = None, title: str = None, x: str
     # sigma_a = sigma_y * np.sqrt(N / (N * Nx2 - Nx ** 2))
     # sigma_b = sigma_y * np.sqrt(Nx2 / (N * Nx2 - Nx ** 2))
 
-    p, cov, _ = np.polyfit(arr1, arr2, 1, cov=True)
+    p, cov = np.polyfit(arr1, arr2, 1, cov=True)
     a = p[0]
     b = p[1]
     sigma_a = np.sqrt(cov[0, 0])
@@ -117,6 +120,7 @@ def plot_corrcoef(arr1, arr2, output_dir: str = None, title: str = None, x: str
 
     y2 = a * arr1 + b
 
+    from matplotlib import pyplot as plt
     fig = plt.figure()
     fig.suptitle(title)
     ax = fig.add_subplot(111)
@@ -138,17 +142,102 @@ def plot_corrcoef(arr1, arr2, output_dir: str = None, title: str = None, x: str
 
     plt.show()
 
-def np_shift(arr, num=1, fill_value=np.nan):
-    result = np.empty_like(arr)
+def _shift_fill_value(dtype, fill_value):
+    """
+    整数型の配列にNaNは入らないので番兵値(その型の最小値)に置き換えます
+    符号なし整数は最小値が0で本物の0と区別できないので, NaNで埋めるとValueErrorです(fill_valueを指定してください)
+    """
+    if np.issubdtype(dtype, np.integer) and isinstance(fill_value, float) and np.isnan(fill_value):
+        if np.issubdtype(dtype, np.unsignedinteger):
+            raise ValueError(f"cannot fill {dtype} with NaN: pass fill_value explicitly for unsigned integers")
+        return np.iinfo(dtype).min
+    if np.issubdtype(dtype, np.bool_) and isinstance(fill_value, float) and np.isnan(fill_value):
+        return False
+    return fill_value
+
+
+def np_shift(arr, num=1, fill_value=np.nan, axis: int = 0, out: np.ndarray = None):
+    """
+    配列をnum個ずらします. 空いた所はfill_valueで埋めます
+    :param arr: ndarray
+    :param num: 正なら後ろへ, 負なら前へずらす
+    :param fill_value: 埋める値 整数型でNaNの場合はnp.iinfo(dtype).minを番兵値に使います
+                       符号なし整数はNaNの代わりの値が無いのでValueErrorです
+    :param axis: ずらす軸 2次元配列なら0で行方向, 1で列方向
+    :param out: 書き込み先の配列 arrと同じshapeが必要です. out=arrとするとin-placeでずらします
+    :return: out(指定が無ければ新しく確保した配列)
+    """
+    arr = np.asarray(arr)
+    if out is None:
+        out = np.empty_like(arr)
+    elif out.shape != arr.shape:
+        raise ValueError(f"out shape {out.shape} does not match arr shape {arr.shape}")
+    fill_value = _shift_fill_value(out.dtype, fill_value)
+
+    n = arr.shape[axis]
+    num = max(-n, min(n, num))
+    head = [slice(None)] * arr.ndim
+    tail = [slice(None)] * arr.ndim
     if num > 0:
-        result[:num] = fill_value
-        result[num:] = arr[:-num]
+        head[axis] = slice(num, None)
+        tail[axis] = slice(None, n - num)
+        # out is arrの場合もnumpyが重なりを検出して正しくコピーします
+        out[tuple(head)] = arr[tuple(tail)]
+        head[axis] = slice(None, num)
+        out[tuple(head)] = fill_value
     elif num < 0:
-        result[num:] = fill_value
-        result[:num] = arr[-num:]
+        head[axis] = slice(None, n + num)
+        tail[axis] = slice(-num, None)
+        out[tuple(head)] = arr[tuple(tail)]
+        head[axis] = slice(n + num, None)
+        out[tuple(head)] = fill_value
+    elif out is not arr:
+        out[...] = arr
+    return out
+
+
+def np_shift_view(arr, num=1, axis: int = 0):
+    """
+    コピーせずにずらした配列を比較するためのviewの組を返します
+    fill_valueで埋める代わりに両端を切り落とします
+    x, x_lag = np_shift_view(close, 1)
+    ret = x / x_lag - 1     # np_shift(close, 1)と同じ並びで先頭のNaNが無いもの
+    :return: (current, shifted) 共に arr のview
+    """
+    arr = np.asarray(arr)
+    n = arr.shape[axis]
+    current = [slice(None)] * arr.ndim
+    shifted = [slice(None)] * arr.ndim
+    k = min(abs(num), n)
+    if num >= 0:
+        current[axis] = slice(k, None)
+        shifted[axis] = slice(None, n - k)
     else:
-        result[:] = arr
-    return result
+        current[axis] = slice(None, n - k)
+        shifted[axis] = slice(k, None)
+    return arr[tuple(current)], arr[tuple(shifted)]
+
+
+def np_lags(arr, lags, fill_value=np.nan, out: np.ndarray = None):
+    """
+    1次元配列から複数ラグの行列を1回の確保で作ります
+    np.column_stack([np_shift(arr, lag) for lag in lags]) と同じ結果です
+    :param arr: 1次元ndarray
+    :param lags: [1, 2, 5] のようなラグのリスト(負の値なら先の値)
+    :param out: (len(arr), len(lags)) の書き込み先
+    :return: shape (len(arr), len(lags)) のndarray
+    """
+    arr = np.asarray(arr)
+    if arr.ndim != 1:
+        raise ValueError("np_lags expects a 1-D array")
+    lags = list(lags)
+    if out is None:
+        out = np.empty((arr.shape[0], len(lags)), dtype=arr.dtype)
+    elif out.shape != (arr.shape[0], len(lags)):
+        raise ValueError(f"out shape {out.shape} does not match {(arr.shape[0], len(lags))}")
+    for j, lag in enumerate(lags):
+        np_shift(arr, lag, fill_value, out=out[:, j])
+    return out
 
 def np_stack(x,y):
     z = np.column_stack((x,y))
@@ -156,14 +245,103 @@ def np_stack(x,y):
     return z[:,0], z[:,1]
 
 def resample_ohlc(org_df: pd.DataFrame, timeframe):
-    df = org_df.resample(f'{timeframe * 60}S').agg(
+    df = org_df.resample(f'{timeframe * 60}s').agg(
         {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
-    df['close'] = df['close'].fillna(method='ffill')
+    df['close'] = df['close'].ffill()
     df['open'] = df['open'].fillna(df['close'])
     df['high'] = df['high'].fillna(df['close'])
     df['low'] = df['low'].fillna(df['close'])
     return df
 
+def _sorted_by(df: pl.DataFrame, dt_col: str) -> pl.DataFrame:
+    """
+    search_sortedを使うためにdt_colで昇順に並べます(並んでいれば何もしません)
+    """
+    if df[dt_col].null_count():
+        df = df.drop_nulls(dt_col)
+    if not df[dt_col].is_sorted():
+        df = df.sort(dt_col)
+    return df
+
+
+def _window_bounds(first: datetime, last: datetime, every: timedelta, period: timedelta,
+                   start: datetime, mode: str):
+    """
+    (窓の開始, 窓の終了) を順番に生成します 終了は含みません
+    """
+    if mode not in ("tumbling", "sliding", "expanding"):
+        raise ValueError(f"unknown window mode: {mode}")
+    if period is None:
+        period = every
+    lower = first if start is None else start
+    k = 0
+    while True:
+        if mode == "expanding":
+            lo, hi = lower, lower + every * (k + 1)
+            if hi - every > last:
+                return
+        else:
+            lo = lower + every * k
+            hi = lo + (every if mode == "tumbling" else period)
+            if lo > last:
+                return
+        yield lo, hi
+        k += 1
+
+
+def iter_time_windows(df: pl.DataFrame, dt_col: str, every: timedelta, period: timedelta = None,
+                      start: datetime = None, mode: str = "tumbling"):
+    """
+    時間で区切ったDataFrameを1つずつ返すジェネレータです
+    先に1回だけソートし, 各窓の境界はsearch_sortedの二分探索で求めるのでdf全体を何度も走査しません
+    返すDataFrameはdf.sliceなのでコピーされません
+    ウォークフォワードで数年分を回すときなど, 全窓をリストに持ちたくない場合に使います
+    :param df: pl.DataFrame
+    :param dt_col: datetime カラム名
+    :param every: 窓をずらす幅 timedelta(days=1) など
+    :param period: slidingの窓の長さ (指定なしはevery)
+    :param start: 最初の窓の開始 (指定なしはdt_colの最小値)
+    :param mode: tumbling: [s+k*every, s+(k+1)*every)
+                 sliding: [s+k*every, s+k*every+period)
+                 expanding: [s, s+(k+1)*every)
+    :return: (窓の開始, 窓の終了, pl.DataFrame)
+    """
+    df = _sorted_by(df, dt_col)
+    if df.is_empty():
+        return
+    ts = df[dt_col]
+    for lo, hi in _window_bounds(ts[0], ts[-1], every, period, start, mode):
+        i = ts.search_sorted(lo, side="left")
+        j = ts.search_sorted(hi, side="left")
+        yield lo, hi, df.slice(i, j - i)
+
+
+def time_windows(df: pl.DataFrame, dt_col: str, every: timedelta, period: timedelta = None,
+                 start: datetime = None, mode: str = "tumbling") -> list:
+    """
+    iter_time_windowsのリスト版です 境界の二分探索をまとめて1回で行います
+    :return: [(窓の開始, 窓の終了, pl.DataFrame), ...]
+    """
+    df = _sorted_by(df, dt_col)
+    if df.is_empty():
+        return []
+    ts = df[dt_col]
+    bounds = list(_window_bounds(ts[0], ts[-1], every, period, start, mode))
+    return [(lo, hi, frame) for (lo, hi), frame in zip(bounds, _slice_windows(df, dt_col, bounds))]
+
+
+def _slice_windows(df: pl.DataFrame, dt_col: str, bounds: list) -> list:
+    """
+    ソート済みのdfから [lo, hi) の窓をsliceで切り出します
+    """
+    if not bounds:
+        return []
+    ts = df[dt_col]
+    edges = pl.Series([b for pair in bounds for b in pair]).cast(ts.dtype)
+    idx = ts.search_sorted(edges, side="left").to_list()
+    return [df.slice(idx[2 * k], idx[2 * k + 1] - idx[2 * k]) for k in range(len(bounds))]
+
+
 def df_list(df: pl.DataFrame, start_date: datetime, interval: int, quantity: int, dt_col: str="") -> list:
     """
     Args:
@@ -176,18 +354,25 @@ def df_list(df: pl.DataFrame, start_date: datetime, interval: int, quantity: int
     Returns:
         list: _description_
     """
+    df = _sorted_by(df, dt_col)
+    if df.is_empty():
+        return []
+    max_date = df[dt_col][-1]
+
     # 日付リストを生成する
-    date_list = [start_date + timedelta(days=interval*i)
-                for i in range(quantity)
-                if start_date + timedelta(days=interval*i) <= df[dt_col].max()]
+    date_list = [start_date + timedelta(days=interval*i) for i in range(quantity)]
+    date_list = [d for d in date_list if d <= max_date]
+    if len(date_list) < 2:
+        return []
 
     # DataFrameリストを生成する
-    return [df.filter((pl.col(dt_col).ge(start_date)) & (pl.col(dt_col).lt(end_date)))
-            for start_date, end_date in [(date_list[i], date_list[i+1])
-                for i in range(0, len(date_list)-1, interval)] + ([ (date_list[-2], date_list[-1]) ]
-                    if len(date_list) % interval != 1 else [])]
+    bounds = [(date_list[i], date_list[i+1]) for i in range(0, len(date_list)-1, interval)]
+    if len(date_list) % interval != 1:
+        bounds.append((date_list[-2], date_list[-1]))
+    return _slice_windows(df, dt_col, bounds)
 
-def trades_to_historical(df: pd.DataFrame, period: str = '1S'):
+
+def trades_to_historical(df: pd.DataFrame, period: str = '1s'):
     if 'side' in df.columns:
         df['side'] = df['side'].mask(df['side'] == 'Buy', 'buy')
         df['side'] = df['side'].mask(df['side'] == 'BUY', 'buy')
@@ -206,7 +391,7 @@ def trades_to_historical(df: pd.DataFrame, period: str = '1S'):
         df_ohlcv.columns = ['open', 'high', 'low', 'close', 'volume', 'buyVol', 'sellVol']
     elif 'm' in df.columns:
         df['T'] = df['T'] / 1000
-        df['T'] = pd.to_datetime(df['T'].astype(int), unit='s', utc=True, infer_datetime_format=True)
+        df['T'] = pd.to_datetime(df['T'].astype(int), unit='s', utc=True)
         df = df.set_index('T')
         df.index = df.index.tz_localize(None)
         df['m'] = df['m'].mask(df['m'] is True, 'buy')
@@ -226,21 +411,105 @@ def trades_to_historical(df: pd.DataFrame, period: str = '1S'):
         df_ohlcv.columns = ['open', 'high', 'low', 'close', 'volume']
     return df_ohlcv
 
+def _suggest(trial, key: str, spec):
+    """
+    paramsの指定からoptunaのsuggest_*を選びます
+    (1, 100, 1) / [1, 100]           -> suggest_int
+    (0.1, 2.0) / (0.1, 2.0, 0.1)     -> suggest_float (どれかがfloatの場合)
+    {"type": "float", "low": 1e-4, "high": 1e-1, "log": True}
+    {"type": "int", "low": 1, "high": 100, "step": 5}
+    {"type": "categorical", "choices": ["ema", "sma"]}
+    """
+    if isinstance(spec, dict):
+        kind = spec.get("type", "int")
+        if kind == "categorical":
+            return trial.suggest_categorical(key, spec["choices"])
+        if kind == "float":
+            return trial.suggest_float(key, spec["low"], spec["high"], step=spec.get("step"), log=spec.get("log", False))
+        if kind == "int":
+            return trial.suggest_int(key, spec["low"], spec["high"], step=spec.get("step", 1), log=spec.get("log", False))
+        raise ValueError(f"unknown param type: {kind}")
+    if any(isinstance(v, float) for v in spec):
+        step = spec[2] if len(spec) > 2 else None
+        return trial.suggest_float(key, spec[0], spec[1], step=step)
+    step = spec[2] if len(spec) > 2 else 1
+    return trial.suggest_int(key, spec[0], spec[1], step=step)
+
+
+def params_key(config: dict) -> str:
+    """
+    パラメータの組み合わせからキャッシュ用のハッシュを作ります
+    """
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+
 class Objective(metaclass=ABCMeta):
-    def __init__(self, df: any, params: dict):
+    """
+    optunaの目的関数のベースです
+    optimizationを実装します. df_listを渡してoptimization_foldも実装すると
+    foldごとに途中経過をtrial.reportし, 見込みのないtrialを途中で打ち切ります(pruning)
+    deterministic=Trueを渡すと, 同じパラメータの結果をこのプロセスの中で使い回します
+    """
+    def __init__(self, df: any, params: dict, deterministic: bool = False):
         if isinstance(df, list):
             self.df_list = df
         else:
             self.df = df
         self.params = params
+        self.deterministic = deterministic
+        # {params_key(config): 評価値}
+        self._cache = {}
+
+    @classmethod
+    def uses_folds(cls) -> bool:
+        """
+        optimization_foldを実装していればTrueです
+        """
+        return cls.optimization_fold is not Objective.optimization_fold
+
+    def suggest(self, trial) -> dict:
+        # ハイパーパラメータの設定
+        return {key: _suggest(trial, key, value) for key, value in self.params.items()}
 
     def __call__(self, trial):
-        # ハイパーパラメータの設定
-        config = {}
-        for key, value in self.params.items():
-            config[key] = trial.suggest_int(key, value[0], value[1], value[2])
-        return self.optimization(**config)
+        config = self.suggest(trial)
+        if not self.deterministic:
+            return self._evaluate(trial, config)
+
+        key = params_key(config)
+        if key not in self._cache:
+            self._cache[key] = self._evaluate(trial, config)
+        return self._cache[key]
+
+    def _evaluate(self, trial, config: dict):
+        if not hasattr(self, "df_list") or not self.uses_folds():
+            return self.optimization(**config)
+
+        scores = []
+        for step, df in enumerate(self.df_list):
+            scores.append(self.optimization_fold(df, **config))
+            trial.report(self.aggregate(scores), step)
+            if trial.should_prune():
+                import optuna
+                raise optuna.TrialPruned()
+        return self.aggregate(scores)
+
+    def aggregate(self, scores: list) -> float:
+        """
+        foldごとの結果をまとめます 平均以外が欲しい場合は子クラスで上書きします
+        """
+        return float(np.mean(scores))
+
+    def optimization_fold(self, df, **kwargs):
+        """
+        1つのfoldを評価します. df_listを使う場合は子クラスで実装します.
+        walk_forwardでは実装していれば学習期間と検証期間をそれぞれ1つのfoldとして評価します.
+        """
+        raise NotImplementedError
 
     @abstractmethod
     def optimization(self, **kwargs):
-        raise NotImplementedError
\ No newline at end of file
+        """
+        評価値を返します. 子クラスで実装します.
+        """
+        raise NotImplementedError
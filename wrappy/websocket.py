@@ -0,0 +1,201 @@
+import asyncio
+import time
+import aiohttp
+from datetime import datetime, timezone
+from .fastjson import ws_connect_kwargs
+
+
+def channel_of(msg) -> str:
+    """
+    メッセージから購読チャンネル名を取り出します
+    GMO: {"channel": ...} / bitflyer: {"params": {"channel": ...}} / bitbank: {"room_name": ...}
+    """
+    if isinstance(msg, dict):
+        if "channel" in msg:
+            return msg["channel"]
+        params = msg.get("params")
+        if isinstance(params, dict) and "channel" in params:
+            return params["channel"]
+        if "room_name" in msg:
+            return msg["room_name"]
+    return "unknown"
+
+
+def exchange_timestamp(msg):
+    """
+    メッセージに含まれる取引所側の時刻(UTC)を返します 無ければNone
+    """
+    if not isinstance(msg, dict):
+        return None
+    ts = msg.get("timestamp")
+    if ts is None:
+        params = msg.get("params")
+        if isinstance(params, dict) and isinstance(params.get("message"), dict):
+            ts = params["message"].get("timestamp")
+    if isinstance(ts, str):
+        try:
+            parsed = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        # タイムゾーンの無い時刻はUTCとして扱います
+        return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+    if isinstance(ts, (int, float)):
+        # bitbankなどはミリ秒
+        return datetime.fromtimestamp(ts / 1000, timezone.utc)
+    return None
+
+
+class ChannelStats(object):
+    __slots__ = ("count", "last_count", "last_received", "rate", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.last_count = 0
+        self.last_received = time.monotonic()
+        self.rate = 0.0
+        self.latency = None
+
+
+class WebSocketSupervisor(object):
+    """
+    pybottersのWebSocketAppを監視します
+    チャンネルごとの最終受信からの経過時間を見て, stale_timeoutを超えたら接続を切って再接続させます
+    (再接続時の subscription_commands の再送はpybottersが行います)
+    再接続を検知したら on_resync を呼ぶので, RESTでスナップショットを取り直してください
+
+    supervisor = WebSocketSupervisor(bot, stale_timeout=10, on_resync=resync)
+    app = await supervisor.connect(url, client, store.onmessage, subscription_commands)
+    bot.log_info(supervisor.stats())
+    """
+    def __init__(self, bot, stale_timeout: float = 10.0, on_resync=None, channel_timeouts: dict = None,
+                 check_interval: float = 1.0, backoff_min: float = 1.0, backoff_max: float = 60.0,
+                 close_timeout: float = 1.0):
+        """
+        :param bot: ログ出力に使うBotBase
+        :param stale_timeout: この秒数どのチャンネルからも受信が無ければ再接続します
+        :param on_resync: 再接続後に呼ばれるコルーチン関数 async def resync(): ...
+        :param channel_timeouts: チャンネル個別のタイムアウト {"orderbooks": 5} など
+        :param check_interval: 監視間隔(秒)
+        :param backoff_min: 強制再接続の最小間隔(秒) 再接続が続くと倍々にしていきます
+        :param backoff_max: 強制再接続の最大間隔(秒)
+        :param close_timeout: 強制再接続で切断するときに相手のcloseを待つ秒数
+        """
+        self.bot = bot
+        self.stale_timeout = stale_timeout
+        self.on_resync = on_resync
+        self.channel_timeouts = channel_timeouts or {}
+        self.check_interval = check_interval
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.backoff = backoff_min
+        self.close_timeout = close_timeout
+        self.channels = {}
+        self.reconnects = 0
+        self.app = None
+        self._ws = None
+        self._last_forced = 0.0
+        self._connected_at = time.monotonic()
+        self._task = None
+
+    async def connect(self, url, client, handler, subscription_commands):
+        """
+        接続して監視を始めます
+        :return: pybotters.WebSocketApp
+        """
+        def onmessage(msg, ws):
+            self._record(msg)
+            handler(msg, ws)
+
+        # 相手が黙っていてもcloseのハンドシェイクをclose_timeout秒で打ち切ります
+        self.app = await client.ws_connect(url, send_json=subscription_commands,
+                                           timeout=aiohttp.ClientWSTimeout(ws_close=self.close_timeout),
+                                           **ws_connect_kwargs(onmessage))
+        self._ws = self.app.current_ws
+        self._connected_at = time.monotonic()
+        self._task = asyncio.create_task(self._watch())
+        return self.app
+
+    def _record(self, msg):
+        channel = channel_of(msg)
+        stats = self.channels.get(channel)
+        if stats is None:
+            stats = self.channels[channel] = ChannelStats()
+        stats.count += 1
+        stats.last_received = time.monotonic()
+        ts = exchange_timestamp(msg)
+        if ts is not None:
+            stats.latency = (datetime.now(timezone.utc) - ts).total_seconds()
+
+    def age(self) -> float:
+        """
+        最後にメッセージを受信してからの秒数です(全チャンネルで最新のもの)
+        """
+        last = max([s.last_received for s in self.channels.values()] + [self._connected_at])
+        return time.monotonic() - last
+
+    def _stale_channel(self):
+        """
+        stale_timeout(チャンネル個別の指定があればそちら)を超えているチャンネル名を返します
+        """
+        if self.age() >= self.stale_timeout:
+            return "*"
+        now = time.monotonic()
+        for channel, timeout in self.channel_timeouts.items():
+            stats = self.channels.get(channel)
+            last = self._connected_at if stats is None else max(stats.last_received, self._connected_at)
+            if now - last >= timeout:
+                return channel
+        return None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for stats in self.channels.values():
+                stats.rate = (stats.count - stats.last_count) / self.check_interval
+                stats.last_count = stats.count
+
+            current = self.app.current_ws
+            if current is not None and current is not self._ws:
+                # pybottersが再接続した
+                self._ws = current
+                await self._resync()
+                continue
+
+            channel = self._stale_channel()
+            if channel is None:
+                # 強制再接続の後に受信できていればbackoffを戻します
+                if any(st.last_received > self._last_forced for st in self.channels.values()):
+                    self.backoff = self.backoff_min
+                continue
+            now = time.monotonic()
+            if current is None or now - self._last_forced < self.backoff:
+                continue
+            self.bot.log_warning(f"websocket channel {channel} is stale. reconnecting {self.app.url}")
+            self._last_forced = now
+            self.backoff = min(self.backoff * 2, self.backoff_max)
+            # closeのハンドシェイクはws_connectのtimeout(close_timeout秒)で打ち切られます
+            await current.close()
+
+    async def _resync(self):
+        self.reconnects += 1
+        # 再接続までの間にメッセージを取りこぼしている可能性があります
+        self.bot.log_warning(f"websocket reconnected ({self.reconnects}). resync after possible gap.")
+        self._connected_at = time.monotonic()
+        if self.on_resync is not None:
+            try:
+                await self.on_resync()
+            except Exception as e:
+                self.bot.log_exception(e)
+
+    def stats(self) -> dict:
+        """
+        チャンネルごとの受信状況です
+        {channel: {"count": 受信数, "rate": 受信数/秒, "age": 最終受信からの秒数, "latency": 取引所時刻からの遅れ(秒)}}
+        """
+        now = time.monotonic()
+        return {channel: {"count": s.count, "rate": s.rate, "age": now - s.last_received, "latency": s.latency}
+                for channel, s in self.channels.items()}
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()